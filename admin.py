@@ -0,0 +1,110 @@
+"""
+Endpoints de administración (métricas internas en JSON).
+
+Si ADMIN_TOKEN está configurado se exige en la cabecera X-Admin-Token (o en
+?token=); si no, sólo se aceptan peticiones desde la misma máquina.
+Registrar este blueprint instala además la medición del motor (motor_bd) y,
+si PERFILADOR_ACTIVO está encendido, el perfilador de rutas (perfilador).
+"""
+import hmac
+from functools import wraps
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+
+import analitica_ventas
+import archivo_facturas
+import cache_paginas
+import menu_cache
+import motor_bd
+import perfilador
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+admin_bp.record_once(lambda estado: motor_bd.instrumentar(estado.app))
+admin_bp.record_once(lambda estado: perfilador.instalar(estado.app))
+
+LOCALES = {'127.0.0.1', '::1'}
+
+
+def requiere_admin(vista):
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        token = current_app.config.get('ADMIN_TOKEN')
+        if token:
+            enviado = request.headers.get('X-Admin-Token') or request.args.get('token', '')
+            if not hmac.compare_digest(enviado.encode(), token.encode()):
+                abort(403)
+        elif request.remote_addr not in LOCALES:
+            abort(403)
+        return vista(*args, **kwargs)
+    return envoltura
+
+
+@admin_bp.route('/bd')
+@requiere_admin
+def bd():
+    """Estado del pool, esperas por conexión y consultas por ruta."""
+    datos = motor_bd.metricas()
+    datos['entorno'] = current_app.config.get('ENTORNO')
+    datos['ajustes'] = {k: current_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).get(k)
+                        for k in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping')}
+    datos['ajustes']['timeout_sentencia_seg'] = current_app.config.get('BD_TIMEOUT_SENTENCIA_SEG')
+    return jsonify(datos)
+
+
+@admin_bp.route('/bd/reiniciar', methods=['POST'])
+@requiere_admin
+def reiniciar_bd():
+    motor_bd.reiniciar_metricas()
+    return jsonify({'ok': True})
+
+
+@admin_bp.route('/perfil')
+@requiere_admin
+def perfil():
+    """Costo por ruta (DB, render, sentencias) y N+1 detectados, la ruta más cara primero."""
+    return jsonify({'activo': current_app.config.get('PERFILADOR_ACTIVO', False),
+                    'rutas': perfilador.reporte.resumen()})
+
+
+@admin_bp.route('/perfil.txt')
+@requiere_admin
+def perfil_texto():
+    return Response(perfilador.reporte.texto(), mimetype='text/plain')
+
+
+@admin_bp.route('/perfil/reiniciar', methods=['POST'])
+@requiere_admin
+def reiniciar_perfil():
+    perfilador.reporte.reiniciar()
+    return jsonify({'ok': True})
+
+
+@admin_bp.route('/cache/menu')
+@requiere_admin
+def cache_menu():
+    """Contadores de la caché del menú de este proceso (aciertos, fallos, recargas)."""
+    return jsonify(menu_cache.cache.estadisticas())
+
+
+@admin_bp.route('/cache')
+@requiere_admin
+def cache():
+    """Aciertos, 304 y memoria de la caché de páginas; estado de la caché del menú."""
+    return jsonify({'activa': current_app.config.get('CACHE_PAGINAS_ACTIVA', True),
+                    'paginas': cache_paginas.estadisticas(),
+                    'menu': menu_cache.cache.estadisticas(),
+                    'analitica': analitica_ventas.memo.estadisticas()})
+
+
+@admin_bp.route('/cache/vaciar', methods=['POST'])
+@requiere_admin
+def vaciar_cache():
+    cache_paginas.vaciar()
+    return jsonify({'ok': True})
+
+
+@admin_bp.route('/archivo')
+@requiere_admin
+def archivo():
+    """Frontera del archivo de facturas y totales congelados de cada mes archivado."""
+    return jsonify(archivo_facturas.estado())
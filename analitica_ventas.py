@@ -0,0 +1,251 @@
+"""
+Analítica de ventas del dashboard con NumPy.
+
+Para un mes calcula, con una consulta por conjunto de datos y operaciones
+vectorizadas (sin ciclos ni consultas por día):
+  - proyección de cierre de mes: ritmo diario del mes corregido por la
+    estacionalidad de cada día de la semana (últimas ANALITICA_SEMANAS_HISTORIA
+    semanas), mezclado con el promedio histórico mientras haya pocos días,
+  - análisis ABC de platos por importe (A = 80 % de la venta, B = siguiente 15 %),
+  - mapa de calor día de la semana x hora de las facturas,
+  - rotación por mesa (servicios por día abierto, ocupación de asientos).
+
+Las facturas de meses archivados se leen del archivo (archivo_facturas.partes);
+el resumen diario de esos meses sigue en ventas_diarias.
+
+El resultado se memoriza por (mes, día de hoy, versión 'facturas'), así que el
+dashboard sólo recalcula cuando entra una venta. Requiere numpy.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+
+from database import db, como_fecha, dia_semana, hora
+from metricas_dashboard import rango_mes
+from models import Mesa, Reservacion, VentaDiaria, VentaDiariaPlato
+import archivo_facturas
+import versiones_datos
+
+VERSION = 'facturas'
+DIAS_SEMANA = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+LIMITE_A, LIMITE_B = 0.80, 0.95
+
+
+def _dias(inicio, fin):
+    return np.arange(np.datetime64(inicio, 'D'), np.datetime64(fin, 'D'))
+
+
+def _dia_semana(dias):
+    # 1970-01-01 fue jueves (3 con lunes = 0)
+    return (dias.astype('int64') + 3) % 7
+
+
+def _serie_diaria(inicio, fin):
+    """Totales de ventas_diarias en [inicio, fin) como vector denso (0 los días sin ventas)."""
+    filas = db.session.query(VentaDiaria.fecha, VentaDiaria.total)\
+        .filter(VentaDiaria.fecha >= inicio, VentaDiaria.fecha < fin).all()
+    dias = _dias(inicio, fin)
+    totales = np.zeros(len(dias))
+    if filas:
+        fechas = np.array([como_fecha(d) for d, _ in filas], dtype='datetime64[D]')
+        np.add.at(totales, (fechas - dias[0]).astype('int64'), np.array([t or 0 for _, t in filas], dtype=float))
+    return dias, totales
+
+
+def proyeccion(dias, totales, inicio, fin, hoy, semanas, peso_historia):
+    """
+    Cierre estimado del mes [inicio, fin) con lo vendido hasta `hoy`.
+
+    factor[d] = promedio del día de semana d / promedio diario en la historia.
+    ritmo = (ventas de los días cerrados + peso_historia * promedio histórico)
+            / (suma de factores de esos días + peso_historia)
+    Cada día pendiente aporta ritmo * factor[d]; hoy aporta lo que le falte.
+    """
+    hoy64 = np.datetime64(hoy, 'D')
+    dia_semana = _dia_semana(dias)
+
+    en_historia = (dias >= hoy64 - np.timedelta64(7 * semanas, 'D')) & (dias < hoy64)
+    suma = np.bincount(dia_semana[en_historia], weights=totales[en_historia], minlength=7)
+    cuenta = np.bincount(dia_semana[en_historia], minlength=7)
+    promedio = totales[en_historia].mean() if en_historia.any() else 0.0
+    factores = np.ones(7)
+    if promedio > 0:
+        factores = np.divide(suma, cuenta * promedio, out=np.ones(7), where=cuenta > 0)
+
+    en_mes = (dias >= np.datetime64(inicio, 'D')) & (dias < np.datetime64(fin, 'D'))
+    dias_mes, reales = dias[en_mes], totales[en_mes]
+    factor_mes = factores[dia_semana[en_mes]]
+    cerrados = dias_mes < hoy64
+
+    peso = factor_mes[cerrados].sum() + peso_historia
+    ritmo = (reales[cerrados].sum() + peso_historia * promedio) / peso if peso > 0 else promedio
+    esperados = ritmo * factor_mes
+    pendiente = np.where(dias_mes > hoy64, esperados,
+                         np.where(dias_mes == hoy64, np.maximum(esperados - reales, 0.0), 0.0))
+    return {
+        'total': round(float(reales.sum() + pendiente.sum()), 2),
+        'vendido': round(float(reales.sum()), 2),
+        'ritmo_diario': round(float(ritmo), 2),
+        'promedio_historico': round(float(promedio), 2),
+        'dias_cerrados': int(cerrados.sum()),
+        'factores_dia_semana': dict(zip(DIAS_SEMANA, np.round(factores, 3).tolist())),
+        'dias': np.datetime_as_string(dias_mes).tolist(),
+        'real_por_dia': np.where(dias_mes <= hoy64, np.round(reales, 2).astype(object), None).tolist(),
+        'esperado_por_dia': np.round(esperados, 2).tolist(),
+    }
+
+
+def abc_platos(inicio, fin):
+    """Platos del mes por importe con su clase ABC y participación acumulada."""
+    filas = db.session.query(
+        VentaDiariaPlato.plato_id, func.max(VentaDiariaPlato.descripcion),
+        func.sum(VentaDiariaPlato.cantidad), func.sum(VentaDiariaPlato.importe)
+    ).filter(VentaDiariaPlato.fecha >= inicio, VentaDiariaPlato.fecha < fin)\
+     .group_by(VentaDiariaPlato.plato_id).all()
+    if not filas:
+        return []
+    importes = np.array([f[3] or 0 for f in filas], dtype=float)
+    orden = np.argsort(-importes, kind='stable')
+    total = importes.sum()
+    acumulado = np.cumsum(importes[orden]) / total if total else np.zeros(len(orden))
+    # La clase depende de lo acumulado antes del plato: el que cruza el 80 % sigue siendo A
+    previo = acumulado - (importes[orden] / total if total else 0)
+    clases = np.where(previo < LIMITE_A, 'A', np.where(previo < LIMITE_B, 'B', 'C'))
+    return [{
+        'plato_id': filas[i][0],
+        'descripcion': filas[i][1],
+        'cantidad': int(filas[i][2] or 0),
+        'importe': round(float(importes[i]), 2),
+        'participacion': round(float(importes[i] / total), 4) if total else 0.0,
+        'acumulado': round(float(a), 4),
+        'clase': str(c),
+    } for i, a, c in zip(orden.tolist(), acumulado, clases)]
+
+
+def mapa_horas(inicio, fin, frontera=None):
+    """Matrices 7 x 24 (lunes primero) con facturas e importe por día de semana y hora."""
+    # Agrupado en la base: a lo sumo 168 filas por parte (vivas / archivo)
+    filas = []
+    for factura, _, rango in archivo_facturas.partes(inicio, fin, frontera):
+        d, h = dia_semana(factura.fecha), hora(factura.fecha)
+        filas += db.session.query(d, h, func.count(factura.factura_id), func.sum(factura.total))\
+            .filter(*rango).group_by(d, h).all()
+    facturas = np.zeros(168, dtype='int64')
+    importe = np.zeros(168)
+    if filas:
+        celdas = np.array([int(d) * 24 + int(h) for d, h, _, _ in filas], dtype='int64')
+        # add.at: la misma celda puede venir del archivo y de las tablas vivas
+        np.add.at(facturas, celdas, np.array([n for _, _, n, _ in filas], dtype='int64'))
+        np.add.at(importe, celdas, np.array([float(t or 0) for _, _, _, t in filas]))
+    return {
+        'dias': DIAS_SEMANA,
+        'facturas': facturas.reshape(7, 24).tolist(),
+        'importe': np.round(importe, 2).reshape(7, 24).tolist(),
+    }
+
+
+def rotacion_mesas(inicio, fin, dias_abiertos, frontera=None):
+    """Servicios facturados por mesa, servicios por día abierto y ocupación de asientos."""
+    mesas = db.session.query(Mesa.mesa_id, Mesa.nombre, Mesa.capacidad).order_by(Mesa.mesa_id).all()
+    if not mesas:
+        return []
+    servicios = []
+    for factura, _, rango in archivo_facturas.partes(inicio, fin, frontera):
+        servicios += db.session.query(
+            Reservacion.mesa_id, func.count(factura.factura_id),
+            func.sum(factura.total), func.sum(Reservacion.personas)
+        ).select_from(factura).join(Reservacion, Reservacion.reservacion_id == factura.reservacion_id)\
+         .filter(*rango, Reservacion.mesa_id.isnot(None))\
+         .group_by(Reservacion.mesa_id).all()
+
+    ids = np.array([m[0] for m in mesas])
+    capacidad = np.array([m[2] or 0 for m in mesas], dtype=float)
+    conteo, importe, personas = np.zeros(len(ids)), np.zeros(len(ids)), np.zeros(len(ids))
+    if servicios:
+        por_mesa = np.array([s[0] for s in servicios])
+        posicion = np.searchsorted(ids, por_mesa)
+        validas = (posicion < len(ids)) & (ids[np.minimum(posicion, len(ids) - 1)] == por_mesa)
+        posicion = posicion[validas]
+        # add.at: una mesa puede venir una vez del archivo y otra de las tablas vivas
+        np.add.at(conteo, posicion, np.array([s[1] for s in servicios], dtype=float)[validas])
+        np.add.at(importe, posicion, np.array([s[2] or 0 for s in servicios], dtype=float)[validas])
+        np.add.at(personas, posicion, np.array([s[3] or 0 for s in servicios], dtype=float)[validas])
+
+    dias = max(dias_abiertos, 1)
+    rotacion = conteo / dias
+    ocupacion = np.divide(personas, capacidad * dias, out=np.zeros(len(ids)), where=capacidad > 0)
+    ticket = np.divide(importe, conteo, out=np.zeros(len(ids)), where=conteo > 0)
+    orden = np.argsort(-rotacion, kind='stable')
+    return [{
+        'mesa_id': int(ids[i]),
+        'nombre': mesas[i][1],
+        'servicios': int(conteo[i]),
+        'rotacion_diaria': round(float(rotacion[i]), 2),
+        'ocupacion_asientos': round(float(ocupacion[i]), 4),
+        'ticket_promedio': round(float(ticket[i]), 2),
+        'importe': round(float(importe[i]), 2),
+    } for i in orden.tolist()]
+
+
+def calcular(anio, mes, hoy):
+    """Toda la analítica del mes, sin memorizar."""
+    config = current_app.config
+    semanas = config.get('ANALITICA_SEMANAS_HISTORIA', 8)
+    inicio, fin = rango_mes(anio, mes)
+    # Una sola lectura de ventas_diarias cubre la historia y el mes completo
+    desde = min(inicio, hoy - timedelta(weeks=semanas))
+    dias, totales = _serie_diaria(desde, max(fin, hoy + timedelta(days=1)))
+
+    resultado = {'anio': anio, 'mes': mes, 'hoy': hoy.isoformat()}
+    resultado['proyeccion'] = proyeccion(dias, totales, inicio, fin, hoy, semanas,
+                                         config.get('ANALITICA_PESO_HISTORIA_DIAS', 7))
+    hasta = min(fin, hoy + timedelta(days=1))
+    en_mes = (dias >= np.datetime64(inicio, 'D')) & (dias < np.datetime64(hasta, 'D'))
+    resultado['abc_platos'] = abc_platos(inicio, fin)
+    frontera = archivo_facturas.frontera()
+    resultado['mapa_horas'] = mapa_horas(inicio, fin, frontera)
+    resultado['rotacion_mesas'] = rotacion_mesas(inicio, fin, int((totales[en_mes] > 0).sum()), frontera)
+    return resultado
+
+
+class MemoAnalitica:
+    """Resultados por (año, mes, hoy, versión de facturas), LRU acotado."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, anio, mes, hoy, version=None):
+        """`version` permite pasar la versión ya leída (p. ej. por el modo asíncrono)."""
+        if version is None:
+            version = versiones_datos.leer(VERSION)[VERSION]
+        clave = (anio, mes, hoy, version)
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._entradas[clave]
+            self.fallos += 1
+        resultado = calcular(anio, mes, hoy)
+        with self._lock:
+            self._entradas[clave] = resultado
+            while len(self._entradas) > current_app.config.get('ANALITICA_MEMO_ENTRADAS', 24):
+                self._entradas.popitem(last=False)
+        return resultado
+
+    def estadisticas(self):
+        with self._lock:
+            return {'entradas': len(self._entradas), 'aciertos': self.aciertos, 'fallos': self.fallos}
+
+
+memo = MemoAnalitica()
+
+
+def analizar_mes(anio, mes, hoy=None):
+    return memo.obtener(anio, mes, hoy or date.today())
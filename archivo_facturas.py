@@ -0,0 +1,259 @@
+"""
+Archivo de facturas de meses cerrados.
+
+facturas y detalle_factura sólo crecen. `flask ventas archivar` mueve cada
+mes más viejo que ARCHIVO_MESES_VIVOS a facturas_archivo y
+detalle_factura_archivo, de a un mes y en orden, así lo archivado siempre es
+el principio del historial: todo lo anterior a la frontera (fin del último
+mes archivado) se lee del archivo y lo demás de las tablas vivas.
+
+Cada mes pasa por:
+  1. copiando: se reconstruye su resumen diario, que desde ahí queda congelado
+     (el dashboard y la analítica lo siguen leyendo), y se copian facturas y
+     líneas por lotes de factura_id con INSERT ... SELECT. Cada lote se
+     confirma junto con su avance (ultimo_id): el trabajo se puede cortar y
+     reanudar sin duplicar filas.
+  2. verificación: conteos y totales del archivo = tablas vivas = resumen
+     diario. Si no cuadran se descarta la copia del mes y se aborta.
+  3. borrando: la frontera avanza (las lecturas del mes pasan al archivo) y
+     las filas vivas se borran por lotes.
+  4. archivado.
+
+Las consultas de reportes arman sus fuentes con partes(desde, hasta,
+frontera): el archivo sólo entra si el rango empieza antes de la frontera, y
+las tablas vivas se filtran desde la frontera para no contar dos veces un mes
+a medio borrar.
+
+ARCHIVO_MESES_VIVOS debe ser mayor que el atraso máximo de la cola local de
+ventas (cola_facturas): una venta con fecha anterior a la frontera quedaría
+en las tablas vivas pero fuera de los reportes.
+"""
+import math
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from database import db, como_fecha
+from models import (Factura, DetalleFactura, FacturaArchivo, DetalleFacturaArchivo,
+                    PeriodoArchivado, VentaDiaria, VentaDiariaPlato)
+import rollup_ventas
+import versiones_datos
+
+COPIANDO, BORRANDO, ARCHIVADO = 'copiando', 'borrando', 'archivado'
+# Desde BORRANDO el archivo ya tiene el mes completo y verificado
+VISIBLES = (BORRANDO, ARCHIVADO)
+COLUMNAS_FACTURA = [c.name for c in FacturaArchivo.__table__.columns]
+COLUMNAS_DETALLE = [c.name for c in DetalleFacturaArchivo.__table__.columns]
+
+
+class ErrorArchivo(RuntimeError):
+    """La copia de un mes no cuadra con las tablas vivas o con su resumen diario."""
+
+
+def consulta_frontera():
+    return select(func.max(PeriodoArchivado.fin)).where(PeriodoArchivado.estado.in_(VISIBLES))
+
+
+def frontera():
+    """Primer día que se lee de las tablas vivas (None si no hay nada archivado)."""
+    return como_fecha(db.session.execute(consulta_frontera()).scalar())
+
+
+def _momento(valor):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.combine(valor, time())
+
+
+def partes(desde=None, hasta=None, frontera=None):
+    """
+    Fuentes que cubren [desde, hasta) en orden cronológico: lista de
+    (modelo de factura, modelo de detalle, condiciones sobre la fecha).
+    """
+    desde, hasta, frontera = _momento(desde), _momento(hasta), _momento(frontera)
+
+    def rango(modelo, inicio, fin):
+        return [c for c in (modelo.fecha >= inicio if inicio else None,
+                            modelo.fecha < fin if fin else None) if c is not None]
+
+    if frontera is None:
+        return [(Factura, DetalleFactura, rango(Factura, desde, hasta))]
+    resultado = []
+    if desde is None or desde < frontera:
+        resultado.append((FacturaArchivo, DetalleFacturaArchivo,
+                          rango(FacturaArchivo, desde, min(hasta, frontera) if hasta else frontera)))
+    if hasta is None or hasta > frontera:
+        resultado.append((Factura, DetalleFactura, rango(Factura, max(desde, frontera) if desde else frontera, hasta)))
+    return resultado
+
+
+def buscar_factura(factura_id):
+    """(factura, modelo de sus detalles) buscando primero en las tablas vivas; (None, None) si no existe."""
+    for modelo, detalle in ((Factura, DetalleFactura), (FacturaArchivo, DetalleFacturaArchivo)):
+        factura = db.session.get(modelo, factura_id)
+        if factura is not None:
+            return factura, detalle
+    return None, None
+
+
+def meses_a_archivar(hoy, meses_vivos):
+    """Meses [inicio, fin) desde la frontera hasta `meses_vivos` meses antes del actual."""
+    anio, mes = divmod(hoy.year * 12 + hoy.month - 1 - meses_vivos, 12)
+    limite = date(anio, mes + 1, 1)
+    consulta = select(func.min(Factura.fecha))
+    desde = frontera()
+    if desde:
+        consulta = consulta.where(Factura.fecha >= _momento(desde))
+    minimo = db.session.execute(consulta).scalar()
+    if minimo is None:
+        return []
+    inicio = como_fecha(minimo).replace(day=1)
+    meses = []
+    while inicio < limite:
+        fin = date(inicio.year + 1, 1, 1) if inicio.month == 12 else date(inicio.year, inicio.month + 1, 1)
+        meses.append((inicio, fin))
+        inicio = fin
+    return meses
+
+
+def _lote_ids(periodo, lote):
+    """Hasta `lote` factura_id vivos del mes posteriores al avance, en orden."""
+    return db.session.execute(
+        select(Factura.factura_id)
+        .where(Factura.fecha >= _momento(periodo.inicio), Factura.fecha < _momento(periodo.fin),
+               Factura.factura_id > periodo.ultimo_id)
+        .order_by(Factura.factura_id).limit(lote)).scalars().all()
+
+
+def _en_lote(periodo, tope):
+    # Rango de ids en lugar de IN (...): SQL Server admite hasta 2100 parámetros
+    return (Factura.fecha >= _momento(periodo.inicio), Factura.fecha < _momento(periodo.fin),
+            Factura.factura_id > periodo.ultimo_id, Factura.factura_id <= tope)
+
+
+def _copiar(periodo, lote, progreso):
+    while True:
+        ids = _lote_ids(periodo, lote)
+        if not ids:
+            return
+        filtro = _en_lote(periodo, ids[-1])
+        db.session.execute(insert(FacturaArchivo).from_select(
+            COLUMNAS_FACTURA, select(*(Factura.__table__.c[c] for c in COLUMNAS_FACTURA)).where(*filtro)))
+        db.session.execute(insert(DetalleFacturaArchivo).from_select(
+            COLUMNAS_DETALLE, select(*(DetalleFactura.__table__.c[c] for c in COLUMNAS_DETALLE))
+            .join(Factura, Factura.factura_id == DetalleFactura.factura_id).where(*filtro)))
+        periodo.ultimo_id = ids[-1]
+        db.session.commit()
+        if progreso:
+            progreso(periodo, len(ids))
+
+
+def _borrar(periodo, lote, progreso):
+    while True:
+        ids = _lote_ids(periodo, lote)
+        if not ids:
+            return
+        filtro = _en_lote(periodo, ids[-1])
+        db.session.execute(delete(DetalleFactura).where(
+            DetalleFactura.factura_id.in_(select(Factura.factura_id).where(*filtro))))
+        db.session.execute(delete(Factura).where(*filtro))
+        periodo.ultimo_id = ids[-1]
+        db.session.commit()
+        if progreso:
+            progreso(periodo, len(ids))
+
+
+def totales(factura, detalle, inicio, fin):
+    """Conteos e importes de un mes en una fuente (tablas vivas o archivo)."""
+    en_mes = (factura.fecha >= _momento(inicio), factura.fecha < _momento(fin))
+    f = db.session.execute(select(
+        func.count(factura.factura_id), func.sum(factura.subtotal), func.sum(factura.impuesto),
+        func.sum(factura.propina_legal), func.sum(factura.total)).where(*en_mes)).one()
+    d = db.session.execute(select(func.count(detalle.detalle_id), func.sum(detalle.total_linea))
+                           .join(factura, factura.factura_id == detalle.factura_id).where(*en_mes)).one()
+    return {'facturas': f[0], 'subtotal': f[1] or 0.0, 'impuesto': f[2] or 0.0, 'propina_legal': f[3] or 0.0,
+            'total': f[4] or 0.0, 'detalles': d[0], 'importe_lineas': d[1] or 0.0}
+
+
+def totales_resumen(inicio, fin):
+    """Lo mismo según el resumen diario (sin conteo de líneas)."""
+    v = db.session.execute(select(
+        func.sum(VentaDiaria.facturas), func.sum(VentaDiaria.subtotal), func.sum(VentaDiaria.impuesto),
+        func.sum(VentaDiaria.propina_legal), func.sum(VentaDiaria.total))
+        .where(VentaDiaria.fecha >= inicio, VentaDiaria.fecha < fin)).one()
+    importe = db.session.execute(select(func.sum(VentaDiariaPlato.importe))
+                                 .where(VentaDiariaPlato.fecha >= inicio, VentaDiariaPlato.fecha < fin)).scalar()
+    return {'facturas': v[0] or 0, 'subtotal': v[1] or 0.0, 'impuesto': v[2] or 0.0, 'propina_legal': v[3] or 0.0,
+            'total': v[4] or 0.0, 'importe_lineas': importe or 0.0}
+
+
+def diferencias(esperado, obtenido):
+    """Claves en las que dos juegos de totales no cuadran (importes con tolerancia de un centavo)."""
+    return [k for k in esperado if k in obtenido and not (
+        esperado[k] == obtenido[k] if isinstance(esperado[k], int)
+        else math.isclose(esperado[k], obtenido[k], rel_tol=1e-9, abs_tol=0.01))]
+
+
+def _verificar(periodo):
+    vivo = totales(Factura, DetalleFactura, periodo.inicio, periodo.fin)
+    archivo = totales(FacturaArchivo, DetalleFacturaArchivo, periodo.inicio, periodo.fin)
+    problemas = [f"archivo.{k}" for k in diferencias(vivo, archivo)] + \
+                [f"resumen.{k}" for k in diferencias(vivo, totales_resumen(periodo.inicio, periodo.fin))]
+    if problemas:
+        # La copia se descarta entera: la próxima corrida empieza el mes de cero
+        en_mes = (FacturaArchivo.fecha >= _momento(periodo.inicio), FacturaArchivo.fecha < _momento(periodo.fin))
+        db.session.execute(delete(DetalleFacturaArchivo).where(DetalleFacturaArchivo.factura_id.in_(
+            select(FacturaArchivo.factura_id).where(*en_mes))))
+        db.session.execute(delete(FacturaArchivo).where(*en_mes))
+        db.session.delete(periodo)
+        db.session.commit()
+        raise ErrorArchivo(f"{periodo.inicio:%Y-%m} no cuadra ({', '.join(problemas)}); no se archivó")
+    for clave in ('facturas', 'detalles', 'subtotal', 'impuesto', 'propina_legal', 'total'):
+        setattr(periodo, clave, vivo[clave])
+
+
+def procesar(periodo, lote=5000, progreso=None):
+    """Lleva un mes desde su estado actual hasta ARCHIVADO."""
+    if periodo.estado == COPIANDO:
+        if not periodo.ultimo_id:
+            # El resumen queda congelado: se recalcula antes para que sea fiel a las facturas
+            rollup_ventas.reconstruir(periodo.inicio, periodo.fin - timedelta(days=1))
+        _copiar(periodo, lote, progreso)
+        _verificar(periodo)
+        periodo.estado, periodo.ultimo_id = BORRANDO, 0
+        versiones_datos.incrementar('facturas')
+        db.session.commit()
+    if periodo.estado == BORRANDO:
+        _borrar(periodo, lote, progreso)
+        periodo.estado, periodo.terminado = ARCHIVADO, datetime.now()
+        db.session.commit()
+    return periodo
+
+
+def archivar(meses_vivos, hoy=None, lote=5000, progreso=None):
+    """
+    Archiva todos los meses más viejos que `meses_vivos`, terminando primero los
+    que hayan quedado a medias. Devuelve la lista de meses procesados.
+    """
+    procesados = []
+    for periodo in PeriodoArchivado.query.filter(PeriodoArchivado.estado != ARCHIVADO)\
+            .order_by(PeriodoArchivado.inicio).all():
+        procesados.append(procesar(periodo, lote, progreso))
+    for inicio, fin in meses_a_archivar(hoy or date.today(), meses_vivos):
+        periodo = PeriodoArchivado(inicio=inicio, fin=fin, estado=COPIANDO, ultimo_id=0)
+        db.session.add(periodo)
+        db.session.commit()
+        procesados.append(procesar(periodo, lote, progreso))
+    return procesados
+
+
+def estado():
+    """Frontera y meses archivados con sus totales congelados."""
+    limite = frontera()
+    return {
+        'frontera': limite.isoformat() if limite else None,
+        'periodos': [{
+            'inicio': p.inicio.isoformat(), 'estado': p.estado, 'facturas': p.facturas, 'detalles': p.detalles,
+            'total': round(p.total, 2), 'terminado': p.terminado.isoformat() if p.terminado else None,
+        } for p in PeriodoArchivado.query.order_by(PeriodoArchivado.inicio)],
+    }
@@ -0,0 +1,118 @@
+"""
+Asesor de índices: recorre las rutas de lectura de la app sobre una base SQLite
+sembrada, captura cada sentencia SQL, obtiene su plan con EXPLAIN QUERY PLAN y
+marca los recorridos completos de tabla (SCAN sin índice).
+
+    python -m benchmarks.asesor_indices --escala 1
+
+Sale con código 1 si alguna ruta hace un SCAN sobre una tabla que no esté en
+--permitir (por defecto los catálogos pequeños), para usarlo como verificación
+local antes de subir cambios que alteren la forma de las consultas.
+"""
+import argparse
+import os
+import re
+import sys
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from benchmarks.comun import crear_app
+from benchmarks.generador import generar
+from database import db
+
+# Catálogos pequeños donde un SCAN es aceptable
+PERMITIDAS = "mesas,categorias,Menu,versiones_datos"
+
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)")
+
+
+def tablas_recorridas(pasos):
+    """Tablas con SCAN completo en el plan; los alias de SQLAlchemy (mesas_1) cuentan como su tabla."""
+    return [re.sub(r"_\d+$", "", m.group(1)) for m in (_SCAN.match(p) for p in pasos) if m]
+
+
+def rutas():
+    manana = (datetime.now() + timedelta(days=1)).replace(hour=20, minute=0)
+    return [
+        "/", "/dashboard", "/historial", "/historial?cliente_id=7", "/historial/1/detalles",
+        "/clientes", "/clientes?q=maria", "/clientes/buscar?q=809", "/menu",
+        "/facturar_directo", "/facturar/1", "/mesas", "/reservaciones",
+        "/reservaciones?vista=proximas",
+        f"/reservaciones?vista=dia&dia={manana:%Y-%m-%d}",
+        f"/reservaciones/disponibles?fecha={manana:%Y-%m-%dT%H:%M}&personas=4",
+    ]
+
+
+def capturar(app, ruta):
+    """Ejecuta la ruta y devuelve (status, [(sentencia, parámetros)])."""
+    capturadas = []
+
+    def antes(conn, cursor, sentencia, parametros, contexto, executemany):
+        if not executemany and sentencia.lstrip().upper().startswith("SELECT"):
+            capturadas.append((sentencia, parametros))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", antes)
+    try:
+        respuesta = app.test_client().get(ruta)
+    finally:
+        event.remove(engine, "before_cursor_execute", antes)
+    return respuesta.status_code, capturadas
+
+
+def plan(app, sentencia, parametros):
+    with app.app_context():
+        conn = db.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("EXPLAIN QUERY PLAN " + sentencia, parametros)
+            return [fila[-1] for fila in cursor.fetchall()]
+        finally:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='asesor_indices.db')
+    parser.add_argument('--escala', type=int, default=1)
+    parser.add_argument('--anios', type=int, default=1)
+    parser.add_argument('--reusar', action='store_true', help="no regenerar la base si ya existe")
+    parser.add_argument('--permitir', default=PERMITIDAS,
+                        help="tablas donde un SCAN completo no cuenta como problema")
+    args = parser.parse_args()
+    permitidas = {t.strip().lower() for t in args.permitir.split(",") if t.strip()}
+
+    regenerar = not (args.reusar and os.path.exists(args.db))
+    app = crear_app(args.db, recrear=regenerar, con_rutas=True)
+    if regenerar:
+        with app.app_context():
+            generar(args.escala, args.anios, progreso=lambda m: None)
+
+    problemas = 0
+    for ruta in rutas():
+        status, sentencias = capturar(app, ruta)
+        formas = OrderedDict()
+        for sentencia, parametros in sentencias:
+            formas.setdefault(sentencia, [parametros, 0])[1] += 1
+        print(f"\n{ruta}  [HTTP {status}, {len(sentencias)} consultas, {len(formas)} formas distintas]")
+        for sentencia, (parametros, veces) in formas.items():
+            pasos = plan(app, sentencia, parametros)
+            scans = tablas_recorridas(pasos)
+            malos = [t for t in scans if t.lower() not in permitidas]
+            problemas += len(malos)
+            marca = "SCAN " + ",".join(malos) if malos else ("ok" if not scans else "scan permitido")
+            resumen = " ".join(sentencia.split())
+            print(f"  [{marca:>22}] x{veces:<3} {resumen[:110]}")
+            for paso in pasos:
+                if "TEMP B-TREE" in paso or (malos and paso.startswith("SCAN")):
+                    print(f"  {'':>24} {paso}")
+
+    print(f"\n{problemas} recorridos completos no permitidos")
+    sys.exit(1 if problemas else 0)
+
+
+if __name__ == '__main__':
+    main()
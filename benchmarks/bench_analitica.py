@@ -0,0 +1,77 @@
+"""
+Analítica del dashboard (analitica_ventas.py): tiempo y consultas del cálculo
+completo contra la versión memorizada, y error de la proyección de cierre de
+mes contra la anterior (total del mes * 1.15) en meses ya cerrados, como si se
+hubiera consultado el día --corte de cada mes.
+
+    python -m benchmarks.bench_analitica --escala 2 --anios 1 --corte 10
+"""
+import argparse
+import time
+from datetime import date
+
+from benchmarks.comun import crear_app, ContadorConsultas
+from benchmarks.generador import generar
+from database import db
+from metricas_dashboard import rango_mes, ventas_por_dia
+import analitica_ventas
+
+
+def meses_cerrados(hoy, cantidad):
+    anio, mes = hoy.year, hoy.month
+    for _ in range(cantidad):
+        anio, mes = (anio - 1, 12) if mes == 1 else (anio, mes - 1)
+        yield anio, mes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='bench_analitica.db')
+    parser.add_argument('--escala', type=int, default=1)
+    parser.add_argument('--anios', type=int, default=1)
+    parser.add_argument('--corte', type=int, default=10, help="día del mes en que se proyecta")
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True)
+    with app.app_context():
+        generar(args.escala, args.anios, progreso=lambda m: None)
+        hoy = date.today()
+
+        with ContadorConsultas(db.engine) as contador:
+            inicio = time.perf_counter()
+            analitica_ventas.calcular(hoy.year, hoy.month, hoy)
+            frio = time.perf_counter() - inicio
+        analitica_ventas.analizar_mes(hoy.year, hoy.month, hoy)
+        with ContadorConsultas(db.engine) as memo:
+            inicio = time.perf_counter()
+            for _ in range(args.repeticiones):
+                analitica_ventas.analizar_mes(hoy.year, hoy.month, hoy)
+            caliente = (time.perf_counter() - inicio) / args.repeticiones
+        print(f"cálculo completo: {frio * 1000:.1f} ms, {contador.total} consultas")
+        print(f"memorizado:       {caliente * 1000:.2f} ms, {memo.total / args.repeticiones:.0f} consulta(s)")
+
+        print(f"\n{'mes':>8} {'real':>12} {'x1.15':>12} {'error':>7} {'nueva':>12} {'error':>7}")
+        errores_viejo, errores_nuevo = [], []
+        for anio, mes in meses_cerrados(hoy, max(1, 12 * args.anios - 2)):
+            inicio_mes, fin_mes = rango_mes(anio, mes)
+            corte = inicio_mes.replace(day=args.corte)
+            por_dia = ventas_por_dia([(inicio_mes, fin_mes)])
+            real = sum(por_dia.values())
+            if not real:
+                continue
+            vendido = sum(t for d, t in por_dia.items() if d <= corte)
+            viejo = vendido * 1.15
+            nuevo = analitica_ventas.calcular(anio, mes, corte)['proyeccion']['total']
+            errores_viejo.append(abs(viejo - real) / real)
+            errores_nuevo.append(abs(nuevo - real) / real)
+            print(f"{anio}-{mes:02d} {real:>12,.0f} {viejo:>12,.0f} {errores_viejo[-1]:>7.1%} "
+                  f"{nuevo:>12,.0f} {errores_nuevo[-1]:>7.1%}")
+        if errores_nuevo:
+            print(f"\nMAPE x1.15: {sum(errores_viejo) / len(errores_viejo):.1%}   "
+                  f"MAPE proyección: {sum(errores_nuevo) / len(errores_nuevo):.1%}")
+        db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Archivo de facturas (archivo_facturas.py): tiempo del trabajo de archivo y
+costo de las pantallas que leen facturas antes y después de archivar los
+meses viejos. Comprueba además que la exportación completa (que cruza la
+frontera) devuelve las mismas líneas y el mismo total.
+
+    python -m benchmarks.bench_archivo --escala 2 --anios 3 --meses-vivos 6
+"""
+import argparse
+import time
+
+from benchmarks.comun import crear_app, ContadorConsultas
+from benchmarks.generador import generar
+from database import db
+from models import Factura, FacturaArchivo
+import archivo_facturas
+import exportacion
+
+RUTAS = ["/historial", "/historial?por_pagina=200", "/dashboard"]
+
+
+def medir_rutas(app, cliente, repeticiones):
+    with app.app_context():
+        engine = db.engine
+    resultados = {}
+    for ruta in RUTAS:
+        with ContadorConsultas(engine) as contador:
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                cliente.get(ruta)
+            resultados[ruta] = ((time.perf_counter() - inicio) / repeticiones * 1000,
+                                contador.total / repeticiones)
+    return resultados
+
+
+def exportacion_completa(app):
+    with app.app_context():
+        lineas = total = 0
+        for fila in exportacion.filas():
+            lineas += 1
+            total += fila[12]
+        db.session.remove()
+    return lineas, round(total, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='bench_archivo.db')
+    parser.add_argument('--escala', type=int, default=1)
+    parser.add_argument('--anios', type=int, default=3)
+    parser.add_argument('--meses-vivos', type=int, default=6)
+    parser.add_argument('--lote', type=int, default=5000)
+    parser.add_argument('--repeticiones', type=int, default=20)
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True, con_rutas=True, ajustes={'CACHE_PAGINAS_ACTIVA': False})
+    cliente = app.test_client()
+    with app.app_context():
+        generar(args.escala, args.anios, progreso=lambda m: None)
+        db.session.remove()
+
+    antes = medir_rutas(app, cliente, args.repeticiones)
+    export_antes = exportacion_completa(app)
+
+    with app.app_context():
+        inicio = time.perf_counter()
+        periodos = archivo_facturas.archivar(args.meses_vivos, lote=args.lote)
+        segundos = time.perf_counter() - inicio
+        vivas = db.session.query(Factura).count()
+        archivadas = db.session.query(FacturaArchivo).count()
+        db.session.remove()
+    print(f"archivo: {len(periodos)} meses, {archivadas:,} facturas archivadas, {vivas:,} vivas, "
+          f"{segundos:.1f} s ({archivadas / segundos if segundos else 0:,.0f} facturas/s)")
+
+    despues = medir_rutas(app, cliente, args.repeticiones)
+    export_despues = exportacion_completa(app)
+
+    print(f"\n{'ruta':<28} {'ms antes':>9} {'SQL':>5} {'ms después':>11} {'SQL':>5}")
+    for ruta in RUTAS:
+        print(f"{ruta:<28} {antes[ruta][0]:>9.1f} {antes[ruta][1]:>5.0f} "
+              f"{despues[ruta][0]:>11.1f} {despues[ruta][1]:>5.0f}")
+    print(f"\nexportación completa: {export_antes[0]:,} líneas ${export_antes[1]:,.2f} antes, "
+          f"{export_despues[0]:,} líneas ${export_despues[1]:,.2f} después "
+          f"-> {'OK' if export_antes == export_despues else 'DIFERENTE'}")
+
+
+if __name__ == '__main__':
+    main()
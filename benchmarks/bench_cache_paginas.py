@@ -0,0 +1,73 @@
+"""
+Caché de páginas (cache_paginas.py): latencia y consultas SQL de /menu, /mesas
+y /historial renderizando siempre, sirviendo la copia en memoria y respondiendo
+304 a un navegador que ya tiene la página. Al final se registra una mesa y se
+comprueba que la página cambie (la versión invalida la copia).
+
+    python -m benchmarks.bench_cache_paginas --repeticiones 200 --por-pagina 200
+"""
+import argparse
+import time
+
+from benchmarks.comun import crear_app, ContadorConsultas
+from benchmarks.generador import generar
+from database import db
+import cache_paginas
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))] if valores else 0.0
+
+
+def medir(cliente, engine, url, repeticiones, cabeceras=None):
+    tiempos, consultas, estados = [], 0, set()
+    for _ in range(repeticiones):
+        with ContadorConsultas(engine) as contador:
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url, headers=cabeceras or {})
+            tiempos.append(time.perf_counter() - inicio)
+        consultas += contador.total
+        estados.add(respuesta.status_code)
+    return percentil(tiempos, 50) * 1000, percentil(tiempos, 95) * 1000, consultas / repeticiones, estados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='bench_cache_paginas.db')
+    parser.add_argument('--repeticiones', type=int, default=100)
+    parser.add_argument('--por-pagina', type=int, default=200, help="facturas por página del historial")
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True, con_rutas=True, ajustes={'HISTORIAL_MAX_POR_PAGINA': args.por_pagina})
+    with app.app_context():
+        generar(escala=1, anios=1, progreso=lambda m: None)
+        engine = db.engine
+        db.session.remove()
+    cliente = app.test_client()
+    rutas = ["/menu", "/mesas", f"/historial?por_pagina={args.por_pagina}"]
+
+    print(f"{'ruta':<30} {'modo':<10} {'p50 ms':>8} {'p95 ms':>8} {'SQL/pet':>8} {'estado':>7}")
+    for url in rutas:
+        app.config['CACHE_PAGINAS_ACTIVA'] = False
+        sin = medir(cliente, engine, url, args.repeticiones)
+        app.config['CACHE_PAGINAS_ACTIVA'] = True
+        cache_paginas.vaciar()
+        etag = cliente.get(url).headers.get('ETag')
+        con = medir(cliente, engine, url, args.repeticiones)
+        no_mod = medir(cliente, engine, url, args.repeticiones, {'If-None-Match': etag})
+        for modo, (p50, p95, sql, estados) in (("render", sin), ("memoria", con), ("304", no_mod)):
+            print(f"{url:<30} {modo:<10} {p50:>8.2f} {p95:>8.2f} {sql:>8.1f} "
+                  f"{','.join(map(str, sorted(estados))):>7}")
+
+    antes = cliente.get("/mesas").headers.get('ETag')
+    cliente.post("/mesas", data={'nombre': "Mesa bench", 'capacidad': 4})
+    cliente.get("/mesas")  # consume el flash del alta
+    despues = cliente.get("/mesas")
+    print(f"\nTras registrar una mesa: ETag {'cambió' if despues.headers.get('ETag') != antes else 'NO cambió'}, "
+          f"{'incluye' if 'Mesa bench' in despues.get_data(as_text=True) else 'NO incluye'} la mesa nueva")
+    print("Caché:", cache_paginas.estadisticas())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Búsqueda de clientes: LIKE '%q%' sobre tres columnas (versión anterior)
+contra busqueda_clientes.buscar (prefijos indexados), con 500k clientes.
+
+    python -m benchmarks.bench_clientes --clientes 500000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.comun import crear_app, medir, en_lotes
+from database import db
+from models import Cliente
+import busqueda_clientes
+
+NOMBRES = ["José", "María", "Ramón", "Ángela", "Luis", "Sofía", "Andrés", "Lucía", "Héctor",
+           "Inés", "Julio", "Carmen", "Raúl", "Noemí", "Martín", "Begoña", "Tomás", "Elena"]
+APELLIDOS = ["Pérez", "Gómez", "Rodríguez", "Núñez", "Martínez", "Fernández", "López", "Díaz",
+             "Sánchez", "Ramírez", "Peña", "Castillo", "Almánzar", "Báez", "Mejía", "Ureña"]
+CONSULTAS = ["mar", "jose perez", "Núñez", "809555", "lucia.d", "raul baez", "zzz"]
+
+
+def sembrar(total, lote=20000):
+    rnd = random.Random(11)
+
+    def clientes():
+        for i in range(1, total + 1):
+            nombre = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+            usuario = busqueda_clientes.sin_acentos(nombre.split()[0] + "." + nombre.split()[1][0])
+            yield {'cliente_id': i, 'nombre': nombre,
+                   'telefono': f"{rnd.choice(['809', '829', '849'])}-{rnd.randint(200, 999)}-{rnd.randint(0, 9999):04d}",
+                   'email': f"{usuario}{i}@correo.com"}
+
+    for filas in en_lotes(clientes(), lote):
+        db.session.execute(Cliente.__table__.insert(), filas)
+        db.session.commit()
+
+
+def buscar_legado(q):
+    return Cliente.query.filter(
+        (Cliente.nombre.like(f"%{q}%")) |
+        (Cliente.email.like(f"%{q}%")) |
+        (Cliente.telefono.like(f"%{q}%"))
+    ).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clientes', type=int, default=500_000)
+    parser.add_argument('--db', default='bench_clientes.db')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True)
+    tiempos = {}
+    with app.app_context():
+        with medir(tiempos, 'siembra'):
+            sembrar(args.clientes)
+        with medir(tiempos, 'indice'):
+            busqueda_clientes.reindexar(20000)
+        print(f"{args.clientes:,} clientes sembrados en {tiempos['siembra']:.1f}s, "
+              f"indexados en {tiempos['indice']:.1f}s")
+
+        print(f"{'consulta':<14}{'LIKE %q% (ms)':>15}{'filas':>9}{'prefijo (ms)':>15}{'filas':>7}")
+        for q in CONSULTAS:
+            fila = [q]
+            for funcion in (buscar_legado, busqueda_clientes.buscar):
+                inicio = time.perf_counter()
+                for _ in range(args.repeticiones):
+                    res = funcion(q)
+                    db.session.expunge_all()
+                fila += [(time.perf_counter() - inicio) * 1000 / args.repeticiones, len(res)]
+            print(f"{fila[0]:<14}{fila[1]:>15.1f}{fila[2]:>9}{fila[3]:>15.1f}{fila[4]:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Compara las consultas del dashboard: versión anterior (9+ consultas con
+CAST/date() sobre la columna, recorriendo facturas) contra metricas_dashboard
+(dos consultas sobre el resumen ventas_diarias).
+
+    python -m benchmarks.bench_dashboard --facturas 1000000
+"""
+import argparse
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, desc
+
+from benchmarks.comun import crear_app, ContadorConsultas, medir, en_lotes
+from database import db
+from metricas_dashboard import obtener_metricas, rango_mes
+import rollup_ventas
+from models import Factura, DetalleFactura
+
+PLATOS = [f"Plato {i}" for i in range(1, 41)]
+
+
+def sembrar(total_facturas, dias_historia=730, lote=50000):
+    hoy = datetime.now()
+    rnd = random.Random(42)
+
+    def facturas():
+        for i in range(1, total_facturas + 1):
+            subtotal = round(rnd.uniform(10, 300), 2)
+            yield {
+                'factura_id': i, 'reservacion_id': 1, 'cliente_id': 1,
+                'fecha': hoy - timedelta(minutes=rnd.randrange(dias_historia * 24 * 60)),
+                'subtotal': subtotal, 'impuesto': subtotal * 0.18,
+                'propina_legal': subtotal * 0.10, 'total': subtotal * 1.28,
+            }
+
+    for filas in en_lotes(facturas(), lote):
+        db.session.execute(Factura.__table__.insert(), filas)
+        db.session.execute(DetalleFactura.__table__.insert(), [{
+            'factura_id': f['factura_id'], 'plato_id': 1, 'cantidad': rnd.randint(1, 4),
+            'precio_unitario': f['subtotal'], 'descripcion': rnd.choice(PLATOS),
+            'total_linea': f['subtotal'],
+        } for f in filas])
+        db.session.commit()
+
+
+def metricas_legado(hoy, fecha_inicio, fecha_fin):
+    """Réplica de la lógica anterior de index_controller.dashboard (date() == CAST AS DATE en SQLite)."""
+    total_hoy = db.session.query(func.sum(Factura.total)).filter(
+        func.date(Factura.fecha) == hoy.isoformat()).scalar() or 0
+    total_mes = db.session.query(func.sum(Factura.total)).filter(
+        Factura.fecha >= fecha_inicio, Factura.fecha < fecha_fin).scalar() or 0
+    data = []
+    for i in range(6, -1, -1):
+        dia_busqueda = hoy - timedelta(days=i)
+        data.append(float(db.session.query(func.sum(Factura.total)).filter(
+            func.date(Factura.fecha) == dia_busqueda.isoformat()).scalar() or 0))
+    top = db.session.query(
+        DetalleFactura.descripcion, func.sum(DetalleFactura.cantidad).label('total_vendido')
+    ).join(Factura).filter(Factura.fecha >= fecha_inicio, Factura.fecha < fecha_fin)\
+     .group_by(DetalleFactura.descripcion).order_by(desc('total_vendido')).limit(5).all()
+    return {'total_hoy': total_hoy, 'total_mes': total_mes, 'data': data, 'top_platos': top}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--facturas', type=int, default=1_000_000)
+    parser.add_argument('--db', default='bench_dashboard.db')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True)
+    tiempos = {}
+    with app.app_context():
+        with medir(tiempos, 'siembra'):
+            sembrar(args.facturas)
+        print(f"Sembradas {args.facturas:,} facturas en {tiempos['siembra']:.1f}s")
+        with medir(tiempos, 'rollup'):
+            dias = rollup_ventas.reconstruir()
+        print(f"Resumen diario reconstruido ({dias} días) en {tiempos['rollup']:.1f}s")
+
+        hoy = date.today()
+        inicio, fin = rango_mes(hoy.year, hoy.month)
+        for nombre, funcion in (('legado', metricas_legado), ('agrupado', obtener_metricas)):
+            with ContadorConsultas(db.engine) as contador:
+                for _ in range(args.repeticiones):
+                    with medir(tiempos, nombre):
+                        resultado = funcion(hoy, inicio, fin)
+                    db.session.rollback()
+            consultas = contador.total // args.repeticiones
+            print(f"{nombre:>9}: {consultas} consultas, {tiempos[nombre] * 1000:.1f} ms "
+                  f"(última ejecución), total mes {float(resultado['total_mes']):,.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Exportación de líneas de factura: filas por segundo y memoria máxima (tracemalloc)
+para distintos tamaños. La memoria debe quedar igual de 1k a millones de líneas.
+
+    python -m benchmarks.bench_exportacion --lineas 1000,100000,1000000 --formato xlsx
+"""
+import argparse
+import tracemalloc
+
+from benchmarks.bench_dashboard import sembrar
+from benchmarks.comun import crear_app
+from database import db
+import exportacion
+
+
+def exportar(formato):
+    """Exporta todo a un destino que sólo cuenta bytes; devuelve (medidor, bytes, pico_bytes)."""
+    medidor = exportacion.Medidor(exportacion.filas())
+    escritos = 0
+    tracemalloc.start()
+    try:
+        for trozo in exportacion.en_trozos(formato, medidor):
+            escritos += len(trozo)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return medidor, escritos, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lineas', default="1000,100000,1000000")
+    parser.add_argument('--formato', choices=sorted(exportacion.FORMATOS), default='csv')
+    parser.add_argument('--db', default='bench_exportacion.db')
+    args = parser.parse_args()
+
+    print(f"{'líneas':>10} {'segundos':>9} {'líneas/s':>10} {'MB archivo':>11} {'MB pico':>8}")
+    for total in (int(x) for x in args.lineas.split(",")):
+        app = crear_app(args.db, recrear=True)
+        with app.app_context():
+            sembrar(total)
+            medidor, escritos, pico = exportar(args.formato)
+            db.session.remove()
+        print(f"{medidor.total:>10,} {medidor.segundos:>9.1f} {medidor.filas_por_segundo:>10,} "
+              f"{escritos / 2**20:>11.1f} {pico / 2**20:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
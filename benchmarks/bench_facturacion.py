@@ -0,0 +1,94 @@
+"""
+Facturas por segundo: procesar_venta anterior (un Plato.query.get y un
+session.add por línea) contra facturacion.calcular_lineas/guardar_factura
+(una consulta IN y un INSERT multi-fila).
+
+    python -m benchmarks.bench_facturacion --facturas 2000 --lineas 30
+"""
+import argparse
+import random
+from datetime import datetime
+
+from benchmarks.comun import crear_app, ContadorConsultas, medir
+from database import db
+from models import Factura, DetalleFactura, Plato, Categoria, Cliente, Reservacion
+import facturacion
+import rollup_ventas
+
+
+def sembrar_menu(platos=200):
+    db.session.add(Categoria(categoria_id=1, nombre="General"))
+    db.session.add(Cliente(cliente_id=1, nombre="Cliente General"))
+    db.session.add(Reservacion(reservacion_id=1, fecha="2026-01-01 12:00", personas=0, cliente_id=1))
+    db.session.execute(Plato.__table__.insert(), [
+        {'plato_id': i, 'nombre': f"Plato {i}", 'precio': 5.0 + i % 40, 'categoria_id': 1}
+        for i in range(1, platos + 1)])
+    db.session.commit()
+
+
+def venta_legado(p_ids, cants, es_local):
+    """Réplica del procesar_venta anterior, sin flash/redirect."""
+    subtotal = 0
+    detalles_datos = []
+    for i in range(len(p_ids)):
+        cantidad = int(cants[i])
+        if cantidad > 0:
+            plato = Plato.query.get(int(p_ids[i]))
+            precio_unitario = plato.precio if (plato and plato.precio is not None) else 0.0
+            monto_linea = precio_unitario * cantidad
+            subtotal += monto_linea
+            detalles_datos.append({'p': plato, 'q': cantidad, 'm': monto_linea,
+                                   'precio': precio_unitario, 'nombre': plato.nombre})
+    itbis = subtotal * 0.18
+    propina = subtotal * 0.10 if es_local else 0.0
+    f = Factura(reservacion_id=1, cliente_id=1, fecha=datetime.now(), subtotal=subtotal,
+                impuesto=itbis, propina_legal=propina, total=subtotal + itbis + propina)
+    db.session.add(f)
+    db.session.flush()
+    lineas = []
+    for d in detalles_datos:
+        db.session.add(DetalleFactura(factura_id=f.factura_id, plato_id=d['p'].plato_id, cantidad=d['q'],
+                                      precio_unitario=d['precio'], descripcion=d['nombre'], total_linea=d['m']))
+        lineas.append({'plato_id': d['p'].plato_id, 'descripcion': d['nombre'],
+                       'cantidad': d['q'], 'total_linea': d['m']})
+    rollup_ventas.registrar_factura(f, lineas)
+    db.session.commit()
+
+
+def venta_lote(p_ids, cants, es_local):
+    lineas, subtotal = facturacion.calcular_lineas(p_ids, cants)
+    facturacion.guardar_factura(1, 1, lineas, subtotal, es_local)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--facturas', type=int, default=2000)
+    parser.add_argument('--lineas', type=int, default=30, help="líneas por factura")
+    parser.add_argument('--db', default='bench_facturacion.db')
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    pedidos = [([str(rnd.randint(1, 200)) for _ in range(args.lineas)],
+                [str(rnd.randint(1, 3)) for _ in range(args.lineas)])
+               for _ in range(args.facturas)]
+
+    for nombre, venta in (('legado', venta_legado), ('lote', venta_lote)):
+        app = crear_app(args.db, recrear=True)
+        tiempos = {}
+        with app.app_context():
+            sembrar_menu()
+            with ContadorConsultas(db.engine) as contador, medir(tiempos, nombre):
+                for p_ids, cants in pedidos:
+                    venta(p_ids, cants, es_local=True)
+                    # Sesión limpia por factura, como en una petición real
+                    db.session.remove()
+            segundos = tiempos[nombre]
+            print(f"{nombre:>7}: {args.facturas / segundos:,.1f} facturas/s, "
+                  f"{contador.total / args.facturas:.1f} sentencias por factura")
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Cambio de precios de temporada: N ediciones plato por plato (POST /menu/editar/<id>,
+un commit y una invalidación cada una) contra un solo POST /menu/importar con
+el CSV completo. Reporta tiempo, sentencias SQL y versiones del menú consumidas.
+
+    python -m benchmarks.bench_importacion_menu --platos 200
+"""
+import argparse
+import time
+
+from benchmarks.comun import crear_app, ContadorConsultas
+from database import db
+from models import Categoria, Plato
+import versiones_datos
+
+
+def sembrar(platos):
+    db.session.execute(Categoria.__table__.insert(), [{'categoria_id': i, 'nombre': f"Categoría {i}"}
+                                                      for i in range(1, 7)])
+    db.session.execute(Plato.__table__.insert(), [{'plato_id': i, 'nombre': f"Plato {i}",
+                                                   'precio': 10.0 + i % 30, 'categoria_id': i % 6 + 1}
+                                                  for i in range(1, platos + 1)])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='bench_importacion_menu.db')
+    parser.add_argument('--platos', type=int, default=200)
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True, con_rutas=True)
+    cliente = app.test_client()
+    with app.app_context():
+        sembrar(args.platos)
+        engine = db.engine
+        db.session.remove()
+
+    def version():
+        with app.app_context():
+            v = versiones_datos.leer('menu')['menu']
+            db.session.remove()
+            return v
+
+    v0 = version()
+    with ContadorConsultas(engine) as uno_a_uno:
+        inicio = time.perf_counter()
+        for i in range(1, args.platos + 1):
+            cliente.post(f"/menu/editar/{i}", data={'nombre': f"Plato {i}", 'precio': 11.0 + i % 30,
+                                                    'categoria_id': i % 6 + 1})
+        segundos_uno = time.perf_counter() - inicio
+    v1 = version()
+
+    csv = "nombre,precio,categoria\n" + "".join(f"Plato {i},{12.0 + i % 30:.2f},Categoría {i % 6 + 1}\n"
+                                                for i in range(1, args.platos + 1))
+    with ContadorConsultas(engine) as masivo:
+        inicio = time.perf_counter()
+        respuesta = cliente.post("/menu/importar", data=csv.encode(), content_type="text/csv")
+        segundos_masivo = time.perf_counter() - inicio
+    v2 = version()
+    reporte = respuesta.get_json()
+
+    print(f"{'modo':<14} {'segundos':>9} {'SQL':>7} {'versiones':>10}")
+    print(f"{'uno a uno':<14} {segundos_uno:>9.2f} {uno_a_uno.total:>7} {v1 - v0:>10}")
+    print(f"{'importación':<14} {segundos_masivo:>9.2f} {masivo.total:>7} {v2 - v1:>10}")
+    print(f"\nReporte: {len(reporte['modificados'])} modificados, {len(reporte['nuevos'])} nuevos, "
+          f"{len(reporte['errores'])} errores (HTTP {respuesta.status_code})")
+
+
+if __name__ == '__main__':
+    main()
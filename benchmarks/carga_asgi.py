@@ -0,0 +1,173 @@
+"""
+Prueba de carga del modo asíncrono (servidor_async.py) contra los workers
+síncronos: levanta la misma app con gunicorn (o waitress si no hay gunicorn) y
+con uvicorn, con la misma cantidad de procesos, y golpea /dashboard,
+/historial, /reservaciones y /clientes?q= con N clientes concurrentes durante
+un tiempo fijo. Reporta peticiones por segundo, p50/p95 y errores.
+
+    python -m benchmarks.carga_asgi --workers 2 --clientes 8,32 --latencia-ms 5
+
+SQLite local responde en microsegundos, así que --latencia-ms agrega una espera
+por sentencia (en el hilo del driver) para simular la ida y vuelta a SQL Server:
+es lo que los workers síncronos no pueden solapar. Requiere uvicorn, aiosqlite
+y gunicorn o waitress.
+"""
+import argparse
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks.comun import RAIZ, crear_app
+from benchmarks.generador import generar
+
+RUTAS = ["/dashboard", "/historial", "/reservaciones?vista=proximas", "/clientes?q=mar", "/clientes"]
+
+
+def _latencia_simulada():
+    espera = float(os.environ.get('CARGA_LATENCIA_MS', 0)) / 1000
+    if espera <= 0:
+        return
+
+    def dormir(_sentencia):
+        time.sleep(espera)
+
+    @event.listens_for(Engine, 'connect')
+    def al_conectar(dbapi_conn, _registro):
+        interna = getattr(dbapi_conn, '_connection', None)
+        if interna is not None and hasattr(dbapi_conn, 'await_'):
+            # aiosqlite: el callback corre en el hilo propio de la conexión
+            dbapi_conn.await_(interna.set_trace_callback(dormir))
+        elif hasattr(dbapi_conn, 'set_trace_callback'):
+            dbapi_conn.set_trace_callback(dormir)
+
+
+def _app():
+    _latencia_simulada()
+    return crear_app(os.environ['CARGA_DB'], con_rutas=True,
+                     ajustes={'CACHE_PAGINAS_ACTIVA': os.environ.get('CARGA_CACHE') == '1'})
+
+
+def app_wsgi():
+    return _app()
+
+
+def app_asgi():
+    from servidor_async import crear_asgi
+    return crear_asgi(_app())
+
+
+def comando(modo, workers, puerto):
+    if modo == 'asgi':
+        return [sys.executable, "-m", "uvicorn", "benchmarks.carga_asgi:app_asgi", "--factory",
+                "--workers", str(workers), "--port", str(puerto), "--log-level", "warning", "--no-access-log"]
+    if shutil.which("gunicorn"):
+        return ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{puerto}", "--log-level", "warning",
+                "benchmarks.carga_asgi:app_wsgi()"]
+    # Windows: waitress con un hilo por worker equivalente
+    return [sys.executable, "-m", "waitress", f"--port={puerto}", f"--threads={workers}",
+            "--call", "benchmarks.carga_asgi:app_wsgi"]
+
+
+def esperar(puerto, segundos=30):
+    limite = time.perf_counter() + segundos
+    while time.perf_counter() < limite:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=2)
+            conn.request("GET", "/historial")
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.3)
+    return False
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def cargar(puerto, clientes, segundos):
+    latencias, errores = [], [0]
+    fin = time.perf_counter() + segundos
+
+    def cliente(n):
+        conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+        i = n
+        while time.perf_counter() < fin:
+            ruta = RUTAS[i % len(RUTAS)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                conn.request("GET", ruta)
+                respuesta = conn.getresponse()
+                respuesta.read()
+                if respuesta.status != 200:
+                    errores[0] += 1
+                    continue
+                latencias.append(time.perf_counter() - inicio)
+            except (OSError, http.client.HTTPException):
+                errores[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+        conn.close()
+
+    hilos = [threading.Thread(target=cliente, args=(n,), daemon=True) for n in range(clientes)]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    transcurrido = time.perf_counter() - inicio
+    return {
+        'rps': round(len(latencias) / transcurrido, 1),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 1),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 1),
+        'errores': errores[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='carga_asgi.db')
+    parser.add_argument('--escala', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clientes', default="8,32")
+    parser.add_argument('--segundos', type=float, default=15)
+    parser.add_argument('--latencia-ms', type=float, default=5)
+    parser.add_argument('--cache', action='store_true', help="con la caché de páginas activa")
+    parser.add_argument('--puerto', type=int, default=5098)
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True)
+    with app.app_context():
+        generar(args.escala, anios=1, progreso=lambda m: None)
+
+    entorno = dict(os.environ, CARGA_DB=os.path.abspath(args.db), CARGA_LATENCIA_MS=str(args.latencia_ms),
+                   CARGA_CACHE='1' if args.cache else '0')
+    print(f"{'modo':<6} {'clientes':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errores':>8}")
+    for modo in ('wsgi', 'asgi'):
+        proceso = subprocess.Popen(comando(modo, args.workers, args.puerto), cwd=RAIZ, env=entorno)
+        try:
+            if not esperar(args.puerto):
+                print(f"{modo}: el servidor no respondió")
+                continue
+            for n in (int(x) for x in args.clientes.split(",")):
+                r = cargar(args.puerto, n, args.segundos)
+                print(f"{modo:<6} {n:>8} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['errores']:>8}")
+        finally:
+            proceso.terminate()
+            proceso.wait()
+            time.sleep(1)
+
+
+if __name__ == '__main__':
+    main()
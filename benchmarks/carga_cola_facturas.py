@@ -0,0 +1,145 @@
+"""
+Prueba de la cola local de ventas contra una base lenta e inestable.
+
+Usa la base SQLite del benchmark como sustituto de SQL Server, pero con cada
+sentencia demorada --latencia-ms y una fracción --fallos de ellas fallando
+como si la conexión se cayera. Varias cajas simuladas cobran ventas directas
+(/facturar_directo) en paralelo, primero con registro síncrono y luego con la
+cola activa, y se reporta:
+
+  - latencia de la caja (p50/p95/máx) por venta,
+  - ventas perdidas (la caja recibió error y la factura no existe),
+  - con la cola: tiempo hasta vaciarla y que cada clave quedó exactamente una vez.
+
+    python -m benchmarks.carga_cola_facturas --cajas 4 --ventas 50 --latencia-ms 40 --fallos 0.02
+"""
+import argparse
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from sqlalchemy import event, func
+
+from benchmarks.comun import crear_app
+from benchmarks.generador import generar
+from database import db
+from models import Factura
+import cola_facturas
+import menu_cache
+
+
+class BaseLenta:
+    """Demora cada sentencia y hace fallar algunas mientras está activa."""
+
+    def __init__(self, engine, latencia, fallos, semilla=5):
+        self.engine = engine
+        self.latencia = latencia
+        self.fallos = fallos
+        self.rnd = random.Random(semilla)
+        self.activa = False
+        event.listen(engine, "before_cursor_execute", self._demorar)
+
+    def _demorar(self, conn, cursor, sentencia, parametros, contexto, executemany):
+        if not self.activa:
+            return
+        time.sleep(self.latencia)
+        if self.rnd.random() < self.fallos:
+            raise sqlite3.OperationalError("conexión perdida (simulada)")
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))] if valores else 0.0
+
+
+def cobrar(app, ventas, platos, tiempos, claves, rnd):
+    cliente = app.test_client()
+    for _ in range(ventas):
+        clave = str(uuid.uuid4())
+        elegidos = rnd.sample(platos, 3)
+        inicio = time.perf_counter()
+        cliente.post("/facturar_directo", data={
+            'cliente_id': rnd.randint(1, 100), 'clave': clave,
+            'platos[]': elegidos, 'cantidades[]': [rnd.randint(1, 3) for _ in elegidos],
+        })
+        tiempos.append(time.perf_counter() - inicio)
+        claves.append(clave)
+
+
+def ronda(app, base, cajas, ventas, con_cola, espera_max):
+    app.config['COLA_FACTURAS_ACTIVA'] = con_cola
+    with app.app_context():
+        platos = [p.plato_id for p in menu_cache.obtener().platos]
+    tiempos, claves = [], []
+    base.activa = True
+    hilos = [threading.Thread(target=cobrar, args=(app, ventas, platos, tiempos, claves, random.Random(i)))
+             for i in range(cajas)]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    duracion_cajas = time.perf_counter() - inicio
+
+    vaciado = None
+    if con_cola:
+        with app.app_context():
+            while cola_facturas.cola.resumen()['pendientes'] and time.perf_counter() - inicio < espera_max:
+                time.sleep(0.2)
+            if not cola_facturas.cola.resumen()['pendientes']:
+                vaciado = time.perf_counter() - inicio
+    base.activa = False
+
+    with app.app_context():
+        registradas = dict(db.session.query(Factura.clave_idempotencia, func.count())
+                           .filter(Factura.clave_idempotencia.in_(claves))
+                           .group_by(Factura.clave_idempotencia).all())
+        db.session.remove()
+    return {
+        'modo': "cola" if con_cola else "síncrono",
+        'ventas': len(claves),
+        'p50_ms': percentil(tiempos, 50) * 1000,
+        'p95_ms': percentil(tiempos, 95) * 1000,
+        'max_ms': max(tiempos) * 1000,
+        'cajas_seg': duracion_cajas,
+        'perdidas': sum(1 for c in claves if c not in registradas),
+        'duplicadas': sum(1 for n in registradas.values() if n > 1),
+        'vaciado_seg': vaciado,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='carga_cola.db')
+    parser.add_argument('--cajas', type=int, default=4)
+    parser.add_argument('--ventas', type=int, default=50, help="ventas por caja")
+    parser.add_argument('--latencia-ms', type=float, default=40)
+    parser.add_argument('--fallos', type=float, default=0.02)
+    parser.add_argument('--espera-max', type=float, default=300, help="segundos para vaciar la cola")
+    args = parser.parse_args()
+
+    ruta_cola = os.path.abspath("carga_cola_diario.db")
+    for ruta in (ruta_cola, ruta_cola + "-wal", ruta_cola + "-shm"):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    app = crear_app(args.db, recrear=True, con_rutas=True)
+    app.config.update(COLA_FACTURAS_RUTA=ruta_cola, COLA_FACTURAS_INTERVALO_SEG=0.2,
+                      COLA_FACTURAS_ESPERA_MAX_SEG=2)
+    with app.app_context():
+        generar(escala=1, anios=0, progreso=lambda m: None)
+        base = BaseLenta(db.engine, args.latencia_ms / 1000, args.fallos)
+
+    print(f"{'modo':>9} {'ventas':>7} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8} "
+          f"{'perdidas':>9} {'duplic.':>8} {'vaciado s':>10}")
+    for con_cola in (False, True):
+        r = ronda(app, base, args.cajas, args.ventas, con_cola, args.espera_max)
+        vaciado = f"{r['vaciado_seg']:.1f}" if r['vaciado_seg'] is not None else "-"
+        print(f"{r['modo']:>9} {r['ventas']:>7} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['max_ms']:>8.1f} "
+              f"{r['perdidas']:>9} {r['duplicadas']:>8} {vaciado:>10}")
+
+
+if __name__ == '__main__':
+    main()
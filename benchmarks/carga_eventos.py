@@ -0,0 +1,164 @@
+"""
+Prueba de carga del canal de eventos (/eventos): levanta la app en un servidor
+local, conecta N pantallas simuladas por SSE y cambia estatus de mesas y pedidos
+a un ritmo fijo. Reporta por cada cantidad de pantallas la latencia de entrega,
+los eventos recibidos y las consultas SQL por segundo que hizo el servidor.
+
+    python -m benchmarks.carga_eventos --pantallas 1,10,50 --segundos 20
+
+Con el canal, las consultas por segundo deben quedar planas al sumar pantallas
+(un solo lector por proceso); recargar /mesas y /pedidos en cada pantalla crecía
+de forma lineal.
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from benchmarks.comun import crear_app, ContadorConsultas
+from benchmarks.generador import generar
+from database import db
+from models import Mesa, Pedido
+import eventos
+
+ESTATUS_MESA = ["Disponible", "Ocupada", "Reservada"]
+ESTATUS_PEDIDO = ["Abierto", "Cocina", "Servido"]
+
+
+class Pantalla(threading.Thread):
+    """Cliente SSE mínimo: lee el stream y mide cuánto tardó cada evento en llegar."""
+
+    def __init__(self, puerto, enviados, latencias):
+        super().__init__(daemon=True)
+        self.puerto = puerto
+        self.enviados = enviados
+        self.latencias = latencias
+        self.recibidos = 0
+        self.conectada = threading.Event()
+        self.parar = False
+
+    def run(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.puerto, timeout=5)
+        conn.request("GET", "/eventos?temas=mesa,pedido")
+        respuesta = conn.getresponse()
+        self.conectada.set()
+        datos = None
+        try:
+            while not self.parar:
+                linea = respuesta.fp.readline()
+                if not linea:
+                    break
+                linea = linea.decode().rstrip("\r\n")
+                if linea.startswith("data: "):
+                    datos = json.loads(linea[6:])
+                elif linea == "" and datos:
+                    self.recibidos += 1
+                    enviado = self.enviados.get((datos['entidad'], datos['id'], datos['estatus']))
+                    if enviado:
+                        self.latencias.append(time.perf_counter() - enviado)
+                    datos = None
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+
+def escribir(app, segundos, por_segundo, enviados, rnd):
+    """Cambia estatus al azar, un commit por cambio, como lo harían las rutas."""
+    cambios = 0
+    fin = time.perf_counter() + segundos
+    with app.app_context():
+        mesas = [m for (m,) in db.session.query(Mesa.mesa_id)]
+        pedidos = [p for (p,) in db.session.query(Pedido.pedido_id)]
+        while time.perf_counter() < fin:
+            if rnd.random() < 0.5:
+                obj, entidad, opciones = Mesa.query.get(rnd.choice(mesas)), 'mesa', ESTATUS_MESA
+            else:
+                obj, entidad, opciones = Pedido.query.get(rnd.choice(pedidos)), 'pedido', ESTATUS_PEDIDO
+            obj.estatus = rnd.choice([e for e in opciones if e != obj.estatus])
+            db.session.commit()
+            enviados[(entidad, obj.mesa_id if entidad == 'mesa' else obj.pedido_id, obj.estatus)] = \
+                time.perf_counter()
+            cambios += 1
+            time.sleep(1 / por_segundo)
+        db.session.remove()
+    return cambios
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+def ronda(app, puerto, pantallas, segundos, por_segundo, rnd):
+    enviados, latencias = {}, []
+    clientes = [Pantalla(puerto, enviados, latencias) for _ in range(pantallas)]
+    for c in clientes:
+        c.start()
+    for c in clientes:
+        c.conectada.wait(5)
+    time.sleep(app.config['EVENTOS_INTERVALO_SEG'] * 2)
+
+    with app.app_context():
+        engine = db.engine
+    lecturas = eventos.difusor.consultas
+    with ContadorConsultas(engine) as contador:
+        inicio = time.perf_counter()
+        cambios = escribir(app, segundos, por_segundo, enviados, rnd)
+        time.sleep(app.config['EVENTOS_INTERVALO_SEG'] * 2)  # que llegue lo último
+        transcurrido = time.perf_counter() - inicio
+    for c in clientes:
+        c.parar = True
+
+    recibidos = sum(c.recibidos for c in clientes)
+    return {
+        'pantallas': pantallas,
+        'cambios': cambios,
+        'recibidos': recibidos,
+        'esperados': cambios * pantallas,
+        # El total incluye las consultas del escritor; el lector es lo que cuesta el canal
+        'consultas_por_seg': round(contador.total / transcurrido, 1),
+        'consultas_lector_por_seg': round((eventos.difusor.consultas - lecturas) / transcurrido, 1),
+        'latencia_p50_ms': round(percentil(latencias, 50) * 1000, 1),
+        'latencia_p95_ms': round(percentil(latencias, 95) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='carga_eventos.db')
+    parser.add_argument('--pantallas', default="1,10,50")
+    parser.add_argument('--segundos', type=float, default=15)
+    parser.add_argument('--cambios-por-seg', type=float, default=5)
+    parser.add_argument('--puerto', type=int, default=5099)
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True, con_rutas=True)
+    app.config.update(EVENTOS_INTERVALO_SEG=0.5, EVENTOS_LATIDO_SEG=1)
+    with app.app_context():
+        generar(escala=1, anios=0, progreso=lambda m: None)
+
+    servidor = make_server("127.0.0.1", args.puerto, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    rnd = random.Random(7)
+    try:
+        print(f"{'pantallas':>10} {'cambios':>8} {'recibidos':>10} {'esperados':>10} "
+              f"{'SQL/s':>7} {'lector/s':>9} {'p50 ms':>7} {'p95 ms':>7}")
+        for n in (int(x) for x in args.pantallas.split(",")):
+            r = ronda(app, args.puerto, n, args.segundos, args.cambios_por_seg, rnd)
+            print(f"{r['pantallas']:>10} {r['cambios']:>8} {r['recibidos']:>10} {r['esperados']:>10} "
+                  f"{r['consultas_por_seg']:>7} {r['consultas_lector_por_seg']:>9} "
+                  f"{r['latencia_p50_ms']:>7} {r['latencia_p95_ms']:>7}")
+            time.sleep(2)  # los streams cerrados se dan de baja con el siguiente latido
+    finally:
+        servidor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Utilidades compartidas por los benchmarks locales.
+
+Los benchmarks usan una base SQLite como sustituto de SQL Server y se
+ejecutan desde la raíz del proyecto, por ejemplo:
+
+    python -m benchmarks.bench_dashboard --facturas 1000000
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Flask
+from jinja2 import ChoiceLoader, DictLoader, FileSystemLoader, TemplateNotFound
+from sqlalchemy import event
+
+from database import db
+from motor_bd import opciones_motor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Plantillas que no viven en este repositorio (base y portada del sistema).
+# Sólo se usan si no se encuentra la real, para poder recorrer las rutas en local.
+PLANTILLAS_MINIMAS = {
+    "base.html": "<!doctype html><html><body>"
+                 "{% for c, m in get_flashed_messages(with_categories=true) %}<p class='{{ c }}'>{{ m }}</p>{% endfor %}"
+                 "{% block content %}{% endblock %}</body></html>",
+    "home.html": "{% extends 'base.html' %}{% block content %}L'Impasto{% endblock %}",
+    "dashboard.html": "{% extends 'base.html' %}{% block content %}"
+                      "{{ total_hoy }} {{ total_mes }} {{ proyeccion }} {{ data|join(',') }}"
+                      "{% for p in top_platos %}{{ p[0] }}={{ p[1] }};{% endfor %}{% endblock %}",
+}
+
+
+class CargadorSinMayusculas(FileSystemLoader):
+    """
+    Las vistas piden 'facturas/list.html' y en disco está 'Facturas/list.html':
+    en Windows (donde corre el sistema) da igual, en Linux no. Este loader resuelve
+    cada parte de la ruta sin distinguir mayúsculas.
+    """
+
+    def get_source(self, environment, template):
+        try:
+            return super().get_source(environment, template)
+        except TemplateNotFound:
+            ruta = self.searchpath[0]
+            for parte in template.split("/"):
+                coincidencias = [n for n in os.listdir(ruta) if n.lower() == parte.lower()] \
+                    if os.path.isdir(ruta) else []
+                if not coincidencias:
+                    raise
+                ruta = os.path.join(ruta, coincidencias[0])
+            return super().get_source(environment, os.path.relpath(ruta, self.searchpath[0]).replace(os.sep, "/"))
+
+
+def crear_app(ruta_db, recrear=False, con_rutas=False, ajustes=None):
+    """
+    App Flask apuntando a un archivo SQLite local, con la configuración de config.py.
+    Con con_rutas=True registra los blueprints y las plantillas del repositorio para
+    poder recorrer las vistas con app.test_client(). `ajustes` se aplica sobre
+    config.py antes de registrar los blueprints.
+    """
+    if recrear and os.path.exists(ruta_db):
+        os.remove(ruta_db)
+    app = Flask(__name__)
+    app.config.from_object('config')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.abspath(ruta_db)}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones_motor('dev')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = 'benchmark'
+    app.config.update(ajustes or {})
+    db.init_app(app)
+    if con_rutas:
+        from index_controller import home_bp
+        from ventas_controller import ventas_bp
+        from clientes_controller import clientes_bp
+        from mesas_controller import mesas_bp
+        from migraciones import migraciones_bp
+        from eventos import eventos_bp
+        from admin import admin_bp
+        for bp in (home_bp, ventas_bp, clientes_bp, mesas_bp, migraciones_bp, eventos_bp, admin_bp):
+            app.register_blueprint(bp)
+        app.jinja_loader = ChoiceLoader([CargadorSinMayusculas(RAIZ), DictLoader(PLANTILLAS_MINIMAS)])
+    with app.app_context():
+        import models  # noqa: F401  (registra las tablas)
+        db.create_all()
+    return app
+
+
+class ContadorConsultas:
+    """Cuenta las sentencias SQL emitidas por el engine mientras está activo."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.total = 0
+
+    def _contar(self, *args, **kwargs):
+        self.total += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._contar)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._contar)
+
+
+@contextmanager
+def medir(resultados, nombre):
+    """Guarda en resultados[nombre] los segundos transcurridos en el bloque."""
+    inicio = time.perf_counter()
+    yield
+    resultados[nombre] = time.perf_counter() - inicio
+
+
+def en_lotes(iterable, tamano):
+    lote = []
+    for item in iterable:
+        lote.append(item)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
@@ -0,0 +1,148 @@
+"""
+Generador de datos sintéticos del restaurante para los benchmarks y el asesor
+de índices: categorías y menú, clientes, mesas, años de reservaciones,
+facturas con sus líneas y pedidos abiertos.
+
+    python -m benchmarks.generador --db restaurante.db --escala 5 --anios 2
+
+La escala 1 equivale a un local pequeño (1.000 clientes, ~40 facturas al día).
+Todo se inserta con INSERT multi-fila por lotes y con semilla fija, así que dos
+corridas con los mismos parámetros generan exactamente los mismos datos.
+"""
+import argparse
+import random
+from datetime import date, datetime, time, timedelta
+
+from database import db
+from models import (Categoria, Plato, Cliente, Mesa, Reservacion, Factura, DetalleFactura,
+                    Pedido, DetallePedido, FORMATO_FECHA_RESERVA)
+import busqueda_clientes
+import facturacion
+import rollup_ventas
+
+CATEGORIAS = ["Entradas", "Pastas", "Pizzas", "Carnes", "Postres", "Bebidas"]
+NOMBRES = ["José", "María", "Ramón", "Ángela", "Luis", "Sofía", "Andrés", "Lucía", "Héctor",
+           "Inés", "Julio", "Carmen", "Raúl", "Noemí", "Martín", "Begoña", "Tomás", "Elena"]
+APELLIDOS = ["Pérez", "Gómez", "Rodríguez", "Núñez", "Martínez", "Fernández", "López", "Díaz",
+             "Sánchez", "Ramírez", "Peña", "Castillo", "Almánzar", "Báez", "Mejía", "Ureña"]
+ESTATUS_PEDIDO = ["Abierto", "Cocina", "Servido"]
+LOTE = 5000
+
+
+def _insertar(modelo, filas):
+    filas = list(filas)
+    for i in range(0, len(filas), LOTE):
+        db.session.execute(modelo.__table__.insert(), filas[i:i + LOTE])
+    return len(filas)
+
+
+def generar(escala=1, anios=1, semilla=2024, hoy=None, progreso=print):
+    """Llena la base activa (db.session) y devuelve un resumen con la cantidad de filas."""
+    rnd = random.Random(semilla)
+    hoy = hoy or date.today()
+    resumen = {}
+
+    resumen['categorias'] = _insertar(Categoria, (
+        {'categoria_id': i, 'nombre': n} for i, n in enumerate(CATEGORIAS, 1)))
+    platos = [{'plato_id': i, 'nombre': f"{CATEGORIAS[i % len(CATEGORIAS)][:-1]} {i}",
+               'precio': round(rnd.uniform(4, 45), 2), 'categoria_id': i % len(CATEGORIAS) + 1}
+              for i in range(1, 61)]
+    resumen['platos'] = _insertar(Plato, platos)
+
+    mesas = [{'mesa_id': i, 'nombre': f"M{i:02d}", 'capacidad': rnd.choice([2, 2, 4, 4, 6, 8]),
+              'estatus': "Disponible", 'version': 0} for i in range(1, 21 + 2 * escala)]
+    resumen['mesas'] = _insertar(Mesa, mesas)
+
+    total_clientes = 1000 * escala
+    resumen['clientes'] = _insertar(Cliente, (
+        {'cliente_id': i,
+         'nombre': f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+         'telefono': f"{rnd.choice(['809', '829', '849'])}-{rnd.randint(200, 999)}-{rnd.randint(0, 9999):04d}",
+         'email': f"cliente{i}@correo.com"}
+        for i in range(1, total_clientes + 1)))
+    db.session.commit()
+    busqueda_clientes.reindexar(LOTE)
+    progreso(f"  catálogo y {total_clientes:,} clientes")
+
+    # Historial: cada día hay reservaciones (algunas con mesa) y cada una genera su factura
+    res_id, fac_id, det_id = 0, 0, 0
+    dias = 365 * anios
+    for d in range(dias, -15, -1):
+        dia = hoy - timedelta(days=d)
+        reservas, facturas, detalles = [], [], []
+        for _ in range(rnd.randint(25, 55) * escala):
+            res_id += 1
+            momento = datetime.combine(dia, time(rnd.randint(12, 22), rnd.choice([0, 15, 30, 45])))
+            con_mesa = rnd.random() < 0.7
+            cliente_id = rnd.randint(1, total_clientes)
+            reservas.append({'reservacion_id': res_id, 'cliente_id': cliente_id,
+                             'fecha': momento.strftime(FORMATO_FECHA_RESERVA), 'fecha_hora': momento,
+                             'personas': rnd.randint(1, 6) if con_mesa else 0,
+                             'mesa_id': rnd.randint(1, len(mesas)) if con_mesa else None})
+            if d <= 0:
+                continue  # reservas futuras: aún sin factura
+            fac_id += 1
+            subtotal = 0
+            for plato in rnd.sample(platos, rnd.randint(1, 8)):
+                det_id += 1
+                cantidad = rnd.randint(1, 4)
+                subtotal += plato['precio'] * cantidad
+                detalles.append({'detalle_id': det_id, 'factura_id': fac_id, 'plato_id': plato['plato_id'],
+                                 'cantidad': cantidad, 'precio_unitario': plato['precio'],
+                                 'descripcion': plato['nombre'], 'total_linea': plato['precio'] * cantidad})
+            propina = subtotal * facturacion.PROPINA_LEGAL if con_mesa else 0.0
+            itbis = subtotal * facturacion.ITBIS
+            facturas.append({'factura_id': fac_id, 'reservacion_id': res_id, 'cliente_id': cliente_id,
+                             'fecha': momento + timedelta(minutes=rnd.randint(40, 110)),
+                             'subtotal': subtotal, 'impuesto': itbis, 'propina_legal': propina,
+                             'total': subtotal + itbis + propina})
+        _insertar(Reservacion, reservas)
+        _insertar(Factura, facturas)
+        _insertar(DetalleFactura, detalles)
+        db.session.commit()
+        if d % 90 == 0:
+            progreso(f"  historial hasta {dia}: {fac_id:,} facturas")
+    resumen.update(reservaciones=res_id, facturas=fac_id, detalle_factura=det_id)
+
+    pedidos, lineas, linea_id = [], [], 0
+    for pid in range(1, 30 * escala + 1):
+        total = 0.0
+        for plato in rnd.sample(platos, rnd.randint(1, 6)):
+            linea_id += 1
+            cantidad = rnd.randint(1, 3)
+            total += cantidad * plato['precio']
+            lineas.append({'detalle_pedido_id': linea_id, 'pedido_id': pid, 'plato_id': plato['plato_id'],
+                           'cantidad': cantidad, 'precio_unitario': plato['precio']})
+        pedidos.append({'pedido_id': pid, 'mesa_id': rnd.randint(1, len(mesas)),
+                        'cliente_id': rnd.randint(1, total_clientes),
+                        'fecha_hora': datetime.now() - timedelta(minutes=rnd.randint(5, 120)),
+                        'estatus': rnd.choice(ESTATUS_PEDIDO), 'total': total})
+    resumen['pedidos'] = _insertar(Pedido, pedidos)
+    resumen['detalle_pedido'] = _insertar(DetallePedido, lineas)
+    db.session.commit()
+
+    # Días generados: la última factura de la noche puede caer pasada la medianoche
+    rollup_ventas.reconstruir(hoy - timedelta(days=dias), hoy)
+    progreso("  resumen diario reconstruido")
+    return resumen
+
+
+def main():
+    from benchmarks.comun import crear_app
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='restaurante.db')
+    parser.add_argument('--escala', type=int, default=1)
+    parser.add_argument('--anios', type=int, default=1)
+    parser.add_argument('--semilla', type=int, default=2024)
+    args = parser.parse_args()
+
+    app = crear_app(args.db, recrear=True)
+    with app.app_context():
+        resumen = generar(args.escala, args.anios, args.semilla)
+    for tabla, filas in resumen.items():
+        print(f"{tabla:>16}: {filas:,}")
+
+
+if __name__ == '__main__':
+    main()
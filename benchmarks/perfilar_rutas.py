@@ -0,0 +1,44 @@
+"""
+Perfil de las vistas sobre una base SQLite sembrada: recorre las mismas rutas
+que el asesor de índices con el perfilador activo e imprime el reporte por ruta
+(ordenado por costo total) con los N+1 detectados y la línea que los dispara.
+
+    python -m benchmarks.perfilar_rutas --escala 1 --repeticiones 3
+
+Con --umbral se ajusta cuántas repeticiones de una misma sentencia cuentan como N+1.
+"""
+import argparse
+import os
+
+from benchmarks.asesor_indices import rutas
+from benchmarks.comun import crear_app
+from benchmarks.generador import generar
+import perfilador
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='asesor_indices.db')
+    parser.add_argument('--escala', type=int, default=1)
+    parser.add_argument('--anios', type=int, default=1)
+    parser.add_argument('--reusar', action='store_true', help="no regenerar la base si ya existe")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--umbral', type=int, default=5)
+    args = parser.parse_args()
+
+    regenerar = not (args.reusar and os.path.exists(args.db))
+    app = crear_app(args.db, recrear=regenerar, con_rutas=True, ajustes={
+        'PERFILADOR_ACTIVO': True, 'PERFILADOR_UMBRAL_REPETIDAS': args.umbral})
+    if regenerar:
+        with app.app_context():
+            generar(args.escala, args.anios, progreso=lambda m: None)
+
+    cliente = app.test_client()
+    for ruta in rutas():
+        for _ in range(args.repeticiones):
+            cliente.get(ruta)
+    print(perfilador.reporte.texto())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Suite de rendimiento reproducible: genera datos sintéticos con semilla fija
+(benchmarks/generador.py), recorre las rutas reales con el test client de Flask
+y reporta por escenario latencia p50/p95/p99, consultas SQL por petición y el
+RSS máximo del proceso. El resultado se guarda en JSON para comparar commits.
+
+    python -m benchmarks.suite --escala 2 --anios 2 --salida resultados/antes.json
+    python -m benchmarks.suite --reusar --salida resultados/despues.json --comparar resultados/antes.json
+
+Con --reusar no se regenera la base si ya existe (misma escala/semilla => mismos datos).
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.comun import crear_app, ContadorConsultas
+from benchmarks.generador import generar
+from database import db
+from models import Reservacion, Factura
+import menu_cache
+
+CONSULTAS_CLIENTES = ["mar", "jose perez", "Núñez", "809", "cliente12@", "raul baez"]
+
+
+def rss_maximo_mb():
+    """RSS máximo del proceso; None si la plataforma no lo permite (p. ej. Windows sin psutil)."""
+    try:
+        import resource
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux lo da en KB y macOS en bytes
+        return round(maximo / (2**20 if sys.platform == "darwin" else 2**10), 1)
+    except ImportError:
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            return round(getattr(info, 'peak_wset', info.rss) / 2**20, 1)
+        except ImportError:
+            return None
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))] if valores else 0.0
+
+
+def reservas_sin_factura(app, cantidad):
+    """Reservaciones con mesa y sin factura, para el escenario POST /facturar/<id>."""
+    with app.app_context():
+        ids = [r for (r,) in db.session.query(Reservacion.reservacion_id)
+               .outerjoin(Factura, Factura.reservacion_id == Reservacion.reservacion_id)
+               .filter(Factura.factura_id.is_(None), Reservacion.mesa_id.isnot(None))
+               .order_by(Reservacion.reservacion_id).limit(cantidad)]
+        db.session.remove()
+    return ids
+
+
+def escenarios(app, repeticiones):
+    """[(nombre, método, ruta o función(i) -> ruta, datos o función(i) -> datos)]"""
+    manana = (datetime.now() + timedelta(days=1)).replace(hour=20, minute=0)
+    with app.app_context():
+        platos = [p.plato_id for p in menu_cache.obtener().platos]
+        db.session.remove()
+    reservas = reservas_sin_factura(app, repeticiones * 2)
+    lista = [
+        ("dashboard", "GET", "/dashboard", None),
+        ("historial", "GET", "/historial", None),
+        ("historial_rango", "GET", lambda i: f"/historial?desde={datetime.now() - timedelta(days=30 + i):%Y-%m-%d}",
+         None),
+        ("clientes_buscar", "GET", lambda i: f"/clientes?q={CONSULTAS_CLIENTES[i % len(CONSULTAS_CLIENTES)]}", None),
+        ("menu", "GET", "/menu", None),
+        ("reservaciones", "GET", "/reservaciones", None),
+        ("reservaciones_proximas", "GET", "/reservaciones?vista=proximas", None),
+        ("reservaciones_disponibles", "GET",
+         f"/reservaciones/disponibles?fecha={manana:%Y-%m-%dT%H:%M}&personas=4", None),
+        ("facturar_form", "GET", lambda i: f"/facturar/{reservas[i % len(reservas)]}", None),
+        ("facturar_post", "POST", lambda i: f"/facturar/{reservas[len(reservas) // 2 + i % (len(reservas) // 2)]}",
+         lambda i: {'platos[]': [platos[(i + k) % len(platos)] for k in range(4)],
+                    'cantidades[]': [1 + (i + k) % 3 for k in range(4)]}),
+    ]
+    if len(reservas) < 2:
+        lista = [e for e in lista if not e[0].startswith("facturar")]
+    return lista
+
+
+def correr(app, nombre, metodo, ruta, datos, repeticiones, calentamiento):
+    cliente = app.test_client()
+    with app.app_context():
+        engine = db.engine
+    tiempos, consultas, errores = [], [], 0
+    for i in range(-calentamiento, repeticiones):
+        url = ruta(max(i, 0)) if callable(ruta) else ruta
+        cuerpo = datos(max(i, 0)) if callable(datos) else datos
+        with ContadorConsultas(engine) as contador:
+            inicio = time.perf_counter()
+            respuesta = cliente.open(url, method=metodo, data=cuerpo)
+            segundos = time.perf_counter() - inicio
+        if respuesta.status_code >= 400:
+            errores += 1
+        if i >= 0:
+            tiempos.append(segundos)
+            consultas.append(contador.total)
+    return {
+        'peticiones': len(tiempos),
+        'errores': errores,
+        'p50_ms': round(percentil(tiempos, 50) * 1000, 2),
+        'p95_ms': round(percentil(tiempos, 95) * 1000, 2),
+        'p99_ms': round(percentil(tiempos, 99) * 1000, 2),
+        'media_ms': round(sum(tiempos) / len(tiempos) * 1000, 2) if tiempos else 0.0,
+        'consultas_por_peticion': round(sum(consultas) / len(consultas), 1) if consultas else 0.0,
+        'max_consultas': max(consultas) if consultas else 0,
+    }
+
+
+def comparar(actual, anterior):
+    print(f"\nComparación contra {anterior.get('commit') or '?'} ({anterior.get('fecha')})")
+    print(f"{'escenario':<28} {'p50 antes':>10} {'p50 ahora':>10} {'Δ%':>7} {'SQL antes':>10} {'SQL ahora':>10}")
+    for nombre, r in actual['escenarios'].items():
+        a = anterior.get('escenarios', {}).get(nombre)
+        if not a:
+            print(f"{nombre:<28} {'-':>10} {r['p50_ms']:>10} {'nuevo':>7}")
+            continue
+        delta = (r['p50_ms'] - a['p50_ms']) / a['p50_ms'] * 100 if a['p50_ms'] else 0.0
+        print(f"{nombre:<28} {a['p50_ms']:>10} {r['p50_ms']:>10} {delta:>+7.1f} "
+              f"{a['consultas_por_peticion']:>10} {r['consultas_por_peticion']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='suite.db')
+    parser.add_argument('--escala', type=int, default=1)
+    parser.add_argument('--anios', type=int, default=1)
+    parser.add_argument('--semilla', type=int, default=2024)
+    parser.add_argument('--reusar', action='store_true')
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--calentamiento', type=int, default=3)
+    parser.add_argument('--solo', default="", help="escenarios separados por coma")
+    parser.add_argument('--salida', default=None, help="archivo JSON de resultados")
+    parser.add_argument('--comparar', default=None, help="JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    regenerar = not (args.reusar and os.path.exists(args.db))
+    # Facturación síncrona: el escenario POST mide la escritura real, no sólo el diario local
+    app = crear_app(args.db, recrear=regenerar, con_rutas=True, ajustes={'COLA_FACTURAS_ACTIVA': False})
+    inicio = time.perf_counter()
+    if regenerar:
+        with app.app_context():
+            resumen = generar(args.escala, args.anios, args.semilla, progreso=print)
+            db.session.remove()
+        print("  " + ", ".join(f"{t}={n:,}" for t, n in resumen.items()))
+    generacion = time.perf_counter() - inicio
+
+    solo = {s.strip() for s in args.solo.split(",") if s.strip()}
+    resultado = {
+        'commit': commit_actual(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'parametros': {'escala': args.escala, 'anios': args.anios, 'semilla': args.semilla,
+                       'repeticiones': args.repeticiones, 'calentamiento': args.calentamiento},
+        'plataforma': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                       'sistema': platform.platform()},
+        'generacion_seg': round(generacion, 1) if regenerar else None,
+        'escenarios': {},
+    }
+    print(f"\n{'escenario':<28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL/pet':>8} {'errores':>8}")
+    for nombre, metodo, ruta, datos in escenarios(app, args.repeticiones + args.calentamiento):
+        if solo and nombre not in solo:
+            continue
+        r = correr(app, nombre, metodo, ruta, datos, args.repeticiones, args.calentamiento)
+        resultado['escenarios'][nombre] = r
+        print(f"{nombre:<28} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['consultas_por_peticion']:>8} {r['errores']:>8}")
+    resultado['rss_max_mb'] = rss_maximo_mb()
+    print(f"\nRSS máximo: {resultado['rss_max_mb']} MB")
+
+    if args.salida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.salida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            comparar(resultado, json.load(archivo))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Búsqueda de clientes por nombre, teléfono o email sin LIKE '%q%'.
+
+Cada cliente guarda columnas normalizadas (nombre sin acentos y en minúsculas,
+teléfono sólo con dígitos, email en minúsculas) y una fila en cliente_tokens por
+cada palabra de su nombre. Las búsquedas son siempre por prefijo sobre columnas
+indexadas (col >= 'mar' AND col < 'mas'), así que no recorren la tabla.
+"""
+import re
+import unicodedata
+
+from database import db
+from models import Cliente, ClienteToken
+from sqlalchemy import and_, or_, case, func, select
+
+_NO_ALFANUM = re.compile(r"[^a-z0-9]+")
+_SIGUIENTE = {c: chr(ord(c) + 1) for c in "abcdefghijklmnopqrstuvwxy012345678"}
+
+LARGO_MINIMO = 2
+LARGO_MINIMO_TELEFONO = 3
+
+
+def sin_acentos(texto):
+    return "".join(c for c in unicodedata.normalize("NFKD", texto or "")
+                   if not unicodedata.combining(c)).lower()
+
+
+def palabras(texto):
+    return [t for t in _NO_ALFANUM.split(sin_acentos(texto)) if t]
+
+
+def solo_digitos(texto):
+    return re.sub(r"\D", "", texto or "")
+
+
+def _normalizar(cliente):
+    cliente.nombre_norm = " ".join(palabras(cliente.nombre))[:120]
+    cliente.telefono_digitos = solo_digitos(cliente.telefono)[:50] or None
+    cliente.email_norm = (cliente.email or "").strip().lower()[:120] or None
+    return [{'token': t, 'cliente_id': cliente.cliente_id}
+            for t in {t[:60] for t in palabras(cliente.nombre)}]
+
+
+def indexar(cliente):
+    """Actualiza columnas normalizadas y tokens del cliente (sin commit)."""
+    if cliente.cliente_id is None:
+        db.session.flush()
+    desindexar(cliente.cliente_id)
+    tokens = _normalizar(cliente)
+    if tokens:
+        db.session.execute(ClienteToken.__table__.insert(), tokens)
+
+
+def desindexar(cliente_id):
+    ClienteToken.query.filter_by(cliente_id=cliente_id).delete(synchronize_session=False)
+
+
+def _limite_superior(prefijo):
+    """
+    Cadena mayor que todas las que empiezan con `prefijo` ('mar' -> 'mas').
+    Un último carácter sin siguiente fiable en la collation ('z', '9', '@', '.')
+    se quita y se acota por el prefijo más corto ('perez.' -> 'perf'): el rango
+    queda algo más ancho, pero el LIKE descarta lo que sobra.
+    """
+    while prefijo:
+        ultimo = prefijo[-1]
+        if ultimo in _SIGUIENTE:
+            return prefijo[:-1] + _SIGUIENTE[ultimo]
+        prefijo = prefijo[:-1]
+    return None
+
+
+def _por_prefijo(columna, prefijo):
+    # El rango da la búsqueda en el índice; el LIKE descarta lo que el orden de
+    # la collation pudiera colar entre los límites (p. ej. dígitos contra letras).
+    condiciones = [columna >= prefijo, columna.startswith(prefijo, autoescape=True)]
+    superior = _limite_superior(prefijo)
+    if superior:
+        condiciones.append(columna < superior)
+    return and_(*condiciones)
+
+
+def sentencias_busqueda(q, limite=50):
+    """
+    [(tipo, sentencia)] independientes entre sí: palabras del nombre por prefijo
+    ('nombre', filas (cliente_id, coincidencias, exactas)), teléfono por prefijo
+    de dígitos y email por prefijo ('telefono' / 'email', filas (cliente_id,)).
+    """
+    sentencias = []
+    terminos = [t for t in dict.fromkeys(palabras(q)) if len(t) >= LARGO_MINIMO][:5]
+    if terminos:
+        coincidencias = func.count(ClienteToken.token)
+        exactas = func.sum(case((ClienteToken.token.in_(terminos), 1), else_=0))
+        sentencias.append(('nombre', select(ClienteToken.cliente_id, coincidencias, exactas)
+                           .where(or_(*[_por_prefijo(ClienteToken.token, t) for t in terminos]))
+                           .group_by(ClienteToken.cliente_id)
+                           .order_by(coincidencias.desc(), exactas.desc(), ClienteToken.cliente_id)
+                           .limit(limite)))
+
+    digitos = solo_digitos(q)
+    if len(digitos) >= LARGO_MINIMO_TELEFONO and len(digitos) >= len(q.replace(" ", "")) // 2:
+        sentencias.append(('telefono', select(Cliente.cliente_id)
+                           .where(_por_prefijo(Cliente.telefono_digitos, digitos)).limit(limite)))
+
+    correo = q.strip().lower()
+    if len(correo) >= LARGO_MINIMO and " " not in correo:
+        sentencias.append(('email', select(Cliente.cliente_id)
+                           .where(_por_prefijo(Cliente.email_norm, correo)).limit(limite)))
+    return sentencias
+
+
+PUNTOS = {'telefono': 50, 'email': 40}
+
+
+def puntuar(resultados):
+    """{cliente_id: puntaje} a partir de [(tipo, filas)] de sentencias_busqueda."""
+    puntajes = {}
+    for tipo, filas in resultados:
+        for fila in filas:
+            puntos = 10 * fila[1] + 5 * (fila[2] or 0) if tipo == 'nombre' else PUNTOS[tipo]
+            puntajes[fila[0]] = puntajes.get(fila[0], 0) + puntos
+    return puntajes
+
+
+def consulta_recientes(limite=50):
+    """Últimos clientes registrados (listado sin búsqueda)."""
+    return select(Cliente).order_by(Cliente.cliente_id.desc()).limit(limite)
+
+
+def consulta_clientes(puntajes):
+    return select(Cliente).where(Cliente.cliente_id.in_(list(puntajes)))
+
+
+def ordenar(clientes, puntajes, limite):
+    clientes = sorted(clientes, key=lambda c: (-puntajes[c.cliente_id], c.nombre_norm or "", c.cliente_id))
+    return clientes[:limite]
+
+
+def buscar(q, limite=50):
+    """
+    Clientes que coinciden con `q`, ordenados por relevancia y limitados a `limite`:
+    teléfono por prefijo de dígitos, email por prefijo y palabras del nombre por
+    prefijo (más palabras coincidentes y coincidencias exactas suben en el orden).
+    """
+    puntajes = puntuar([(tipo, db.session.execute(s).all()) for tipo, s in sentencias_busqueda(q, limite)])
+    if not puntajes:
+        return []
+    return ordenar(db.session.execute(consulta_clientes(puntajes)).scalars().all(), puntajes, limite)
+
+
+def reindexar(tamano_lote=5000, progreso=None):
+    """Recalcula columnas normalizadas y tokens de todos los clientes, por lotes de id."""
+    ultimo_id, total = 0, 0
+    while True:
+        lote = Cliente.query.filter(Cliente.cliente_id > ultimo_id)\
+            .order_by(Cliente.cliente_id).limit(tamano_lote).all()
+        if not lote:
+            return total
+        ids = [c.cliente_id for c in lote]
+        ClienteToken.query.filter(ClienteToken.cliente_id.in_(ids)).delete(synchronize_session=False)
+        tokens = []
+        for c in lote:
+            tokens.extend(_normalizar(c))
+        if tokens:
+            db.session.execute(ClienteToken.__table__.insert(), tokens)
+        db.session.commit()
+        db.session.expunge_all()
+        ultimo_id = ids[-1]
+        total += len(lote)
+        if progreso:
+            progreso(total)
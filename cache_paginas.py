@@ -0,0 +1,194 @@
+"""
+Caché de páginas renderizadas según la versión de los datos.
+
+/menu, /mesas y /historial se renderizaban completas con Jinja en cada GET
+aunque nada hubiera cambiado (el acordeón del historial genera mucho HTML).
+Una vista decorada con @cache_pagina('facturas', 'clientes') depende de esos
+contadores de versiones_datos; cada GET cuesta entonces una sola consulta
+(versiones_datos.leer) y:
+  - si el navegador manda en If-None-Match el ETag de esas versiones se
+    responde 304 sin cuerpo,
+  - si este proceso ya tiene el HTML de esas versiones se devuelve tal cual,
+  - si no, se renderiza y se guarda.
+
+Los controladores incrementan la versión de lo que modifican antes del commit,
+así que una escritura en cualquier proceso invalida las copias de todos. La
+memoria se acota con un LRU por bytes y por entradas (CACHE_PAGINAS_MAX_MB,
+CACHE_PAGINAS_MAX_ENTRADAS). No se guardan respuestas con mensajes flash.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, has_request_context, make_response, message_flashed, request, session
+
+import versiones_datos
+
+
+class CachePaginas:
+    """LRU de respuestas por (endpoint, ruta, argumentos), seguro entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> (versiones, etag, cuerpo, content_type)
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.no_modificadas = 0
+        self.desalojos = 0
+
+    def obtener(self, clave, versiones):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] != versiones:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, clave, entrada, max_bytes, max_entradas):
+        tamano = len(entrada[2])
+        with self._lock:
+            # La copia de versiones anteriores se reemplaza, no se acumula
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= len(anterior[2])
+            if tamano > max_bytes:
+                return
+            self._entradas[clave] = entrada
+            self.bytes += tamano
+            while self.bytes > max_bytes or len(self._entradas) > max_entradas:
+                _, viejo = self._entradas.popitem(last=False)
+                self.bytes -= len(viejo[2])
+                self.desalojos += 1
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes = 0
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'kb': round(self.bytes / 1024, 1),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'no_modificadas': self.no_modificadas,
+                'desalojos': self.desalojos,
+                'tasa_aciertos': round(self.aciertos / total, 4) if total else None,
+            }
+
+
+cache = CachePaginas()
+_revision = None
+
+
+def revision():
+    """
+    Identifica el código desplegado: CACHE_PAGINAS_REVISION o, si no está, la
+    fecha de modificación más reciente de las plantillas y módulos de la app.
+    Va en el ETag para que un despliegue no deje páginas viejas en el navegador.
+    """
+    global _revision
+    if _revision is None:
+        _revision = current_app.config.get('CACHE_PAGINAS_REVISION') or ""
+        if not _revision:
+            ultima = 0.0
+            for raiz, carpetas, archivos in os.walk(current_app.root_path):
+                carpetas[:] = [c for c in carpetas if not c.startswith(('.', '__')) and c != 'benchmarks']
+                for nombre in archivos:
+                    if nombre.endswith(('.py', '.html')):
+                        ultima = max(ultima, os.path.getmtime(os.path.join(raiz, nombre)))
+            _revision = str(int(ultima))
+    return _revision
+
+
+@message_flashed.connect
+def _marcar_flash(app, message, category):
+    # Una página que mostró (o dejó pendiente) un flash no se puede repetir a otros
+    if has_request_context():
+        g.cache_pagina_flash = True
+
+
+def _etag(clave, versiones):
+    texto = repr((revision(), clave, versiones)).encode('utf-8')
+    return hashlib.sha1(texto).hexdigest()[:24]
+
+
+def _preparar(respuesta, etag):
+    respuesta.set_etag(etag)
+    # El navegador guarda la página pero la revalida siempre (barato: 304)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+
+def aplica():
+    """La petición actual puede servirse de la caché (GET, activa y sin flash pendiente)."""
+    return request.method == 'GET' and current_app.config.get('CACHE_PAGINAS_ACTIVA', True) \
+        and not session.get('_flashes')
+
+
+def consultar(versiones, leidas):
+    """
+    Busca la petición actual con las versiones ya leídas (dict de versiones_datos.leer).
+    Devuelve (respuesta, pendiente): la respuesta 304 o la copia guardada, o None y
+    el dato que almacenar() necesita para guardar lo que se renderice.
+    """
+    # Las versiones se leen antes de renderizar: si alguien escribe mientras
+    # tanto, la copia queda con la versión vieja y la siguiente lectura la descarta
+    actuales = tuple(leidas[n] for n in versiones)
+    clave = (request.endpoint, request.path, tuple(sorted(request.args.items(multi=True))))
+    etag = _etag(clave, actuales)
+
+    if request.if_none_match.contains(etag):
+        with cache._lock:
+            cache.no_modificadas += 1
+        return _preparar(current_app.response_class(status=304), etag), None
+
+    entrada = cache.obtener(clave, actuales)
+    if entrada is not None:
+        return _preparar(current_app.response_class(entrada[2], content_type=entrada[3]), etag), None
+    g.pop('cache_pagina_flash', None)
+    return None, (clave, actuales, etag)
+
+
+def almacenar(respuesta, pendiente):
+    """Guarda la respuesta recién renderizada si se puede repetir a otros y le pone el ETag."""
+    clave, actuales, etag = pendiente
+    if respuesta.status_code != 200 or respuesta.is_streamed or respuesta.direct_passthrough \
+            or g.pop('cache_pagina_flash', False):
+        return respuesta
+    config = current_app.config
+    cache.guardar(clave, (actuales, etag, respuesta.get_data(), respuesta.content_type),
+                  int(config.get('CACHE_PAGINAS_MAX_MB', 32) * 2**20),
+                  config.get('CACHE_PAGINAS_MAX_ENTRADAS', 500))
+    return _preparar(respuesta, etag)
+
+
+def cache_pagina(*versiones):
+    """Cachea el GET de la vista mientras no cambien las versiones de datos indicadas."""
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if not aplica():
+                return vista(*args, **kwargs)
+            respuesta, pendiente = consultar(versiones, versiones_datos.leer(*versiones))
+            if respuesta is not None:
+                return respuesta
+            return almacenar(make_response(vista(*args, **kwargs)), pendiente)
+        envoltura.versiones_cache = versiones
+        return envoltura
+    return decorador
+
+
+def estadisticas():
+    return cache.estadisticas()
+
+
+def vaciar():
+    cache.vaciar()
@@ -1,21 +1,35 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from database import db
 from models import Cliente
+import click
+import busqueda_clientes
+import versiones_datos
 
 clientes_bp = Blueprint('clientes', __name__)
 
 @clientes_bp.route("/clientes")
 def index():
-    q = request.args.get('q', '')
+    q = request.args.get('q', '').strip()
+    limite = current_app.config.get('CLIENTES_LIMITE_RESULTADOS', 50)
     if q:
-        res = Cliente.query.filter(
-            (Cliente.nombre.like(f"%{q}%")) |
-            (Cliente.email.like(f"%{q}%")) |
-            (Cliente.telefono.like(f"%{q}%"))
-        ).all()
+        # Búsqueda por prefijo sobre columnas indexadas (ver busqueda_clientes)
+        res = busqueda_clientes.buscar(q, limite=limite)
     else:
-        res = Cliente.query.all()
-    return render_template("clientes/list.html", clientes=res, busqueda=q)
+        # Sin búsqueda mostramos sólo los últimos registrados
+        res = db.session.execute(busqueda_clientes.consulta_recientes(limite)).scalars().all()
+    return render_template("clientes/list.html", clientes=res, busqueda=q, limite=limite)
+
+@clientes_bp.route("/clientes/buscar")
+def buscar():
+    """Autocompletado: JSON con los clientes que coinciden con ?q= (máx. ?limite=)."""
+    q = request.args.get('q', '').strip()
+    limite = min(request.args.get('limite', 10, type=int),
+                 current_app.config.get('CLIENTES_LIMITE_RESULTADOS', 50))
+    res = busqueda_clientes.buscar(q, limite=limite) if q else []
+    return jsonify([
+        {'cliente_id': c.cliente_id, 'nombre': c.nombre, 'telefono': c.telefono, 'email': c.email}
+        for c in res
+    ])
 
 @clientes_bp.route("/clientes/nuevo", methods=["GET", "POST"])
 def nuevo():
@@ -26,6 +40,8 @@ def nuevo():
             email=request.form.get('email', '').strip()
         )
         db.session.add(n)
+        busqueda_clientes.indexar(n)
+        versiones_datos.incrementar('clientes')
         db.session.commit()
         flash("Cliente registrado.", "success")
         return redirect(url_for('clientes.index'))
@@ -38,6 +54,8 @@ def editar(id):
         cliente.nombre = request.form.get('nombre', '').strip()
         cliente.telefono = request.form.get('telefono', '').strip()
         cliente.email = request.form.get('email', '').strip()
+        busqueda_clientes.indexar(cliente)
+        versiones_datos.incrementar('clientes')
         db.session.commit()
         flash("Cliente actualizado.", "success")
         return redirect(url_for('clientes.index'))
@@ -46,7 +64,16 @@ def editar(id):
 @clientes_bp.route("/clientes/eliminar/<int:id>", methods=["POST"])
 def eliminar(id):
     cliente = Cliente.query.get_or_404(id)
+    busqueda_clientes.desindexar(cliente.cliente_id)
     db.session.delete(cliente)
+    versiones_datos.incrementar('clientes')
     db.session.commit()
     flash("Cliente eliminado.", "warning")
     return redirect(url_for('clientes.index'))
+
+@clientes_bp.cli.command("reindexar")
+@click.option("--lote", type=int, default=5000, show_default=True)
+def reindexar(lote):
+    """Recalcula columnas normalizadas y tokens de búsqueda de todos los clientes."""
+    total = busqueda_clientes.reindexar(lote, progreso=lambda n: click.echo(f"  {n} clientes"))
+    click.echo(f"Índice de búsqueda reconstruido: {total} clientes")
@@ -0,0 +1,271 @@
+"""
+Cola local de ventas: la caja no espera a SQL Server para cobrar.
+
+procesar_venta escribe la venta ya calculada en un diario SQLite local
+(COLA_FACTURAS_RUTA, modo WAL con synchronous=FULL) y devuelve al instante un
+número provisional (P-000123). Un hilo por proceso toma las pendientes por
+lotes y las registra en la base principal con facturacion.registrar_venta,
+un commit por lote. Es opcional (COLA_FACTURAS_ACTIVA): mientras la venta está
+en el diario, /historial todavía no la muestra.
+
+Cada venta lleva una clave de idempotencia (la genera el formulario, así que
+un doble clic no duplica) que se guarda en facturas.clave_idempotencia con
+índice único: si el proceso cae entre el commit en la base y la marca en el
+diario, o dos procesos toman la misma venta, la segunda vez se encuentra la
+factura existente y sólo se marca como confirmada.
+
+Si la base no responde se reintenta con espera creciente; los errores propios
+de la venta (no de conexión) cuentan intentos y tras COLA_FACTURAS_MAX_INTENTOS
+la venta queda 'fallida' para revisarla con `flask ventas cola`.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+from database import db
+import facturacion
+
+PENDIENTE, CONFIRMADA, FALLIDA = 'pendiente', 'confirmada', 'fallida'
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS facturas_pendientes (
+    provisional INTEGER PRIMARY KEY AUTOINCREMENT,
+    clave TEXT NOT NULL UNIQUE,
+    creada TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    proximo_intento REAL NOT NULL DEFAULT 0,
+    ultimo_error TEXT,
+    factura_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_pendientes_estado ON facturas_pendientes (estado, proximo_intento);
+"""
+
+
+def numero_provisional(provisional):
+    return f"P-{provisional:06d}"
+
+
+def _es_de_conexion(error):
+    """Base caída o lenta (reintentar sin límite) frente a un error de la propia venta."""
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated)
+
+
+class ColaFacturas:
+
+    def __init__(self):
+        self._ruta = None
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self.confirmadas = 0
+        self.reintentos = 0
+        # Reloj de las esperas entre reintentos; las pruebas lo reemplazan para no dormir
+        self.reloj = time.time
+
+    def _conectar(self):
+        if self._ruta is None:
+            # Relativa a la aplicación: arrancar desde otro directorio no debe dejar ventas huérfanas
+            self._ruta = os.path.join(current_app.root_path,
+                                      current_app.config.get('COLA_FACTURAS_RUTA', 'cola_facturas.db'))
+            with sqlite3.connect(self._ruta) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_ESQUEMA)
+        conn = sqlite3.connect(self._ruta, timeout=10)
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def encolar(self, venta, clave=None):
+        """
+        Guarda la venta en el diario y devuelve (clave, número provisional).
+        Reenviar la misma clave devuelve el número que ya tenía.
+        """
+        clave = clave or str(uuid.uuid4())
+        conn = self._conectar()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO facturas_pendientes (clave, creada, datos) VALUES (?, ?, ?)",
+                    (clave, datetime.now().isoformat(timespec='seconds'), json.dumps(venta)))
+            provisional = conn.execute("SELECT provisional FROM facturas_pendientes WHERE clave = ?",
+                                       (clave,)).fetchone()[0]
+        finally:
+            conn.close()
+        self.iniciar(current_app._get_current_object())
+        self._despertar.set()
+        return clave, numero_provisional(provisional)
+
+    def _tomar(self, limite):
+        conn = self._conectar()
+        try:
+            return conn.execute(
+                "SELECT provisional, clave, datos, intentos FROM facturas_pendientes "
+                "WHERE estado = ? AND proximo_intento <= ? ORDER BY provisional LIMIT ?",
+                (PENDIENTE, self.reloj(), limite)).fetchall()
+        finally:
+            conn.close()
+
+    def _marcar_confirmadas(self, confirmadas):
+        conn = self._conectar()
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE facturas_pendientes SET estado = ?, factura_id = ?, ultimo_error = NULL "
+                    "WHERE provisional = ?",
+                    [(CONFIRMADA, factura_id, provisional) for provisional, factura_id in confirmadas])
+        finally:
+            conn.close()
+        self.confirmadas += len(confirmadas)
+
+    def _marcar_error(self, entradas, error, cuenta_intento):
+        config = current_app.config
+        maximo = config.get('COLA_FACTURAS_MAX_INTENTOS', 20)
+        conn = self._conectar()
+        try:
+            with conn:
+                for e in entradas:
+                    intentos = e['intentos'] + (1 if cuenta_intento else 0)
+                    espera = min(2 ** min(intentos, 8), config.get('COLA_FACTURAS_ESPERA_MAX_SEG', 120))
+                    estado = FALLIDA if cuenta_intento and intentos >= maximo else PENDIENTE
+                    conn.execute(
+                        "UPDATE facturas_pendientes SET estado = ?, intentos = ?, proximo_intento = ?, "
+                        "ultimo_error = ? WHERE provisional = ?",
+                        (estado, intentos, self.reloj() + espera, str(error)[:500], e['provisional']))
+        finally:
+            conn.close()
+        self.reintentos += len(entradas)
+
+    def _registrar(self, entradas):
+        """Registra las entradas en una sola transacción; devuelve [(provisional, factura_id)]."""
+        existentes = facturacion.facturas_por_clave([e['clave'] for e in entradas])
+        confirmadas = []
+        for e in entradas:
+            factura_id = existentes.get(e['clave'])
+            if factura_id is None:
+                factura_id = facturacion.registrar_venta(json.loads(e['datos']), e['clave'])
+            confirmadas.append((e['provisional'], factura_id))
+        db.session.commit()
+        return confirmadas
+
+    def procesar_lote(self, limite=None):
+        """Registra un lote de pendientes en la base principal. Devuelve cuántas se confirmaron."""
+        entradas = self._tomar(limite or current_app.config.get('COLA_FACTURAS_LOTE', 50))
+        if not entradas:
+            return 0
+        try:
+            confirmadas = self._registrar(entradas)
+        except Exception as error:
+            db.session.rollback()
+            if _es_de_conexion(error):
+                current_app.logger.warning("Cola de facturas: base no disponible (%s)", error)
+                self._marcar_error(entradas, error, cuenta_intento=False)
+                return 0
+            # Una venta con problemas no debe frenar al resto: se reintenta una por una
+            confirmadas = []
+            for e in entradas:
+                try:
+                    confirmadas.extend(self._registrar([e]))
+                except IntegrityError as error_venta:
+                    db.session.rollback()
+                    # Si otro proceso la registró entre la consulta y el INSERT, ya está hecha
+                    factura_id = facturacion.facturas_por_clave([e['clave']]).get(e['clave'])
+                    if factura_id is not None:
+                        confirmadas.append((e['provisional'], factura_id))
+                    else:
+                        self._marcar_error([e], error_venta, cuenta_intento=True)
+                except Exception as error_venta:
+                    db.session.rollback()
+                    current_app.logger.exception("Cola de facturas: no se pudo registrar %s",
+                                                 numero_provisional(e['provisional']))
+                    self._marcar_error([e], error_venta, cuenta_intento=not _es_de_conexion(error_venta))
+        if confirmadas:
+            self._marcar_confirmadas(confirmadas)
+        return len(confirmadas)
+
+    def iniciar(self, app):
+        """Arranca el hilo que vacía la cola (una vez por proceso)."""
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._trabajar, args=(app,),
+                                              name="cola-facturas", daemon=True)
+                self._hilo.start()
+
+    def _trabajar(self, app):
+        intervalo = app.config.get('COLA_FACTURAS_INTERVALO_SEG', 1.0)
+        while True:
+            self._despertar.wait(intervalo)
+            self._despertar.clear()
+            try:
+                with app.app_context():
+                    # Mientras haya lotes completos se siguen procesando sin esperar
+                    while self.procesar_lote() >= app.config.get('COLA_FACTURAS_LOTE', 50):
+                        pass
+                    db.session.remove()
+            except Exception:
+                app.logger.exception("Cola de facturas: error inesperado en el hilo")
+
+    def resumen(self):
+        """Cantidad por estado y antigüedad de la pendiente más vieja."""
+        conn = self._conectar()
+        try:
+            conteo = dict(conn.execute(
+                "SELECT estado, COUNT(*) FROM facturas_pendientes GROUP BY estado").fetchall())
+            mas_vieja = conn.execute("SELECT MIN(creada) FROM facturas_pendientes WHERE estado = ?",
+                                     (PENDIENTE,)).fetchone()[0]
+        finally:
+            conn.close()
+        return {
+            'pendientes': conteo.get(PENDIENTE, 0),
+            'confirmadas': conteo.get(CONFIRMADA, 0),
+            'fallidas': conteo.get(FALLIDA, 0),
+            'pendiente_mas_vieja': mas_vieja,
+            'confirmadas_en_proceso': self.confirmadas,
+            'reintentos_en_proceso': self.reintentos,
+        }
+
+    def listar(self, estado, limite=50):
+        conn = self._conectar()
+        try:
+            return [dict(f) for f in conn.execute(
+                "SELECT provisional, clave, creada, intentos, ultimo_error, factura_id "
+                "FROM facturas_pendientes WHERE estado = ? ORDER BY provisional LIMIT ?", (estado, limite))]
+        finally:
+            conn.close()
+
+    def purgar(self, dias):
+        """Borra del diario las confirmadas hace más de `dias` días."""
+        limite = datetime.fromtimestamp(time.time() - dias * 86400).isoformat(timespec='seconds')
+        conn = self._conectar()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM facturas_pendientes WHERE estado = ? AND creada < ?",
+                                    (CONFIRMADA, limite)).rowcount
+        finally:
+            conn.close()
+
+    def reintentar_fallidas(self):
+        conn = self._conectar()
+        try:
+            with conn:
+                return conn.execute(
+                    "UPDATE facturas_pendientes SET estado = ?, intentos = 0, proximo_intento = 0 "
+                    "WHERE estado = ?", (PENDIENTE, FALLIDA)).rowcount
+        finally:
+            conn.close()
+
+
+cola = ColaFacturas()
+
+
+def encolar(venta, clave=None):
+    return cola.encolar(venta, clave)
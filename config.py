@@ -1,8 +1,106 @@
 # config.py universal
-SQLALCHEMY_DATABASE_URI = (
-    "mssql+pyodbc://./SISTEMA_DE_RESTAURANTE_TRATTORIA?" 
-    "driver=ODBC+Driver+17+for+SQL+Server&"
-    "trusted_connection=yes&"
-    "Encrypt=no&"
-    "TrustServerCertificate=yes"
-)
\ No newline at end of file
+import os
+
+from motor_bd import ajustes, opciones_motor
+
+# Perfil de base de datos: 'prod' (SQL Server) o 'dev' (SQLite local).
+# Los ajustes del pool se pueden cambiar con BD_POOL_SIZE, BD_MAX_OVERFLOW,
+# BD_POOL_TIMEOUT, BD_POOL_RECYCLE, BD_PRE_PING y BD_TIMEOUT_SENTENCIA_SEG (ver motor_bd.py)
+ENTORNO = os.environ.get("RESTAURANTE_ENTORNO", "prod")
+
+SQLALCHEMY_DATABASE_URI = os.environ.get("RESTAURANTE_BD_URI") or ({
+    "prod": (
+        "mssql+pyodbc://./SISTEMA_DE_RESTAURANTE_TRATTORIA?" 
+        "driver=ODBC+Driver+17+for+SQL+Server&"
+        "trusted_connection=yes&"
+        "Encrypt=no&"
+        "TrustServerCertificate=yes"
+    ),
+    "dev": "sqlite:///restaurante_dev.db",
+}.get(ENTORNO))
+# Un entorno desconocido lo reporta ajustes() con la lista de entornos válidos
+SQLALCHEMY_ENGINE_OPTIONS = opciones_motor(ENTORNO)
+BD_TIMEOUT_SENTENCIA_SEG = ajustes(ENTORNO)["timeout_sentencia_seg"]
+
+# Métricas de la base en /admin/bd (admin.py). Sin ADMIN_TOKEN sólo se aceptan
+# peticiones locales; las cabeceras X-Consultas-SQL ayudan al desarrollar
+ADMIN_TOKEN = os.environ.get("RESTAURANTE_ADMIN_TOKEN")
+BD_METRICAS_CABECERAS = ENTORNO == "dev"
+
+# Historial de ventas (/historial): tamaño de página por defecto y máximo permitido
+HISTORIAL_POR_PAGINA = 25
+HISTORIAL_MAX_POR_PAGINA = 200
+
+# Caché del menú en cada proceso (menu_cache.py): cada cuánto se compara la
+# versión con la base y cuánto dura una copia como máximo
+MENU_CACHE_VERIFICACION_SEG = 5
+MENU_CACHE_TTL_SEG = 300
+
+# Máximo de clientes devueltos por la búsqueda y el listado de /clientes
+CLIENTES_LIMITE_RESULTADOS = 50
+
+# Duración con la que se bloquea una mesa al reservar (disponibilidad.py)
+RESERVA_DURACION_MIN = 120
+
+# Reservaciones: tamaño de página, alcance de la vista "próximas" y compatibilidad
+# con filas cuya fecha sólo existe como texto (desactivar tras el backfill de fecha_hora)
+RESERVACIONES_POR_PAGINA = 50
+RESERVACIONES_DIAS_PROXIMAS = 30
+RESERVACIONES_COMPAT_FECHA_TEXTO = True
+
+# Canal de eventos en tiempo real (eventos.py): cada proceso consulta la tabla de
+# eventos cada EVENTOS_INTERVALO_SEG sin importar cuántas pantallas estén conectadas.
+# Cada pantalla ocupa un hilo mientras dura su stream: servir con hilos o gevent
+# (gunicorn -k gthread --threads 32, -k gevent o waitress), no con workers sync
+EVENTOS_INTERVALO_SEG = 1.0
+EVENTOS_LATIDO_SEG = 15
+EVENTOS_MAX_PENDIENTES = 1000
+EVENTOS_RETENCION_HORAS = 24
+# Ids salteados por transacciones largas se vuelven a buscar durante esta ventana
+EVENTOS_VENTANA_HUECOS_SEG = 30
+# Duración máxima de un stream; el navegador reconecta solo (Last-Event-ID)
+EVENTOS_DURACION_MAX_SEG = 300
+
+# Cola local de ventas (cola_facturas.py): la factura se guarda primero en este
+# diario SQLite y un hilo la registra en SQL Server por lotes, con reintentos.
+# Desactivada por omisión: con la cola la caja recibe un número provisional y la
+# factura aparece en /historial cuando el hilo la registra. La ruta relativa se
+# resuelve contra la carpeta de la aplicación, no contra el directorio de arranque
+COLA_FACTURAS_ACTIVA = False
+COLA_FACTURAS_RUTA = "cola_facturas.db"
+COLA_FACTURAS_LOTE = 50
+COLA_FACTURAS_INTERVALO_SEG = 1.0
+COLA_FACTURAS_MAX_INTENTOS = 20
+COLA_FACTURAS_ESPERA_MAX_SEG = 120
+
+# Perfilador de rutas y detector de N+1 (perfilador.py), sólo para diagnosticar:
+# una forma de SQL repetida PERFILADOR_UMBRAL_REPETIDAS veces en una petición se reporta
+PERFILADOR_ACTIVO = os.environ.get("RESTAURANTE_PERFILADOR", "") == "1"
+PERFILADOR_BLUEPRINTS = ("home", "ventas", "clientes", "reservacion")
+PERFILADOR_UMBRAL_REPETIDAS = 5
+
+# Caché de páginas renderizadas (cache_paginas.py): /menu, /mesas y /historial se
+# sirven de memoria (o con 304) mientras no cambie la versión de sus datos
+CACHE_PAGINAS_ACTIVA = True
+CACHE_PAGINAS_MAX_MB = 32
+CACHE_PAGINAS_MAX_ENTRADAS = 500
+
+# Analítica del dashboard (analitica_ventas.py): semanas usadas para la
+# estacionalidad por día de la semana, cuántos días de historia pesan en el ritmo
+# del mes mientras hay pocos días cerrados y resultados memorizados por proceso
+ANALITICA_SEMANAS_HISTORIA = 8
+ANALITICA_PESO_HISTORIA_DIAS = 7
+ANALITICA_MEMO_ENTRADAS = 24
+
+# Importación masiva del menú (importacion_menu.py): filas máximas por archivo
+MENU_IMPORTACION_MAX_FILAS = 2000
+
+# Modo asíncrono (servidor_async.py): URI del motor asíncrono (por omisión la de
+# SQLALCHEMY_DATABASE_URI con aioodbc/aiosqlite) y opciones de pool propias
+ASYNC_BD_URI = None
+ASYNC_BD_OPCIONES = {}
+
+# Archivo de facturas (archivo_facturas.py, `flask ventas archivar`): meses que
+# quedan en las tablas vivas además del actual y facturas por lote del trabajo
+ARCHIVO_MESES_VIVOS = 24
+ARCHIVO_LOTE = 5000
@@ -1,2 +1,64 @@
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
\ No newline at end of file
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy import Date, Integer
+from datetime import date, datetime
+
+db = SQLAlchemy()
+
+
+# Truncado de DateTime a día, portable entre SQL Server y SQLite.
+# Sólo debe usarse en SELECT / GROUP BY: para filtrar se usan rangos
+# (col >= inicio AND col < fin) que sí aprovechan el índice.
+class dia(FunctionElement):
+    type = Date()
+    inherit_cache = True
+    name = "dia"
+
+@compiles(dia)
+def _dia_default(element, compiler, **kw):
+    return "CAST(%s AS DATE)" % compiler.process(element.clauses, **kw)
+
+@compiles(dia, "sqlite")
+def _dia_sqlite(element, compiler, **kw):
+    return "date(%s)" % compiler.process(element.clauses, **kw)
+
+
+# Día de la semana (lunes = 0) y hora de un DateTime, para agrupar en SQL.
+# SQL Server: DATEPART(weekday) depende de SET DATEFIRST; se cuenta en cambio
+# desde el día 0 (1900-01-01, lunes).
+class dia_semana(FunctionElement):
+    type = Integer()
+    inherit_cache = True
+    name = "dia_semana"
+
+@compiles(dia_semana)
+def _dia_semana_default(element, compiler, **kw):
+    return "(DATEDIFF(day, 0, %s) %% 7)" % compiler.process(element.clauses, **kw)
+
+@compiles(dia_semana, "sqlite")
+def _dia_semana_sqlite(element, compiler, **kw):
+    # strftime('%w'): domingo = 0
+    return "((CAST(strftime('%%w', %s) AS INTEGER) + 6) %% 7)" % compiler.process(element.clauses, **kw)
+
+class hora(FunctionElement):
+    type = Integer()
+    inherit_cache = True
+    name = "hora"
+
+@compiles(hora)
+def _hora_default(element, compiler, **kw):
+    return "DATEPART(hour, %s)" % compiler.process(element.clauses, **kw)
+
+@compiles(hora, "sqlite")
+def _hora_sqlite(element, compiler, **kw):
+    return "CAST(strftime('%%H', %s) AS INTEGER)" % compiler.process(element.clauses, **kw)
+
+def como_fecha(valor):
+    """SQLite devuelve el día como texto ISO; SQL Server como date."""
+    # datetime es subclase de date: min/max(Factura.fecha) trae la hora del día
+    if isinstance(valor, datetime):
+        return valor.date()
+    if valor is None or isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
@@ -0,0 +1,179 @@
+"""
+Disponibilidad de mesas por franja horaria y reserva con control de choques.
+
+Cada reserva ocupa su mesa desde `fecha_hora` durante RESERVA_DURACION_MIN minutos.
+Para responder "¿qué mesas con capacidad >= N están libres a la hora T?" se
+carga, una vez por mes y por versión de 'reservaciones', un índice de
+intervalos por mesa (listas ordenadas + búsqueda binaria). La carga es una
+consulta por rango de fecha, no un recorrido de toda la tabla.
+
+La reserva en sí no confía en ese índice: vuelve a comprobar el choque en la
+base y confirma con un UPDATE condicional sobre mesas.version, de modo que de
+dos reservas simultáneas de la misma mesa sólo una puede hacer commit.
+"""
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from flask import current_app
+from sqlalchemy import and_, func, or_, update
+
+from database import db
+from models import Mesa, Reservacion, FORMATO_FECHA_RESERVA as FORMATO_FECHA, parsear_fecha_reserva
+import versiones_datos
+
+VERSION = 'reservaciones'
+
+
+class ConflictoReserva(Exception):
+    """La mesa no está libre en la franja pedida (o otra reserva ganó la carrera)."""
+
+
+def duracion():
+    return timedelta(minutes=current_app.config.get('RESERVA_DURACION_MIN', 120))
+
+
+def leer_fecha(valor):
+    """Acepta 'YYYY-MM-DD HH:MM' (formato guardado) o 'YYYY-MM-DDTHH:MM' (datetime-local)."""
+    return datetime.strptime(valor.strip().replace('T', ' ')[:16], FORMATO_FECHA)
+
+
+def en_rango(desde, hasta):
+    """
+    Filtro fecha_hora >= desde AND fecha_hora < hasta (indexado).
+    Mientras RESERVACIONES_COMPAT_FECHA_TEXTO esté activo también incluye las filas
+    que el backfill aún no migró, comparando su texto (mismo orden que la fecha).
+    """
+    filtro = and_(Reservacion.fecha_hora >= desde, Reservacion.fecha_hora < hasta)
+    if current_app.config.get('RESERVACIONES_COMPAT_FECHA_TEXTO', True):
+        filtro = or_(filtro, and_(
+            Reservacion.fecha_hora.is_(None),
+            Reservacion.fecha >= desde.strftime(FORMATO_FECHA),
+            Reservacion.fecha < hasta.strftime(FORMATO_FECHA)
+        ))
+    return filtro
+
+
+class IndiceReservas:
+    """Intervalos [inicio, fin) por mesa para un rango de fechas ya cargado."""
+
+    def __init__(self, filas, dur):
+        por_mesa = {}
+        for mesa_id, inicio in filas:
+            if inicio is not None:
+                por_mesa.setdefault(mesa_id, []).append(inicio)
+        self._inicios = {}
+        self._max_fin = {}
+        for mesa_id, inicios in por_mesa.items():
+            inicios.sort()
+            self._inicios[mesa_id] = inicios
+            # Fin más tardío entre las reservas que empiezan antes de cada posición
+            self._max_fin[mesa_id] = list(accumulate((i + dur for i in inicios), max))
+
+    def ocupada(self, mesa_id, inicio, fin):
+        inicios = self._inicios.get(mesa_id)
+        if not inicios:
+            return False
+        k = bisect_left(inicios, fin)  # reservas que empiezan antes de que termine la franja
+        return k > 0 and self._max_fin[mesa_id][k - 1] > inicio
+
+
+class _CacheIndices:
+
+    def __init__(self):
+        self._indices = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, momento):
+        clave = (momento.year, momento.month)
+        version = versiones_datos.leer(VERSION)[VERSION]
+        actual = self._indices.get(clave)
+        if actual and actual[0] == version:
+            return actual[1]
+        with self._lock:
+            indice = self._cargar(clave)
+            # Sólo guardamos algunos meses (el actual y los próximos suelen bastar)
+            if len(self._indices) >= 6:
+                self._indices.clear()
+            self._indices[clave] = (version, indice)
+            return indice
+
+    def _cargar(self, clave):
+        anio, mes = clave
+        dur = duracion()
+        inicio_mes = datetime(anio, mes, 1)
+        fin_mes = datetime(anio + 1, 1, 1) if mes == 12 else datetime(anio, mes + 1, 1)
+        # Incluye reservas del mes anterior que aún ocupan la mesa al empezar este
+        desde, hasta = inicio_mes - dur, fin_mes + dur
+        filas = db.session.query(Reservacion.mesa_id, Reservacion.fecha_hora, Reservacion.fecha).filter(
+            Reservacion.mesa_id.isnot(None),
+            en_rango(desde, hasta)
+        ).all()
+        return IndiceReservas(((m, fh or parsear_fecha_reserva(f)) for m, fh, f in filas), dur)
+
+
+_indices = _CacheIndices()
+
+
+def mesas_libres(momento, personas):
+    """Mesas con capacidad >= personas sin reservas que se crucen con [momento, momento + duración)."""
+    fin = momento + duracion()
+    indice = _indices.obtener(momento)
+    candidatas = Mesa.query.filter(Mesa.capacidad >= personas)\
+        .order_by(Mesa.capacidad, Mesa.nombre).all()
+    return [m for m in candidatas if not indice.ocupada(m.mesa_id, momento, fin)]
+
+
+def hay_choque(mesa_id, inicio):
+    """Comprobación directa en la base (usa el índice mesa_id + fecha_hora)."""
+    dur = duracion()
+    # Las reservas son por minuto; una que empezó justo `dur` antes termina cuando empieza esta
+    return db.session.query(Reservacion.reservacion_id).filter(
+        Reservacion.mesa_id == mesa_id,
+        en_rango(inicio - dur + timedelta(minutes=1), inicio + dur)
+    ).first() is not None
+
+
+def reservar(mesa_id, cliente_id, personas, inicio):
+    """
+    Crea la reserva si la mesa está libre. No hace commit; si lanza
+    ConflictoReserva quien llama debe hacer rollback.
+    """
+    mesa = Mesa.query.get(mesa_id)
+    if mesa is None:
+        raise ConflictoReserva("La mesa seleccionada no existe")
+    if mesa.capacidad < personas:
+        raise ConflictoReserva(f"La mesa {mesa.nombre} tiene capacidad para {mesa.capacidad} personas")
+    version_leida = mesa.version or 0
+
+    if hay_choque(mesa_id, inicio):
+        raise ConflictoReserva(f"La mesa {mesa.nombre} ya está reservada en ese horario")
+
+    # Bloqueo optimista: si otra transacción reservó esta mesa desde que leímos su
+    # versión, el UPDATE no encuentra la fila (o espera su commit y luego no la encuentra)
+    reclamada = db.session.execute(
+        update(Mesa)
+        .where(Mesa.mesa_id == mesa_id, func.coalesce(Mesa.version, 0) == version_leida)
+        .values(version=func.coalesce(Mesa.version, 0) + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not reclamada:
+        raise ConflictoReserva(f"La mesa {mesa.nombre} acaba de ser reservada por otra persona")
+    db.session.expire(mesa, ['version'])
+
+    res = Reservacion(
+        fecha_hora=inicio,
+        personas=personas,
+        cliente_id=cliente_id,
+        mesa_id=mesa_id
+    )
+    db.session.add(res)
+
+    # Si la franja incluye el momento actual, la mesa pasa a ocupada en el salón
+    if inicio <= datetime.now() < inicio + duracion():
+        mesa.estatus = "Ocupada"
+        versiones_datos.incrementar('mesas')
+
+    versiones_datos.incrementar(VERSION)
+    return res
@@ -0,0 +1,306 @@
+"""
+Canal de eventos en tiempo real para cocina y salón (Server-Sent Events).
+
+Cada cambio de `estatus` de un Pedido o una Mesa deja una fila en eventos_estado
+en la misma transacción que el cambio (listener after_flush), así que sólo se
+publica lo que llega a hacer commit, venga de la ruta o del proceso que venga.
+
+Las pantallas se conectan a /eventos?temas=pedido,mesa. En cada proceso un único
+hilo lee los eventos nuevos (evento_id > último visto) cada EVENTOS_INTERVALO_SEG
+y los reparte a las colas de los clientes conectados: la carga sobre la base es
+una consulta indexada por intervalo y por proceso, sin importar cuántas
+pantallas estén abiertas. Al reconectar, el navegador manda Last-Event-ID y se
+le reenvía lo que se perdió.
+
+El IDENTITY se asigna al insertar pero la fila se ve recién al hacer commit: una
+transacción larga (p. ej. un lote de la cola de ventas) puede confirmar un id
+menor después de que el lector ya pasó por uno mayor. Los ids salteados quedan
+como huecos que se vuelven a consultar durante EVENTOS_VENTANA_HUECOS_SEG; un
+hueco que no se llena en ese tiempo se da por perdido (rollback o salto del
+IDENTITY).
+
+Cada pantalla conectada ocupa un hilo del servidor mientras dura su stream:
+hace falta un servidor con hilos o green threads (gunicorn -k gthread --threads N,
+-k gevent, waitress), no workers síncronos de un hilo. Además cada stream se
+cierra a los EVENTOS_DURACION_MAX_SEG y el navegador reconecta solo con
+Last-Event-ID, así ningún hilo queda tomado indefinidamente.
+
+    flask eventos purgar      # borra eventos más viejos que EVENTOS_RETENCION_HORAS
+"""
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, Response, current_app, jsonify, request
+from sqlalchemy import event, func, inspect, or_
+from sqlalchemy.orm import Session
+
+from database import db
+from models import EventoEstado, Mesa, Pedido
+
+eventos_bp = Blueprint('eventos', __name__)
+
+ENTIDADES = {Pedido: 'pedido', Mesa: 'mesa'}
+TEMAS = set(ENTIDADES.values())
+MAX_HUECOS = 50
+
+
+def _id(obj):
+    return obj.pedido_id if isinstance(obj, Pedido) else obj.mesa_id
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_cambios(session, contexto):
+    # En after_flush new/dirty/deleted y el historial de atributos aún muestran lo del flush
+    filas = []
+    for obj in session.new:
+        entidad = ENTIDADES.get(type(obj))
+        if entidad:
+            filas.append((entidad, _id(obj), None, obj.estatus))
+    for obj in session.dirty:
+        entidad = ENTIDADES.get(type(obj))
+        if not entidad:
+            continue
+        historial = inspect(obj).attrs.estatus.history
+        if not historial.added:
+            continue
+        anterior = historial.deleted[0] if historial.deleted else None
+        if anterior != obj.estatus:
+            filas.append((entidad, _id(obj), anterior, obj.estatus))
+    for obj in session.deleted:
+        entidad = ENTIDADES.get(type(obj))
+        if entidad:
+            filas.append((entidad, _id(obj), obj.estatus, None))
+    if filas:
+        ahora = datetime.now()
+        session.connection().execute(EventoEstado.__table__.insert(), [
+            {'creado': ahora, 'entidad': e, 'entidad_id': i, 'anterior': a, 'estatus': s}
+            for e, i, a, s in filas
+        ])
+
+
+def _como_dict(fila):
+    return {
+        'evento_id': fila.evento_id,
+        'entidad': fila.entidad,
+        'id': fila.entidad_id,
+        'anterior': fila.anterior,
+        'estatus': fila.estatus,
+        'creado': fila.creado.isoformat(timespec='seconds'),
+    }
+
+
+def eventos_desde(ultimo_id, temas=None, limite=1000, huecos=()):
+    """
+    Eventos con evento_id > ultimo_id o dentro de los rangos (desde, hasta) de
+    `huecos`, en orden (consulta por clave primaria).
+    """
+    rangos = [EventoEstado.evento_id > ultimo_id] + \
+        [EventoEstado.evento_id.between(desde, hasta) for desde, hasta in huecos]
+    consulta = EventoEstado.query.filter(or_(*rangos))
+    if temas is not None:
+        consulta = consulta.filter(EventoEstado.entidad.in_(sorted(temas)))
+    return [_como_dict(f) for f in consulta.order_by(EventoEstado.evento_id).limit(limite)]
+
+
+def ultimo_evento_id():
+    return db.session.query(func.max(EventoEstado.evento_id)).scalar() or 0
+
+
+class Suscripcion:
+
+    def __init__(self, temas, maximo):
+        self.temas = temas
+        self.cola = queue.Queue(maxsize=maximo)
+        self.desbordada = False
+
+    def entregar(self, evento):
+        if evento['entidad'] not in self.temas:
+            return
+        try:
+            self.cola.put_nowait(evento)
+        except queue.Full:
+            # Cliente demasiado lento: se corta el stream y al reconectar recupera con Last-Event-ID
+            self.desbordada = True
+
+    def esperar(self, timeout):
+        """Eventos pendientes, quedándose sólo con el último por entidad (diff mínimo)."""
+        try:
+            pendientes = [self.cola.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                pendientes.append(self.cola.get_nowait())
+            except queue.Empty:
+                break
+        # Un evento de un hueco puede llegar después de uno más nuevo de la misma entidad
+        ultimos = {}
+        for e in pendientes:
+            clave = (e['entidad'], e['id'])
+            if clave not in ultimos or e['evento_id'] > ultimos[clave]['evento_id']:
+                ultimos[clave] = e
+        return sorted(ultimos.values(), key=lambda e: e['evento_id'])
+
+
+class Difusor:
+    """Un hilo lector por proceso que reparte los eventos nuevos a las suscripciones."""
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._ultimo = None
+        # [desde, hasta, vence]: ids por debajo de _ultimo que aún no se vieron
+        self._huecos = []
+        self.consultas = 0
+        self.entregados = 0
+        self.huecos_llenados = 0
+        self.huecos_vencidos = 0
+
+    def suscribir(self, temas, maximo=1000):
+        sus = Suscripcion(temas, maximo)
+        app = current_app._get_current_object()
+        with self._lock:
+            if self._ultimo is None:
+                self._ultimo = ultimo_evento_id()
+            self._suscripciones.add(sus)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._leer, args=(app,),
+                                              name="eventos-estado", daemon=True)
+                self._hilo.start()
+        return sus
+
+    def cancelar(self, sus):
+        with self._lock:
+            self._suscripciones.discard(sus)
+
+    def conectados(self):
+        return len(self._suscripciones)
+
+    def _leer(self, app):
+        intervalo = app.config.get('EVENTOS_INTERVALO_SEG', 1.0)
+        while True:
+            time.sleep(intervalo)
+            with self._lock:
+                if not self._suscripciones:
+                    # Sin pantallas conectadas no se consulta; el próximo cliente relanza el hilo
+                    self._hilo = None
+                    self._ultimo = None
+                    self._huecos = []
+                    return
+            ahora = time.monotonic()
+            vigentes = [h for h in self._huecos if h[2] > ahora]
+            self.huecos_vencidos += len(self._huecos) - len(vigentes)
+            self._huecos = vigentes
+            try:
+                with app.app_context():
+                    nuevos = eventos_desde(self._ultimo, huecos=[(d, h) for d, h, _ in self._huecos])
+                    db.session.remove()
+            except Exception:
+                app.logger.exception("No se pudieron leer los eventos de estatus")
+                continue
+            self.consultas += 1
+            if not nuevos:
+                continue
+            self._avanzar([e['evento_id'] for e in nuevos], ahora + app.config.get('EVENTOS_VENTANA_HUECOS_SEG', 30))
+            with self._lock:
+                suscripciones = list(self._suscripciones)
+            for evento in nuevos:
+                for sus in suscripciones:
+                    sus.entregar(evento)
+            self.entregados += len(nuevos) * len(suscripciones)
+
+    def _avanzar(self, ids, vence):
+        """Mueve la marca con los ids leídos (en orden): abre huecos por los saltos y cierra los que se llenaron."""
+        for evento_id in ids:
+            if evento_id > self._ultimo:
+                if evento_id > self._ultimo + 1:
+                    self._huecos.append([self._ultimo + 1, evento_id - 1, vence])
+                self._ultimo = evento_id
+                continue
+            for i, (desde, hasta, limite) in enumerate(self._huecos):
+                if desde <= evento_id <= hasta:
+                    partes = [[d, h, limite] for d, h in ((desde, evento_id - 1), (evento_id + 1, hasta)) if d <= h]
+                    self._huecos[i:i + 1] = partes
+                    self.huecos_llenados += 1
+                    break
+        # Muchos huecos a la vez (saltos del IDENTITY): se conservan los más recientes
+        del self._huecos[:-MAX_HUECOS]
+
+    def estadisticas(self):
+        return {'conectados': self.conectados(), 'consultas': self.consultas,
+                'entregados': self.entregados, 'ultimo_evento_id': self._ultimo,
+                'huecos_abiertos': len(self._huecos), 'huecos_llenados': self.huecos_llenados,
+                'huecos_vencidos': self.huecos_vencidos}
+
+
+difusor = Difusor()
+
+
+def _sse(evento):
+    return f"id: {evento['evento_id']}\nevent: {evento['entidad']}\ndata: {json.dumps(evento)}\n\n"
+
+
+def _temas_solicitados():
+    solicitados = {t.strip() for t in request.args.get('temas', '').split(',') if t.strip()}
+    return (solicitados & TEMAS) or set(TEMAS)
+
+
+@eventos_bp.route('/eventos')
+def stream():
+    temas = _temas_solicitados()
+    config = current_app.config
+    latido = config.get('EVENTOS_LATIDO_SEG', 15)
+    duracion_max = config.get('EVENTOS_DURACION_MAX_SEG', 300)
+
+    sus = difusor.suscribir(temas, config.get('EVENTOS_MAX_PENDIENTES', 1000))
+    desde = request.headers.get('Last-Event-ID', request.args.get('desde', ''))
+    atrasados = eventos_desde(int(desde), temas) if desde.isdigit() else []
+    # El stream no usa la sesión: se libera la conexión antes de empezar a emitir
+    db.session.remove()
+
+    def emitir():
+        vistos = {e['evento_id'] for e in atrasados}
+        fin = time.monotonic() + duracion_max
+        try:
+            yield "retry: 3000\n\n"
+            for evento in atrasados:
+                yield _sse(evento)
+            # Al cerrar por duración el navegador reconecta con Last-Event-ID
+            while not sus.desbordada and time.monotonic() < fin:
+                eventos = sus.esperar(min(latido, max(fin - time.monotonic(), 0.1)))
+                if not eventos:
+                    yield ": latido\n\n"
+                    continue
+                for evento in eventos:
+                    if evento['evento_id'] not in vistos:
+                        yield _sse(evento)
+        finally:
+            difusor.cancelar(sus)
+
+    return Response(emitir(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # que nginx no acumule el stream
+    })
+
+
+@eventos_bp.route('/eventos/estado')
+def estado():
+    return jsonify(difusor.estadisticas())
+
+
+@eventos_bp.cli.command("purgar")
+@click.option("--horas", type=int, default=None,
+              help="Antigüedad máxima; por defecto EVENTOS_RETENCION_HORAS")
+def purgar(horas):
+    """Borra los eventos de estatus viejos (sólo sirven para reconexiones)."""
+    horas = horas or current_app.config.get('EVENTOS_RETENCION_HORAS', 24)
+    limite = datetime.now() - timedelta(hours=horas)
+    borrados = EventoEstado.query.filter(EventoEstado.creado < limite)\
+        .delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f"{borrados} eventos borrados")
@@ -0,0 +1,248 @@
+"""
+Exportación de facturas línea por línea (CSV o XLSX) para el cierre de mes.
+
+Las filas se leen con un cursor del servidor (yield_per) y se escriben en
+trozos a medida que llegan, tanto en la respuesta HTTP como en el CLI: la
+memoria usada es la misma para mil líneas que para diez millones.
+
+El ITBIS y la propina legal de cada línea se prorratean con los montos que
+quedaron guardados en su factura y la diferencia de redondeo va en la última
+línea, así que la suma de las líneas cuadra al centavo con los totales de la
+factura aunque las tasas cambien en el futuro.
+
+Si el rango empieza antes de la frontera del archivo (archivo_facturas) se
+leen primero las facturas archivadas y después las vivas, en el mismo orden.
+
+El XLSX se arma a mano (un zip con el XML mínimo de una hoja) para poder
+escribirlo en streaming sin dependencias; al pasar del límite de filas de
+Excel se continúa en una hoja nueva.
+"""
+import csv
+import io
+import itertools
+import time
+import zipfile
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+
+from database import db
+from models import Cliente
+import archivo_facturas
+
+COLUMNAS = [
+    "factura_id", "fecha", "cliente_id", "cliente", "detalle_id", "plato_id", "descripcion",
+    "cantidad", "precio_unitario", "subtotal_linea", "itbis_linea", "propina_linea", "total_linea",
+    "subtotal_factura", "itbis_factura", "propina_factura", "total_factura",
+]
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+FILAS_POR_LOTE = 2000
+MAX_FILAS_HOJA = 1_048_575  # límite de Excel menos la fila de encabezados
+
+
+def consulta(factura, detalle, condiciones):
+    """Líneas de factura con su cabecera, en orden (fecha, factura_id, detalle_id)."""
+    return select(
+        factura.factura_id, factura.fecha, factura.cliente_id, Cliente.nombre,
+        detalle.detalle_id, detalle.plato_id, detalle.descripcion,
+        detalle.cantidad, detalle.precio_unitario, detalle.total_linea,
+        factura.subtotal, factura.impuesto, factura.propina_legal, factura.total,
+    ).join(detalle, detalle.factura_id == factura.factura_id)\
+        .outerjoin(Cliente, Cliente.cliente_id == factura.cliente_id)\
+        .where(*condiciones)\
+        .order_by(factura.fecha, factura.factura_id, detalle.detalle_id)
+
+
+def consultas(desde=None, hasta=None):
+    """Una consulta por fuente (archivo y/o tablas vivas), la más vieja primero."""
+    fuentes = archivo_facturas.partes(desde, hasta + timedelta(days=1) if hasta else None,
+                                      archivo_facturas.frontera())
+    return [consulta(factura, detalle, condiciones) for factura, detalle, condiciones in fuentes]
+
+
+def filas(desde=None, hasta=None, lote=FILAS_POR_LOTE):
+    """Genera una tupla por línea (en el orden de COLUMNAS) leyendo de a `lote` filas."""
+    for q in consultas(desde, hasta):
+        yield from _filas(db.session.execute(q.execution_options(stream_results=True, yield_per=lote)))
+
+
+def _filas(resultado):
+    # Las líneas de una factura llegan seguidas: se retienen sólo las de la factura en curso
+    for _, lineas in itertools.groupby(resultado, key=lambda fila: fila[0]):
+        lineas = list(lineas)
+        itbis_resto = propina_resto = None
+        for n, (factura_id, fecha, cliente_id, cliente, detalle_id, plato_id, descripcion, cantidad,
+                precio, subtotal_linea, subtotal, impuesto, propina, total) in enumerate(lineas, 1):
+            if itbis_resto is None:
+                itbis_resto, propina_resto = round(impuesto, 2), round(propina, 2)
+            if n == len(lineas):
+                # Lo que el redondeo por línea no repartió
+                itbis_linea, propina_linea = round(itbis_resto, 2), round(propina_resto, 2)
+            else:
+                parte = subtotal_linea / subtotal if subtotal else 0.0
+                itbis_linea = round(impuesto * parte, 2)
+                propina_linea = round(propina * parte, 2)
+                itbis_resto -= itbis_linea
+                propina_resto -= propina_linea
+            yield (factura_id, fecha.strftime("%Y-%m-%d %H:%M") if fecha else "", cliente_id, cliente or "",
+                   detalle_id, plato_id, descripcion or "", cantidad, round(precio, 2), round(subtotal_linea, 2),
+                   itbis_linea, propina_linea, round(subtotal_linea + itbis_linea + propina_linea, 2),
+                   round(subtotal, 2), round(impuesto, 2), round(propina, 2), round(total, 2))
+
+
+class Medidor:
+    """Cuenta las filas que pasan por el generador y calcula filas por segundo."""
+
+    def __init__(self, filas):
+        self._filas = filas
+        self.total = 0
+        self.inicio = None
+        self.segundos = 0.0
+
+    def __iter__(self):
+        self.inicio = time.perf_counter()
+        for fila in self._filas:
+            self.total += 1
+            yield fila
+        self.segundos = time.perf_counter() - self.inicio
+
+    @property
+    def filas_por_segundo(self):
+        return round(self.total / self.segundos) if self.segundos else 0
+
+
+def csv_en_trozos(filas, filas_por_trozo=FILAS_POR_LOTE):
+    """Bytes CSV (UTF-8 con BOM para que Excel respete los acentos) en trozos."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write("\ufeff")
+    escritor.writerow(COLUMNAS)
+    pendientes = 0
+    for fila in filas:
+        escritor.writerow(fila)
+        pendientes += 1
+        if pendientes >= filas_por_trozo:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _Tubo(io.RawIOBase):
+    """Destino no buscable para zipfile: acumula lo escrito hasta que se lo retire."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def retirar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '{hojas}</Types>'
+)
+_HOJA_CT = ('<Override PartName="/xl/worksheets/sheet{n}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>')
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'officeDocument" Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{hojas}</sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{hojas}</Relationships>'
+)
+_HOJA_INICIO = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_HOJA_FIN = '</sheetData></worksheet>'
+
+
+def _celda(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c><v>{valor}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(str(valor))}</t></is></c>'
+
+
+def _fila_xml(valores):
+    return "<row>" + "".join(_celda(v) for v in valores) + "</row>"
+
+
+def xlsx_en_trozos(filas, filas_por_trozo=FILAS_POR_LOTE, max_filas_hoja=MAX_FILAS_HOJA):
+    """Bytes de un libro XLSX con una o más hojas 'Ventas', emitidos a medida que se escriben."""
+    tubo = _Tubo()
+    libro = zipfile.ZipFile(tubo, "w", compression=zipfile.ZIP_DEFLATED)
+    hojas = 0
+    en_hoja = pendientes = 0
+
+    def abrir_hoja():
+        nonlocal hojas, en_hoja
+        hojas += 1
+        en_hoja = 0
+        destino = libro.open(f"xl/worksheets/sheet{hojas}.xml", "w", force_zip64=True)
+        destino.write((_HOJA_INICIO + _fila_xml(COLUMNAS)).encode("utf-8"))
+        return destino
+
+    hoja = abrir_hoja()
+    for fila in filas:
+        if en_hoja >= max_filas_hoja:
+            hoja.write(_HOJA_FIN.encode("utf-8"))
+            hoja.close()
+            hoja = abrir_hoja()
+        hoja.write(_fila_xml(fila).encode("utf-8"))
+        en_hoja += 1
+        pendientes += 1
+        if pendientes >= filas_por_trozo:
+            pendientes = 0
+            datos = tubo.retirar()
+            if datos:
+                yield datos
+    hoja.write(_HOJA_FIN.encode("utf-8"))
+    hoja.close()
+
+    # Las partes que enumeran las hojas van al final, cuando ya se sabe cuántas hubo
+    numeros = range(1, hojas + 1)
+    libro.writestr("[Content_Types].xml", _CONTENT_TYPES.format(
+        hojas="".join(_HOJA_CT.format(n=n) for n in numeros)))
+    libro.writestr("_rels/.rels", _RELS)
+    libro.writestr("xl/workbook.xml", _WORKBOOK.format(hojas="".join(
+        f'<sheet name="Ventas{"" if n == 1 else f" {n}"}" sheetId="{n}" r:id="rId{n}"/>' for n in numeros)))
+    libro.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS.format(hojas="".join(
+        f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+        f'relationships/worksheet" Target="worksheets/sheet{n}.xml"/>' for n in numeros)))
+    libro.close()
+    yield tubo.retirar()
+
+
+def en_trozos(formato, filas):
+    return xlsx_en_trozos(filas) if formato == 'xlsx' else csv_en_trozos(filas)
+
+
+def nombre_archivo(formato, desde=None, hasta=None):
+    rango = "_".join(f"{d:%Y%m%d}" for d in (desde, hasta) if d) or "completo"
+    return f"ventas_{rango}.{FORMATOS[formato][1]}"
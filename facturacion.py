@@ -0,0 +1,115 @@
+from database import db
+from models import Factura, DetalleFactura, Plato, Reservacion, Mesa
+from datetime import datetime
+import rollup_ventas
+import menu_cache
+import versiones_datos
+
+ITBIS = 0.18
+PROPINA_LEGAL = 0.10
+
+
+def calcular_lineas(p_ids, cants):
+    """
+    Convierte las listas del formulario (platos[], cantidades[]) en líneas de factura.
+    Los platos salen de la caché del menú; los que no estén (p. ej. recién creados
+    en otro proceso) se resuelven con una sola consulta IN.
+    Devuelve (lineas, subtotal); las cantidades no válidas o en cero se descartan.
+    """
+    pedidas = []
+    for i in range(len(p_ids)):
+        raw_cant = cants[i] if cants[i] is not None else 0
+        cantidad = int(raw_cant) if str(raw_cant).isdigit() else 0
+        if cantidad > 0:
+            pedidas.append((int(p_ids[i]), cantidad))
+
+    platos = menu_cache.obtener().por_id
+    faltantes = {pid for pid, _ in pedidas if pid not in platos}
+    if faltantes:
+        platos = dict(platos)
+        platos.update((p.plato_id, p) for p in Plato.query.filter(Plato.plato_id.in_(faltantes)))
+
+    subtotal = 0
+    lineas = []
+    for pid, cantidad in pedidas:
+        plato = platos.get(pid)
+        precio_unitario = plato.precio if (plato and plato.precio is not None) else 0.0
+        monto_linea = precio_unitario * cantidad
+        subtotal += monto_linea
+        lineas.append({
+            'plato_id': plato.plato_id if plato else 0,
+            'cantidad': cantidad,
+            'precio_unitario': precio_unitario,
+            'descripcion': plato.nombre if plato else "Producto Desconocido",
+            'total_linea': monto_linea
+        })
+    return lineas, subtotal
+
+
+def guardar_factura(reservacion_id, cliente_id, lineas, subtotal, es_local, fecha=None, clave=None):
+    """
+    Inserta la factura, sus líneas (un solo INSERT multi-fila) y el resumen diario.
+    No hace commit: la transacción la cierra quien llama.
+    """
+    itbis = float(subtotal) * ITBIS
+    propina = (float(subtotal) * PROPINA_LEGAL) if es_local else 0.0
+
+    f = Factura(
+        reservacion_id=reservacion_id,
+        cliente_id=cliente_id,
+        fecha=fecha or datetime.now(),
+        subtotal=subtotal,
+        impuesto=itbis,
+        propina_legal=propina,
+        total=subtotal + itbis + propina,
+        clave_idempotencia=clave
+    )
+    db.session.add(f)
+    db.session.flush()
+
+    db.session.execute(DetalleFactura.__table__.insert(),
+                       [dict(l, factura_id=f.factura_id) for l in lineas])
+
+    # Resumen diario del dashboard, en la misma transacción que la factura
+    rollup_ventas.registrar_factura(f, lineas)
+    versiones_datos.incrementar('facturas')
+    return f
+
+
+def facturas_por_clave(claves):
+    """{clave: factura_id} de las ventas que ya quedaron registradas (una consulta IN)."""
+    if not claves:
+        return {}
+    return dict(db.session.query(Factura.clave_idempotencia, Factura.factura_id)
+                .filter(Factura.clave_idempotencia.in_(list(claves))))
+
+
+def registrar_venta(venta, clave=None):
+    """
+    Registra una venta ya calculada (ver procesar_venta): crea la reservación de
+    la venta directa si hace falta, la factura con sus líneas y libera la mesa.
+    Se usa igual desde la ruta y desde la cola local. No hace commit.
+    Devuelve el factura_id.
+    """
+    fecha = datetime.fromisoformat(venta['fecha'])
+    reservacion_id = venta.get('reservacion_id')
+    if reservacion_id is None:
+        res = Reservacion(
+            fecha_hora=fecha.replace(second=0, microsecond=0),
+            personas=0,
+            cliente_id=venta['cliente_id'],
+            mesa_id=None
+        )
+        db.session.add(res)
+        db.session.flush()
+        reservacion_id = res.reservacion_id
+
+    f = guardar_factura(reservacion_id, venta['cliente_id'], venta['lineas'], venta['subtotal'],
+                        venta['es_local'], fecha=fecha, clave=clave)
+
+    if venta.get('liberar_mesa_id'):
+        mesa = Mesa.query.get(venta['liberar_mesa_id'])
+        if mesa:
+            mesa.estatus = "Disponible"
+            versiones_datos.incrementar('mesas')
+    return f.factura_id
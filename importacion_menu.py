@@ -0,0 +1,229 @@
+"""
+Importación masiva del menú desde CSV o JSON (alta de platos y cambio de precios).
+
+Columnas (CSV con encabezado, o lista JSON de objetos con las mismas claves):
+    plato_id   opcional; si falta, el plato se busca por nombre (sin distinguir mayúsculas)
+    nombre     obligatorio para platos nuevos
+    precio     obligatorio para platos nuevos
+    categoria  nombre de la categoría (o categoria_id con el id)
+
+En un plato existente las columnas vacías conservan su valor, así que un CSV
+de sólo "nombre,precio" basta para la actualización de temporada.
+
+Todas las filas se validan antes de escribir: si alguna tiene error no se
+aplica ninguna. Las categorías se resuelven en una consulta, los cambios van
+en un UPDATE y un INSERT en modo executemany dentro de una sola transacción, y
+la versión del menú se incrementa una vez. Devuelve un reporte con lo nuevo,
+lo modificado (antes y después) y los errores por línea.
+"""
+import csv
+import io
+import json
+import math
+
+from sqlalchemy import bindparam
+
+from database import db
+from models import Plato, Categoria
+import menu_cache
+
+CAMPOS = ('nombre', 'precio', 'categoria_id')
+LARGO_NOMBRE = Plato.__table__.c.nombre.type.length or 100
+
+
+class ErrorImportacion(ValueError):
+    """El archivo no se puede leer (formato, encabezados o tamaño)."""
+
+
+def leer(contenido, formato, max_filas=2000):
+    """Lista de (línea, dict) desde bytes o texto CSV/JSON."""
+    if isinstance(contenido, bytes):
+        try:
+            contenido = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            contenido = contenido.decode('latin-1')
+    if formato == 'json':
+        try:
+            datos = json.loads(contenido)
+        except ValueError as e:
+            raise ErrorImportacion(f"JSON inválido: {e}")
+        if isinstance(datos, dict):
+            datos = datos.get('platos')
+        if not isinstance(datos, list) or not all(isinstance(d, dict) for d in datos):
+            raise ErrorImportacion("El JSON debe ser una lista de platos o {\"platos\": [...]}")
+        filas = list(enumerate(datos, 1))
+    elif formato == 'csv':
+        muestra = contenido[:4096]
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.DictReader(io.StringIO(contenido), dialect=dialecto)
+        encabezados = {(c or '').strip().lower() for c in (lector.fieldnames or [])}
+        if not encabezados & {'plato_id', 'nombre'}:
+            raise ErrorImportacion("El CSV necesita encabezados; al menos plato_id o nombre")
+        # La línea 1 es el encabezado
+        filas = [(n, {(k or '').strip().lower(): v for k, v in f.items()}) for n, f in enumerate(lector, 2)]
+    else:
+        raise ErrorImportacion(f"Formato no soportado: {formato}")
+    if len(filas) > max_filas:
+        raise ErrorImportacion(f"El archivo tiene {len(filas)} filas; el máximo es {max_filas}")
+    return filas
+
+
+def _texto(valor):
+    return str(valor).strip() if valor is not None else ''
+
+
+def _precio(valor):
+    texto = _texto(valor).replace('$', '').replace(' ', '')
+    if not texto:
+        return None
+    precio = round(float(texto), 2)
+    if not math.isfinite(precio) or precio < 0:
+        raise ValueError
+    return precio
+
+
+def _entero(valor):
+    texto = _texto(valor)
+    return int(texto) if texto else None
+
+
+def planificar(filas):
+    """
+    Valida y compara con el menú actual sin escribir nada.
+    Devuelve el reporte y las listas (nuevos, modificados) listas para aplicar.
+    """
+    # Las categorías son pocas: una consulta resuelve nombres e ids de todo el archivo
+    filas_cat = db.session.query(Categoria.categoria_id, Categoria.nombre).all()
+    categorias = {n.strip().lower(): cid for cid, n in filas_cat}
+    ids_cat = {cid for cid, _ in filas_cat}
+    actuales = {pid: {'plato_id': pid, 'nombre': n, 'precio': round(p or 0, 2), 'categoria_id': c}
+                for pid, n, p, c in db.session.query(Plato.plato_id, Plato.nombre, Plato.precio, Plato.categoria_id)}
+    por_nombre = {}
+    for p in actuales.values():
+        por_nombre.setdefault(p['nombre'].strip().lower(), []).append(p['plato_id'])
+
+    errores, nuevos, modificados, sin_cambios = [], [], [], 0
+    vistos_id, vistos_nombre = {}, {}
+    for linea, f in filas:
+        problemas = []
+        try:
+            plato_id = _entero(f.get('plato_id'))
+        except ValueError:
+            problemas.append(f"plato_id inválido: {f.get('plato_id')}")
+            plato_id = None
+        nombre = _texto(f.get('nombre'))
+        try:
+            precio = _precio(f.get('precio'))
+        except ValueError:
+            problemas.append(f"precio inválido: {f.get('precio')}")
+            precio = None
+        categoria_id = None
+        if _texto(f.get('categoria')):
+            categoria_id = categorias.get(_texto(f.get('categoria')).lower())
+            if categoria_id is None:
+                problemas.append(f"categoría desconocida: {_texto(f.get('categoria'))}")
+        elif _texto(f.get('categoria_id')):
+            try:
+                categoria_id = _entero(f.get('categoria_id'))
+            except ValueError:
+                categoria_id = -1
+            if categoria_id not in ids_cat:
+                problemas.append(f"categoria_id inexistente: {f.get('categoria_id')}")
+                categoria_id = None
+        if len(nombre) > LARGO_NOMBRE:
+            problemas.append(f"nombre de más de {LARGO_NOMBRE} caracteres")
+
+        actual = None
+        if plato_id is not None:
+            actual = actuales.get(plato_id)
+            if actual is None:
+                problemas.append(f"plato_id {plato_id} no existe")
+        elif nombre:
+            coincidencias = por_nombre.get(nombre.lower(), [])
+            if len(coincidencias) > 1:
+                problemas.append(f"hay {len(coincidencias)} platos llamados '{nombre}'; indique plato_id")
+            elif coincidencias:
+                actual = actuales[coincidencias[0]]
+        else:
+            problemas.append("falta plato_id o nombre")
+
+        if actual is None and not problemas:
+            faltan = [c for c, v in (('nombre', nombre), ('precio', precio), ('categoría', categoria_id))
+                      if v in (None, '')]
+            if faltan:
+                problemas.append(f"plato nuevo sin {', '.join(faltan)}")
+
+        clave_nombre = (nombre or (actual or {}).get('nombre', '')).lower()
+        clave_id = actual['plato_id'] if actual else None
+        for clave, vistos in ((clave_id, vistos_id), (clave_nombre if not actual else None, vistos_nombre)):
+            if clave is None:
+                continue
+            if clave in vistos:
+                problemas.append(f"repetido en la línea {vistos[clave]}")
+            vistos.setdefault(clave, linea)
+
+        if problemas:
+            errores.append({'linea': linea, 'errores': problemas})
+            continue
+        if actual is None:
+            nuevos.append({'linea': linea, 'nombre': nombre, 'precio': precio, 'categoria_id': categoria_id})
+            continue
+        # Emparejado por nombre (sin distinguir mayúsculas): el nombre del archivo sólo
+        # identifica el plato, no lo renombra. Con plato_id sí es un cambio de nombre
+        despues = {'nombre': (nombre or actual['nombre']) if plato_id is not None else actual['nombre'],
+                   'precio': precio if precio is not None else actual['precio'],
+                   'categoria_id': categoria_id or actual['categoria_id']}
+        cambios = {c: {'antes': actual[c], 'despues': despues[c]} for c in CAMPOS if despues[c] != actual[c]}
+        if cambios:
+            modificados.append({'linea': linea, 'plato_id': actual['plato_id'], 'cambios': cambios, **despues})
+        else:
+            sin_cambios += 1
+
+    reporte = {
+        'filas': len(filas),
+        'nuevos': [{k: n[k] for k in ('linea', 'nombre', 'precio', 'categoria_id')} for n in nuevos],
+        'modificados': [{k: m[k] for k in ('linea', 'plato_id', 'cambios')} for m in modificados],
+        'sin_cambios': sin_cambios,
+        'errores': errores,
+    }
+    return reporte, nuevos, modificados
+
+
+def aplicar(nuevos, modificados):
+    """Escribe el plan con un UPDATE y un INSERT (executemany). No hace commit."""
+    tabla = Plato.__table__
+    if modificados:
+        db.session.execute(
+            tabla.update().where(tabla.c.plato_id == bindparam('b_plato_id')).values(
+                nombre=bindparam('b_nombre'), precio=bindparam('b_precio'),
+                categoria_id=bindparam('b_categoria_id')),
+            [{'b_plato_id': m['plato_id'], 'b_nombre': m['nombre'], 'b_precio': m['precio'],
+              'b_categoria_id': m['categoria_id']} for m in modificados])
+    if nuevos:
+        db.session.execute(tabla.insert(), [{'nombre': n['nombre'], 'precio': n['precio'],
+                                             'categoria_id': n['categoria_id']} for n in nuevos])
+    if nuevos or modificados:
+        menu_cache.invalidar()
+
+
+def importar(contenido, formato, simular=False, max_filas=2000):
+    """
+    Lee, valida y (si no hay errores ni es simulación) aplica el archivo.
+    Devuelve el reporte con 'aplicado'. No hace commit.
+    """
+    reporte, nuevos, modificados = planificar(leer(contenido, formato, max_filas))
+    reporte['aplicado'] = not simular and not reporte['errores']
+    if reporte['aplicado']:
+        aplicar(nuevos, modificados)
+    return reporte
+
+
+def formato_de(nombre_archivo, tipo=None):
+    """'csv' o 'json' según la extensión o el Content-Type."""
+    nombre = (nombre_archivo or '').lower()
+    if nombre.endswith('.json') or (tipo or '').startswith('application/json'):
+        return 'json'
+    return 'csv'
@@ -1,8 +1,7 @@
-from flask import Blueprint, render_template, request, redirect, url_for
-from database import db
-from models import Factura, DetalleFactura
-from datetime import date, timedelta, datetime
-from sqlalchemy import func, desc, cast, Date
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, current_app
+from metricas_dashboard import obtener_metricas, rango_mes
+import analitica_ventas
+from datetime import date, datetime
 
 home_bp = Blueprint('home', __name__)
 
@@ -10,10 +9,33 @@ home_bp = Blueprint('home', __name__)
 def index():
     return render_template("home.html")
 
+NOMBRES_MESES = [
+    (1, "Enero"), (2, "Febrero"), (3, "Marzo"), (4, "Abril"),
+    (5, "Mayo"), (6, "Junio"), (7, "Julio"), (8, "Agosto"),
+    (9, "Septiembre"), (10, "Octubre"), (11, "Noviembre"), (12, "Diciembre")
+]
+
+def contexto_dashboard(mes_seleccionado, metricas, analitica):
+    """Variables de dashboard.html; las comparte el modo asíncrono (servidor_async)."""
+    return dict(labels=metricas['labels'],
+                data=metricas['data'],
+                total_mes=metricas['total_mes'],
+                total_hoy=metricas['total_hoy'],
+                top_platos=metricas['top_platos'],
+                proyeccion=analitica['proyeccion']['total'],
+                analitica=analitica,
+                datetime_ahora=datetime.now().strftime("%d/%m/%Y %H:%M"),
+                # Mes mostrado y opciones del selector
+                mes_actual=mes_seleccionado,
+                nombres_meses=NOMBRES_MESES)
+
 # 1. Actualizamos la ruta para aceptar un parámetro opcional <mes>
 @home_bp.route("/dashboard")
 @home_bp.route("/dashboard/<int:mes>")
 def dashboard(mes=None):
+    # Un mes fuera de rango no es un error del servidor: se muestra el mes actual
+    if mes and not 1 <= mes <= 12:
+        return redirect(url_for('home.dashboard'))
     try:
         hoy = date.today()
         anio_actual = hoy.year
@@ -25,73 +47,36 @@ def dashboard(mes=None):
             mes_seleccionado = hoy.month
 
         # 3. Calculamos el rango de fechas para el filtro SQL
-        # Fecha inicio: día 1 del mes seleccionado
-        fecha_inicio = date(anio_actual, mes_seleccionado, 1)
-        
-        # Fecha fin: día 1 del mes siguiente (para usar < fecha_fin)
-        if mes_seleccionado == 12:
-            fecha_fin = date(anio_actual + 1, 1, 1)
-        else:
-            fecha_fin = date(anio_actual, mes_seleccionado + 1, 1)
+        # [día 1 del mes, día 1 del mes siguiente) para usar fecha >= inicio AND fecha < fin
+        fecha_inicio, fecha_fin = rango_mes(anio_actual, mes_seleccionado)
 
         # --- CONSULTAS ---
+        # Total hoy, total del mes, tendencia de 7 días y top 5 platos
+        # en dos consultas agrupadas por rango de fechas (ver metricas_dashboard)
+        metricas = obtener_metricas(hoy, fecha_inicio, fecha_fin)
 
-        # A. Total Hoy (Se mantiene fijo para monitoreo en tiempo real)
-        total_hoy = db.session.query(func.sum(Factura.total)).filter(
-            cast(Factura.fecha, Date) == hoy
-        ).scalar() or 0
-        
-        # B. Total del Mes SELECCIONADO (Filtrado por rango de fechas)
-        total_mes = db.session.query(func.sum(Factura.total)).filter(
-            Factura.fecha >= fecha_inicio,
-            Factura.fecha < fecha_fin
-        ).scalar() or 0
-        
-        # C. Gráfica de Tendencia (Mantenemos últimos 7 días reales)
-        labels, data_grafica = [], []
-        for i in range(6, -1, -1):
-            dia_busqueda = hoy - timedelta(days=i)
-            labels.append(dia_busqueda.strftime("%a")) 
-            venta_dia = db.session.query(func.sum(Factura.total)).filter(
-                cast(Factura.fecha, Date) == dia_busqueda
-            ).scalar() or 0
-            data_grafica.append(float(venta_dia))
-
-        # D. Top 5 Platos (¡Ahora filtrados por el mes seleccionado!)
-        # Nota: Hacemos join con Factura para poder filtrar por fecha
-        top_platos = db.session.query(
-            DetalleFactura.descripcion, 
-            func.sum(DetalleFactura.cantidad).label('total_vendido')
-        ).join(Factura).filter(
-            Factura.fecha >= fecha_inicio,
-            Factura.fecha < fecha_fin
-        ).group_by(DetalleFactura.descripcion)\
-         .order_by(desc('total_vendido'))\
-         .limit(5).all()
-
-        # E. Proyección (Simulada para el mes visualizado)
-        proyeccion = float(total_mes) * 1.15
+        # E. Proyección de cierre, ABC de platos, horas y rotación de mesas
+        # (memorizado por mes y versión de facturas, ver analitica_ventas)
+        analitica = analitica_ventas.analizar_mes(anio_actual, mes_seleccionado, hoy)
 
-        # --- DATOS PARA EL SELECTOR HTML ---
-        nombres_meses = [
-            (1, "Enero"), (2, "Febrero"), (3, "Marzo"), (4, "Abril"),
-            (5, "Mayo"), (6, "Junio"), (7, "Julio"), (8, "Agosto"),
-            (9, "Septiembre"), (10, "Octubre"), (11, "Noviembre"), (12, "Diciembre")
-        ]
-
-        return render_template("dashboard.html", 
-                               labels=labels, 
-                               data=data_grafica, 
-                               total_mes=total_mes, 
-                               total_hoy=total_hoy, 
-                               top_platos=top_platos, 
-                               proyeccion=proyeccion,
-                               datetime_ahora=datetime.now().strftime("%d/%m/%Y %H:%M"),
-                               # Nuevas variables enviadas a la vista
-                               mes_actual=mes_seleccionado,
-                               nombres_meses=nombres_meses)
+        return render_template("dashboard.html", **contexto_dashboard(mes_seleccionado, metricas, analitica))
     
-    except Exception as e:
-        print(f"DEBUG ERROR en Dashboard: {e}")
-        # En caso de error, volvemos al dashboard sin filtro
-        return redirect(url_for('home.dashboard'))
+    except Exception:
+        current_app.logger.exception("Error al armar el dashboard (mes %s)", mes)
+        # Página vacía con el aviso; redirigir a /dashboard repetiría el mismo error en bucle
+        vacias = {'labels': [], 'data': [], 'total_mes': 0, 'total_hoy': 0, 'top_platos': []}
+        contexto = contexto_dashboard(mes or date.today().month, vacias,
+                                      {'proyeccion': {'total': 0}, 'abc_platos': [],
+                                       'mapa_horas': None, 'rotacion_mesas': []})
+        return render_template("dashboard.html", error="No se pudo cargar el dashboard. Intente de nuevo.",
+                               **contexto), 500
+
+@home_bp.route("/dashboard/analitica")
+def analitica():
+    """JSON con la proyección, ABC de platos, mapa de horas y rotación de mesas del mes (?mes=&anio=)."""
+    hoy = date.today()
+    mes = request.args.get('mes', hoy.month, type=int)
+    anio = request.args.get('anio', hoy.year, type=int)
+    if not 1 <= mes <= 12:
+        return jsonify({'error': "mes inválido"}), 400
+    return jsonify(analitica_ventas.analizar_mes(anio, mes, hoy))
@@ -0,0 +1,111 @@
+"""
+Caché en proceso del menú (platos y categorías).
+
+El menú cambia pocas veces al día, pero /menu, /facturar_directo y
+/facturar/<res_id> lo leían completo en cada GET. Aquí se guarda una copia
+inmutable por proceso que se invalida:
+  - al hacer commit de un cambio en este proceso (versiones_datos.al_cambiar),
+  - cuando la versión 'menu' en la base cambia (otro proceso lo modificó),
+    comprobado como máximo cada MENU_CACHE_VERIFICACION_SEG segundos,
+  - y siempre tras MENU_CACHE_TTL_SEG segundos, por si algo se escapó.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from flask import current_app
+
+from database import db
+from models import Plato, Categoria
+import versiones_datos
+
+VERSION = 'menu'
+
+CategoriaMenu = namedtuple('CategoriaMenu', 'categoria_id nombre')
+PlatoMenu = namedtuple('PlatoMenu', 'plato_id nombre precio categoria_id categoria')
+Menu = namedtuple('Menu', 'platos por_id categorias version')
+
+
+class MenuCache:
+
+    def __init__(self):
+        self._menu = None
+        self._cargado_en = 0.0
+        self._verificado_en = 0.0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+        versiones_datos.al_cambiar(VERSION, self.descartar)
+
+    def obtener(self):
+        ahora = time.monotonic()
+        menu = self._menu
+        if menu is not None and self._vigente(menu, ahora):
+            self.aciertos += 1
+            return menu
+
+        with self._lock:
+            # Otro hilo pudo haber recargado mientras esperábamos el lock
+            if self._menu is not None and self._menu is not menu and self._vigente(self._menu, ahora):
+                self.aciertos += 1
+                return self._menu
+            self.fallos += 1
+            self._menu = self._cargar()
+            self._cargado_en = self._verificado_en = time.monotonic()
+            return self._menu
+
+    def _vigente(self, menu, ahora):
+        config = current_app.config
+        if ahora - self._cargado_en > config.get('MENU_CACHE_TTL_SEG', 300):
+            return False
+        if ahora - self._verificado_en < config.get('MENU_CACHE_VERIFICACION_SEG', 5):
+            return True
+        # Consulta barata por clave primaria para detectar cambios de otros procesos
+        if versiones_datos.leer(VERSION)[VERSION] != menu.version:
+            return False
+        self._verificado_en = ahora
+        return True
+
+    def _cargar(self):
+        self.recargas += 1
+        version = versiones_datos.leer(VERSION)[VERSION]
+        categorias = [CategoriaMenu(c.categoria_id, c.nombre)
+                      for c in Categoria.query.order_by(Categoria.categoria_id)]
+        por_categoria = {c.categoria_id: c for c in categorias}
+        filas = db.session.query(Plato.plato_id, Plato.nombre, Plato.precio, Plato.categoria_id)\
+            .order_by(Plato.plato_id).all()
+        platos = [PlatoMenu(pid, nombre, precio, cid, por_categoria.get(cid))
+                  for pid, nombre, precio, cid in filas]
+        return Menu(platos, {p.plato_id: p for p in platos}, categorias, version)
+
+    def descartar(self):
+        """Olvida la copia local; la próxima lectura recarga desde la base."""
+        self._menu = None
+
+    def invalidar(self):
+        """Marca el menú como modificado. Llamar antes del commit del cambio."""
+        versiones_datos.incrementar(VERSION)
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'recargas': self.recargas,
+            'tasa_aciertos': round(self.aciertos / total, 4) if total else None,
+            'version': self._menu.version if self._menu else None,
+            'platos': len(self._menu.platos) if self._menu else 0,
+            'edad_seg': round(time.monotonic() - self._cargado_en, 1) if self._menu else None,
+        }
+
+
+cache = MenuCache()
+
+
+def obtener():
+    return cache.obtener()
+
+
+def invalidar():
+    cache.invalidar()
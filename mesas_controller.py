@@ -1,11 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from database import db
 from models import Mesa, Reservacion, Cliente
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from sqlalchemy.orm import joinedload
+import disponibilidad
+import versiones_datos
+from cache_paginas import cache_pagina
 
 mesas_bp = Blueprint('reservacion', __name__)
 
 @mesas_bp.route("/mesas", methods=["GET", "POST"])
+@cache_pagina('mesas')
 def mesas():
     if request.method == "POST":
         nueva = Mesa(
@@ -14,6 +19,7 @@ def mesas():
             estatus="Disponible"
         )
         db.session.add(nueva)
+        versiones_datos.incrementar('mesas')
         db.session.commit()
         flash("Mesa registrada con éxito", "success")
         return redirect(url_for('reservacion.mesas'))
@@ -25,6 +31,7 @@ def editar_mesa(id):
     mesa.nombre = request.form['nombre']
     mesa.capacidad = int(request.form['capacidad'])
     mesa.estatus = request.form['estatus']
+    versiones_datos.incrementar('mesas')
     db.session.commit()
     flash(f"Mesa {mesa.nombre} actualizada", "info")
     return redirect(url_for('reservacion.mesas'))
@@ -33,6 +40,7 @@ def editar_mesa(id):
 def eliminar_mesa(id):
     mesa = Mesa.query.get_or_404(id)
     db.session.delete(mesa)
+    versiones_datos.incrementar('mesas')
     db.session.commit()
     flash("Mesa eliminada correctamente", "warning")
     return redirect(url_for('reservacion.mesas'))
@@ -41,15 +49,57 @@ def eliminar_mesa(id):
 def liberar_mesa(id):
     mesa = Mesa.query.get_or_404(id)
     mesa.estatus = "Disponible"
+    versiones_datos.incrementar('mesas')
     db.session.commit()
     flash(f"La mesa {mesa.nombre} ahora está disponible", "success")
     return redirect(url_for('reservacion.mesas'))
 
+def rango_reservaciones(vista, dia):
+    """
+    (vista, desde, hasta) de la vista pedida: hoy, próximas o un día.
+    Devuelve None si la vista es 'dia' y el día no es válido.
+    """
+    hoy = datetime.combine(date.today(), datetime.min.time())
+    if vista == 'dia':
+        try:
+            desde = datetime.strptime(dia, "%Y-%m-%d")
+        except ValueError:
+            return None
+        return vista, desde, desde + timedelta(days=1)
+    if vista == 'proximas':
+        desde = datetime.now().replace(second=0, microsecond=0)
+        return vista, desde, desde + timedelta(days=current_app.config.get('RESERVACIONES_DIAS_PROXIMAS', 30))
+    return 'hoy', hoy, hoy + timedelta(days=1)
+
+ORDEN_RESERVACIONES = (Reservacion.fecha_hora, Reservacion.fecha, Reservacion.reservacion_id)
+
 @mesas_bp.route("/reservaciones")
 def reservaciones(): 
-    # Traemos las reservaciones ordenadas por fecha y hora
-    todas = Reservacion.query.order_by(Reservacion.fecha.desc()).all()
-    return render_template("reservaciones/list.html", reservaciones=todas)
+    # Vistas acotadas por fecha (hoy, próximas, un día) en lugar de todo el historial
+    dia = request.args.get('dia', '')
+    rango = rango_reservaciones(request.args.get('vista', 'hoy'), dia)
+    if rango is None:
+        flash("Seleccione un día válido", "warning")
+        return redirect(url_for('reservacion.reservaciones'))
+    vista, desde, hasta = rango
+
+    pagina = Reservacion.query.options(
+        joinedload(Reservacion.cliente),
+        joinedload(Reservacion.mesa)
+    ).filter(disponibilidad.en_rango(desde, hasta))\
+     .order_by(*ORDEN_RESERVACIONES)\
+     .paginate(page=request.args.get('pagina', 1, type=int),
+               per_page=current_app.config.get('RESERVACIONES_POR_PAGINA', 50),
+               error_out=False)
+
+    return render_template("reservaciones/list.html", **contexto_reservaciones(pagina, vista, desde, dia))
+
+def contexto_reservaciones(pagina, vista, desde, dia):
+    """Variables de reservaciones/list.html; las comparte el modo asíncrono (servidor_async)."""
+    return dict(reservaciones=pagina.items,
+                pagina=pagina,
+                vista=vista,
+                dia=desde.strftime("%Y-%m-%d") if vista == 'dia' else dia)
 
 @mesas_bp.route("/reservaciones/nueva", methods=["GET", "POST"])
 def nueva_reservacion():
@@ -57,23 +107,23 @@ def nueva_reservacion():
         try:
             # Capturamos la fecha/hora y la mesa
             fecha_hora = request.form.get('fecha') # Formato: YYYY-MM-DDTHH:MM
-            mesa_id = int(request.form['mesa_id'])
-            mesa = Mesa.query.get_or_404(mesa_id)
-            
-            # Creamos la reserva
-            res = Reservacion(
-                fecha=fecha_hora.replace('T', ' '), # Limpiamos el formato para SQL Server
-                personas=int(request.form['personas']), 
-                cliente_id=int(request.form['cliente_id']), 
-                mesa_id=mesa.mesa_id
+            inicio = disponibilidad.leer_fecha(fecha_hora)
+
+            # Comprueba choques de horario y confirma de forma atómica (ver disponibilidad.py)
+            disponibilidad.reservar(
+                mesa_id=int(request.form['mesa_id']),
+                cliente_id=int(request.form['cliente_id']),
+                personas=int(request.form['personas']),
+                inicio=inicio
             )
-            mesa.estatus = "Ocupada" 
-            
-            db.session.add(res)
             db.session.commit()
-            flash(f"Reservación confirmada para las {fecha_hora.split('T')[1]}", "success")
+            flash(f"Reservación confirmada para las {inicio.strftime('%H:%M')}", "success")
             return redirect(url_for('reservacion.reservaciones'))
-            
+
+        except disponibilidad.ConflictoReserva as e:
+            db.session.rollback()
+            flash(str(e), "warning")
+            return redirect(url_for('reservacion.nueva_reservacion'))
         except Exception as e:
             db.session.rollback()
             flash(f"Error al procesar la reserva: {e}", "danger")
@@ -84,7 +134,7 @@ def nueva_reservacion():
     
     return render_template("reservaciones/form.html", 
                            clientes=Cliente.query.all(), 
-                           mesas=Mesa.query.filter_by(estatus='Disponible').all(),
+                           mesas=Mesa.query.order_by(Mesa.nombre).all(),
                            mesa_id_previa=mesa_id_get)
 
 @mesas_bp.route("/reservaciones/eliminar/<int:id>", methods=["POST"])
@@ -93,7 +143,23 @@ def eliminar_reserva(id):
     # Liberación de la mesa asociada
     if res.mesa:
         res.mesa.estatus = "Disponible"
+        versiones_datos.incrementar('mesas')
     db.session.delete(res)
+    versiones_datos.incrementar(disponibilidad.VERSION)
     db.session.commit()
     flash("Reservación cancelada y mesa liberada", "warning")
-    return redirect(url_for('reservacion.reservaciones'))
\ No newline at end of file
+    return redirect(url_for('reservacion.reservaciones'))
+
+@mesas_bp.route("/reservaciones/disponibles")
+def mesas_disponibles():
+    """JSON con las mesas libres para ?fecha=YYYY-MM-DDTHH:MM y ?personas=N."""
+    try:
+        momento = disponibilidad.leer_fecha(request.args.get('fecha', ''))
+    except ValueError:
+        return jsonify({'error': 'Fecha inválida, use YYYY-MM-DDTHH:MM'}), 400
+    personas = max(request.args.get('personas', 1, type=int), 1)
+    libres = disponibilidad.mesas_libres(momento, personas)
+    return jsonify([
+        {'mesa_id': m.mesa_id, 'nombre': m.nombre, 'capacidad': m.capacidad}
+        for m in libres
+    ])
@@ -0,0 +1,76 @@
+from database import db, como_fecha
+from models import VentaDiaria, VentaDiariaPlato
+from datetime import date, timedelta
+from sqlalchemy import func, desc, and_, or_, select
+
+DIAS_TENDENCIA = 7
+
+
+def rango_mes(anio, mes):
+    """Devuelve (inicio, fin) del mes para filtrar con fecha >= inicio AND fecha < fin."""
+    inicio = date(anio, mes, 1)
+    fin = date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1)
+    return inicio, fin
+
+
+def consulta_ventas_por_dia(rangos):
+    condiciones = [and_(VentaDiaria.fecha >= ini, VentaDiaria.fecha < fin) for ini, fin in rangos]
+    return select(VentaDiaria.fecha, VentaDiaria.total).where(or_(*condiciones))
+
+
+def ventas_por_dia(rangos):
+    """
+    Totales diarios para uno o varios rangos [inicio, fin) en una sola consulta.
+    Lee el resumen ventas_diarias (una fila por día), así el costo depende de los
+    días mostrados y no de la cantidad de facturas.
+    """
+    return totales_por_dia(db.session.execute(consulta_ventas_por_dia(rangos)).all())
+
+
+def totales_por_dia(filas):
+    return {como_fecha(d): float(t or 0) for d, t in filas}
+
+
+def consulta_top_platos(inicio, fin, limite=5):
+    return select(
+        VentaDiariaPlato.descripcion,
+        func.sum(VentaDiariaPlato.cantidad).label('total_vendido')
+    ).where(
+        VentaDiariaPlato.fecha >= inicio,
+        VentaDiariaPlato.fecha < fin
+    ).group_by(VentaDiariaPlato.descripcion)\
+     .order_by(desc('total_vendido'))\
+     .limit(limite)
+
+
+def top_platos(inicio, fin, limite=5):
+    return db.session.execute(consulta_top_platos(inicio, fin, limite)).all()
+
+
+def rangos_tendencia(hoy, fecha_inicio, fecha_fin):
+    """Rangos que lee obtener_metricas: los últimos DIAS_TENDENCIA días y el mes."""
+    return [(hoy - timedelta(days=DIAS_TENDENCIA - 1), hoy + timedelta(days=1)), (fecha_inicio, fecha_fin)]
+
+
+def obtener_metricas(hoy, fecha_inicio, fecha_fin):
+    """
+    Métricas del dashboard en dos consultas sobre el resumen diario:
+      1. Totales diarios (últimos 7 días + mes seleccionado).
+      2. Top 5 platos del mes.
+    """
+    por_dia = ventas_por_dia(rangos_tendencia(hoy, fecha_inicio, fecha_fin))
+    return armar_metricas(hoy, fecha_inicio, fecha_fin, por_dia, top_platos(fecha_inicio, fecha_fin))
+
+
+def armar_metricas(hoy, fecha_inicio, fecha_fin, por_dia, top):
+    """Arma el diccionario del dashboard con los resultados de las dos consultas."""
+    dias = [hoy - timedelta(days=DIAS_TENDENCIA - 1 - i) for i in range(DIAS_TENDENCIA)]
+    total_mes = sum(t for d, t in por_dia.items() if fecha_inicio <= d < fecha_fin)
+
+    return {
+        'total_hoy': por_dia.get(hoy, 0),
+        'total_mes': total_mes,
+        'labels': [d.strftime("%a") for d in dias],
+        'data': [por_dia.get(d, 0.0) for d in dias],
+        'top_platos': top,
+    }
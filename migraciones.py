@@ -0,0 +1,187 @@
+"""
+Migraciones de esquema idempotentes (el proyecto no usa Alembic).
+
+    flask migraciones aplicar
+
+Cada paso revisa el esquema real con el inspector de SQLAlchemy y sólo crea
+lo que falta, así que se puede correr tantas veces como haga falta.
+Las tablas nuevas completas las crea db.create_all(); aquí se agregan las
+columnas e índices nuevos sobre tablas que ya existían.
+"""
+import csv
+
+import click
+from flask import Blueprint
+from sqlalchemy import bindparam, inspect, text
+
+from database import db
+import models
+
+migraciones_bp = Blueprint('migraciones', __name__)
+
+
+def _q(nombre):
+    return db.engine.dialect.identifier_preparer.quote(nombre)
+
+
+def agregar_columna(modelo, columna):
+    """ALTER TABLE ... ADD <columna> con el tipo declarado en el modelo (siempre NULL)."""
+    tabla = modelo.__table__
+    existentes = {c['name'] for c in inspect(db.engine).get_columns(tabla.name)}
+    if columna in existentes:
+        return False
+    tipo = tabla.c[columna].type.compile(dialect=db.engine.dialect)
+    with db.engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {_q(tabla.name)} ADD {_q(columna)} {tipo} NULL"))
+    return True
+
+
+def crear_indices(modelo):
+    """Crea los índices declarados en el modelo que aún no existan en la base."""
+    tabla = modelo.__table__
+    existentes = {i['name'] for i in inspect(db.engine).get_indexes(tabla.name)}
+    creados = []
+    for indice in sorted(tabla.indexes, key=lambda i: i.name):
+        if indice.name not in existentes:
+            indice.create(db.engine)
+            creados.append(indice.name)
+    return creados
+
+
+def paso_busqueda_clientes():
+    """Columnas normalizadas de clientes para busqueda_clientes."""
+    for columna in ('nombre_norm', 'telefono_digitos', 'email_norm'):
+        if agregar_columna(models.Cliente, columna):
+            click.echo(f"  clientes.{columna} agregada")
+    for nombre in crear_indices(models.Cliente):
+        click.echo(f"  índice {nombre} creado")
+
+
+def eliminar_indice(tabla, nombre):
+    if nombre not in {i['name'] for i in inspect(db.engine).get_indexes(tabla)}:
+        return False
+    sentencia = f"DROP INDEX {_q(nombre)} ON {_q(tabla)}" if db.engine.dialect.name == 'mssql' \
+        else f"DROP INDEX {_q(nombre)}"
+    with db.engine.begin() as conn:
+        conn.execute(text(sentencia))
+    return True
+
+
+def paso_version_mesas():
+    """Versión de mesas para reservas sin choques."""
+    if agregar_columna(models.Mesa, 'version'):
+        with db.engine.begin() as conn:
+            conn.execute(text("UPDATE mesas SET version = 0 WHERE version IS NULL"))
+        click.echo("  mesas.version agregada")
+
+
+def paso_fecha_hora_reservaciones():
+    """Columna DateTime indexada reservaciones.fecha_hora (rellenar con backfill-reservaciones)."""
+    if agregar_columna(models.Reservacion, 'fecha_hora'):
+        click.echo("  reservaciones.fecha_hora agregada")
+    # El índice sobre el texto quedó reemplazado por (mesa_id, fecha_hora)
+    if eliminar_indice('reservaciones', 'ix_reservaciones_mesa_fecha'):
+        click.echo("  índice ix_reservaciones_mesa_fecha eliminado")
+    for nombre in crear_indices(models.Reservacion):
+        click.echo(f"  índice {nombre} creado")
+
+
+def paso_indices_consultas():
+    """Índices para los filtros frecuentes de facturas, detalles, pedidos, reservaciones y mesas."""
+    for modelo in (models.Factura, models.DetalleFactura, models.Pedido, models.DetallePedido,
+                   models.Reservacion, models.Mesa, models.Plato):
+        for nombre in crear_indices(modelo):
+            click.echo(f"  índice {nombre} creado")
+
+
+def paso_totales_pedidos():
+    """Total persistido en pedidos y precio congelado en detalle_pedido."""
+    nuevas = agregar_columna(models.Pedido, 'total')
+    nuevas = agregar_columna(models.DetallePedido, 'precio_unitario') or nuevas
+    if nuevas:
+        import totales_pedidos
+        filas = totales_pedidos.recalcular()
+        db.session.commit()
+        click.echo(f"  pedidos.total y detalle_pedido.precio_unitario agregados ({filas} pedidos recalculados)")
+
+
+def paso_clave_facturas():
+    """Clave de idempotencia de facturas para la cola local de ventas."""
+    if agregar_columna(models.Factura, 'clave_idempotencia'):
+        click.echo("  facturas.clave_idempotencia agregada")
+    for nombre in crear_indices(models.Factura):
+        click.echo(f"  índice {nombre} creado")
+
+
+PASOS = [
+    paso_busqueda_clientes,
+    paso_version_mesas,
+    paso_fecha_hora_reservaciones,
+    paso_indices_consultas,
+    paso_totales_pedidos,
+    paso_clave_facturas,
+]
+
+
+@migraciones_bp.cli.command("aplicar")
+def aplicar():
+    """Crea tablas nuevas y aplica los pasos pendientes."""
+    db.create_all()
+    for paso in PASOS:
+        click.echo(f"{paso.__name__}: {paso.__doc__.strip()}")
+        paso()
+    click.echo("Esquema al día.")
+
+
+def backfill_fecha_reservaciones(tamano_lote=5000, progreso=None):
+    """
+    Rellena reservaciones.fecha_hora a partir del texto de `fecha`, por lotes de id.
+    Devuelve (filas_migradas, filas_invalidas) donde filas_invalidas es una lista de
+    (reservacion_id, texto) que no se pudieron interpretar y quedan en NULL.
+    """
+    R = models.Reservacion
+    tabla = R.__table__
+    sentencia = tabla.update().where(tabla.c.reservacion_id == bindparam('b_id'))\
+        .values(fecha_hora=bindparam('b_fecha'))
+    ultimo_id, migradas, invalidas = 0, 0, []
+    while True:
+        lote = db.session.query(R.reservacion_id, R.fecha)\
+            .filter(R.fecha_hora.is_(None), R.reservacion_id > ultimo_id)\
+            .order_by(R.reservacion_id).limit(tamano_lote).all()
+        if not lote:
+            return migradas, invalidas
+        cambios = []
+        for rid, texto in lote:
+            valor = models.parsear_fecha_reserva(texto)
+            if valor is None:
+                invalidas.append((rid, texto))
+            else:
+                cambios.append({'b_id': rid, 'b_fecha': valor})
+        if cambios:
+            db.session.execute(sentencia, cambios)
+        db.session.commit()
+        migradas += len(cambios)
+        ultimo_id = lote[-1][0]
+        if progreso:
+            progreso(migradas, len(invalidas))
+
+
+@migraciones_bp.cli.command("backfill-reservaciones")
+@click.option("--lote", type=int, default=5000, show_default=True)
+@click.option("--reporte", type=click.Path(dir_okay=False), default=None,
+              help="CSV donde guardar las filas cuya fecha no se pudo interpretar")
+def backfill_reservaciones(lote, reporte):
+    """Convierte reservaciones.fecha (texto) a reservaciones.fecha_hora (DateTime)."""
+    migradas, invalidas = backfill_fecha_reservaciones(
+        lote, progreso=lambda m, i: click.echo(f"  {m} migradas, {i} inválidas"))
+    click.echo(f"Backfill terminado: {migradas} filas migradas, {len(invalidas)} inválidas")
+    for rid, texto in invalidas[:20]:
+        click.echo(f"  reservacion_id={rid}: {texto!r}")
+    if reporte and invalidas:
+        with open(reporte, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["reservacion_id", "fecha"])
+            escritor.writerows(invalidas)
+        click.echo(f"Filas inválidas guardadas en {reporte}")
+    if not invalidas:
+        click.echo("Ya se puede desactivar RESERVACIONES_COMPAT_FECHA_TEXTO.")
@@ -1,5 +1,8 @@
 from database import db
 from datetime import datetime
+from itertools import chain
+from sqlalchemy import event, func, inspect, select, text
+from sqlalchemy.orm import Session
 
 class Cliente(db.Model):
     __tablename__ = "clientes"
@@ -7,15 +10,31 @@ class Cliente(db.Model):
     nombre = db.Column(db.String(120), nullable=False)
     telefono = db.Column(db.String(50))
     email = db.Column(db.String(120))
+    # Columnas normalizadas para la búsqueda (mantenidas por busqueda_clientes.indexar)
+    nombre_norm = db.Column(db.String(120), index=True)
+    telefono_digitos = db.Column(db.String(50), index=True)
+    email_norm = db.Column(db.String(120), index=True)
     reservas = db.relationship("Reservacion", backref="cliente", lazy=True)
     facturas = db.relationship("Factura", backref="cliente", lazy=True)
 
+class ClienteToken(db.Model):
+    """Palabras normalizadas del nombre de cada cliente, para búsqueda por prefijo."""
+    __tablename__ = "cliente_tokens"
+    token = db.Column(db.String(60), primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey("clientes.cliente_id"), primary_key=True, index=True)
+
 class Mesa(db.Model):
     __tablename__ = "mesas"
+    __table_args__ = (
+        db.Index("ix_mesas_estatus", "estatus"),
+    )
     mesa_id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(50), nullable=False)
     capacidad = db.Column(db.Integer, nullable=False)
     estatus = db.Column(db.String(20), default="Disponible")
+    # Se incrementa con cada reserva: dos reservas simultáneas de la misma mesa no
+    # pueden confirmar ambas (ver disponibilidad.reservar)
+    version = db.Column(db.Integer, default=0, nullable=False)
     reservas = db.relationship("Reservacion", backref="mesa", lazy=True)
     pedidos = db.relationship("Pedido", backref="mesa", lazy=True)
 
@@ -27,6 +46,9 @@ class Categoria(db.Model):
 
 class Plato(db.Model):
     __tablename__ = "Menu"  
+    __table_args__ = (
+        db.Index("ix_menu_categoria", "categoria_id"),
+    )
     plato_id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     precio = db.Column(db.Float, nullable=False, default=0.0)
@@ -34,47 +56,178 @@ class Plato(db.Model):
 
 class Reservacion(db.Model):
     __tablename__ = "reservaciones"
+    __table_args__ = (
+        db.Index("ix_reservaciones_mesa_fecha_hora", "mesa_id", "fecha_hora"),
+        db.Index("ix_reservaciones_cliente", "cliente_id"),
+    )
     reservacion_id = db.Column(db.Integer, primary_key=True)
+    # Columna de texto original ('%Y-%m-%d %H:%M'). Se mantiene durante la migración
+    # a fecha_hora; ambas se sincronizan en _sincronizar_fecha_reserva.
     fecha = db.Column(db.String(20), nullable=False) 
+    fecha_hora = db.Column(db.DateTime, nullable=True, index=True)
     personas = db.Column(db.Integer, nullable=False, default=1)
     cliente_id = db.Column(db.Integer, db.ForeignKey("clientes.cliente_id"), nullable=False)
     mesa_id = db.Column(db.Integer, db.ForeignKey("mesas.mesa_id"), nullable=True)
 
+    @property
+    def momento(self):
+        """Fecha y hora de la reserva como datetime, aunque la fila aún no esté migrada."""
+        return self.fecha_hora or parsear_fecha_reserva(self.fecha)
+
+FORMATO_FECHA_RESERVA = "%Y-%m-%d %H:%M"
+_FORMATOS_FECHA_RESERVA = (FORMATO_FECHA_RESERVA, "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S",
+                           "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d")
+
+def parsear_fecha_reserva(valor):
+    """Convierte el texto guardado en reservaciones.fecha a datetime (None si no se reconoce)."""
+    if not valor:
+        return None
+    valor = valor.strip()
+    for formato in _FORMATOS_FECHA_RESERVA:
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+    return None
+
+@event.listens_for(Reservacion, "before_insert")
+@event.listens_for(Reservacion, "before_update")
+def _sincronizar_fecha_reserva(mapper, connection, target):
+    # Durante la migración el código nuevo escribe fecha_hora y el viejo escribe fecha:
+    # la que haya cambiado manda y la otra se rellena.
+    estado = inspect(target)
+    cambio_texto = estado.attrs.fecha.history.has_changes()
+    cambio_fecha = estado.attrs.fecha_hora.history.has_changes()
+    if target.fecha_hora is not None and (cambio_fecha or not target.fecha):
+        target.fecha = target.fecha_hora.strftime(FORMATO_FECHA_RESERVA)
+    elif cambio_texto or target.fecha_hora is None:
+        target.fecha_hora = parsear_fecha_reserva(target.fecha)
+
 # MÓDULO DE PEDIDOS
 
 class Pedido(db.Model):
     __tablename__ = "pedidos"
+    __table_args__ = (
+        db.Index("ix_pedidos_estatus", "estatus"),
+        db.Index("ix_pedidos_mesa_estatus", "mesa_id", "estatus"),
+    )
     pedido_id = db.Column(db.Integer, primary_key=True)
     mesa_id = db.Column(db.Integer, db.ForeignKey("mesas.mesa_id"), nullable=False)
     cliente_id = db.Column(db.Integer, db.ForeignKey("clientes.cliente_id"), nullable=True)
     
     fecha_hora = db.Column(db.DateTime, default=datetime.now)
     estatus = db.Column(db.String(20), default="Abierto") # Abierto, Cocina, Servido, Pagado, Cancelado
+    # Suma de cantidad * precio_unitario de las líneas, recalculada en cada flush que
+    # toque detalle_pedido sin importar quién escriba las líneas (ver _recalcular_totales)
+    total = db.Column(db.Float, default=0.0, nullable=False)
     
     detalles = db.relationship("DetallePedido", backref="pedido", lazy=True)
     cliente = db.relationship("Cliente") 
 
     @property
     def total_calculado(self):
-        """Calcula el monto total del pedido sumando cada plato * cantidad"""
-        if not self.detalles:
-            return 0.0
-        return sum(d.cantidad * d.plato.precio for d in self.detalles if d.plato)
+        """Total del pedido (persistido; ya no recorre detalles ni platos)"""
+        sesion = inspect(self).session
+        if sesion is not None and any(isinstance(o, DetallePedido)
+                                      for o in chain(sesion.new, sesion.dirty, sesion.deleted)):
+            # Líneas aún sin enviar: el flush recalcula el total y lo deja expirado
+            sesion.flush()
+        return self.total or 0.0
+
+    def agregar_linea(self, plato, cantidad=1, nota=None):
+        """Agrega un plato congelando su precio actual en la línea."""
+        linea = DetallePedido(plato_id=plato.plato_id, cantidad=cantidad, nota=nota,
+                              precio_unitario=plato.precio or 0.0)
+        self.detalles.append(linea)
+        return linea
+
+    def actualizar_linea(self, linea, cantidad):
+        linea.cantidad = cantidad
+
+    def quitar_linea(self, linea):
+        db.session.delete(linea)
 
 class DetallePedido(db.Model):
     __tablename__ = "detalle_pedido"
+    __table_args__ = (
+        db.Index("ix_detalle_pedido_pedido", "pedido_id"),
+    )
     detalle_pedido_id = db.Column(db.Integer, primary_key=True)
     pedido_id = db.Column(db.Integer, db.ForeignKey("pedidos.pedido_id"), nullable=False)
     plato_id = db.Column(db.Integer, db.ForeignKey("Menu.plato_id"), nullable=False)
     cantidad = db.Column(db.Integer, default=1, nullable=False)
     nota = db.Column(db.String(100), nullable=True)
+    # Precio del plato al momento de pedirlo: un cambio posterior del menú no altera el pedido
+    precio_unitario = db.Column(db.Float, nullable=True)
     
     plato = db.relationship("Plato")
 
+@event.listens_for(DetallePedido, "before_insert")
+def _congelar_precio_linea(mapper, connection, target):
+    # Las vistas que crean DetallePedido directamente no pasan el precio: se toma el del menú
+    if target.precio_unitario is None:
+        target.precio_unitario = connection.execute(
+            select(Plato.precio).where(Plato.plato_id == target.plato_id)).scalar() or 0.0
+
+_CAMPOS_TOTAL = ('pedido_id', 'cantidad', 'precio_unitario')
+
+@event.listens_for(Session, "before_flush")
+def _pedidos_con_lineas_cambiadas(session, contexto, instancias):
+    # Antes del flush: las líneas borradas todavía se pueden leer si estaban expiradas
+    ids = session.info.setdefault('pedidos_recalculados', set())
+    for linea in chain(session.dirty, session.deleted):
+        if not isinstance(linea, DetallePedido):
+            continue
+        estado = inspect(linea)
+        if linea in session.dirty and not any(estado.attrs[c].history.has_changes() for c in _CAMPOS_TOTAL):
+            continue
+        ids.add(linea.pedido_id)
+        historia = estado.attrs.pedido_id.history
+        ids.update(historia.deleted)
+        if historia.added and not historia.deleted and estado.persistent:
+            # Se cambió de pedido sin haber leído el anterior (expirado tras un commit)
+            ids.add(session.execute(select(DetallePedido.pedido_id).where(
+                DetallePedido.detalle_pedido_id == linea.detalle_pedido_id)).scalar())
+
+@event.listens_for(Session, "after_flush")
+def _recalcular_totales(session, contexto):
+    # pedidos.total = suma de sus líneas, en el mismo flush que cambia las líneas.
+    # Se recalcula en SQL (no se suma un delta) para que cuadre aunque otra caja
+    # haya tocado el pedido; _expirar_totales descarta el valor viejo en memoria.
+    ids = session.info.setdefault('pedidos_recalculados', set())
+    # Las líneas nuevas agregadas por la relación recién tienen pedido_id después del INSERT
+    ids.update(l.pedido_id for l in session.new if isinstance(l, DetallePedido))
+    ids.discard(None)
+    if not ids:
+        return
+    detalle, pedidos = DetallePedido.__table__, Pedido.__table__
+    suma = select(func.coalesce(func.sum(detalle.c.cantidad * detalle.c.precio_unitario), 0.0))\
+        .where(detalle.c.pedido_id == pedidos.c.pedido_id).scalar_subquery()
+    session.connection().execute(pedidos.update().where(pedidos.c.pedido_id.in_(ids)).values(total=suma))
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expirar_totales(session, contexto):
+    ids = session.info.pop('pedidos_recalculados', None)
+    if not ids:
+        return
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Pedido) and obj.pedido_id in ids:
+            session.expire(obj, ['total'])
+
 #  MÓDULO DE FACTURACIÓN 
 
 class Factura(db.Model):
     __tablename__ = "facturas"
+    __table_args__ = (
+        # Filtros por rango de fecha y orden (fecha, factura_id) del historial
+        db.Index("ix_facturas_fecha_id", "fecha", "factura_id"),
+        db.Index("ix_facturas_cliente_fecha", "cliente_id", "fecha"),
+        db.Index("ix_facturas_reservacion", "reservacion_id"),
+        # Único sólo entre las facturas que traen clave (SQL Server no admite dos NULL en un índice único)
+        db.Index("ux_facturas_clave", "clave_idempotencia", unique=True,
+                 mssql_where=text("clave_idempotencia IS NOT NULL"),
+                 sqlite_where=text("clave_idempotencia IS NOT NULL")),
+    )
     factura_id = db.Column(db.Integer, primary_key=True)
     reservacion_id = db.Column(db.Integer, db.ForeignKey('reservaciones.reservacion_id'), nullable=False)
     cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.cliente_id'), nullable=False)
@@ -84,12 +237,17 @@ class Factura(db.Model):
     impuesto = db.Column(db.Float, default=0.0, nullable=False)      
     propina_legal = db.Column(db.Float, default=0.0, nullable=False) 
     total = db.Column(db.Float, default=0.0, nullable=False)
+    # Clave de la venta en la cola local (cola_facturas.py); evita registrarla dos veces
+    clave_idempotencia = db.Column(db.String(36), nullable=True)
     
     detalles = db.relationship("DetalleFactura", backref="factura", lazy=True)
     reservacion_rel = db.relationship("Reservacion", backref=db.backref("datos_factura", uselist=False))
 
 class DetalleFactura(db.Model):
     __tablename__ = "detalle_factura"
+    __table_args__ = (
+        db.Index("ix_detalle_factura_factura", "factura_id"),
+    )
     detalle_id = db.Column(db.Integer, primary_key=True)
     factura_id = db.Column(db.Integer, db.ForeignKey('facturas.factura_id'), nullable=False)
     plato_id = db.Column(db.Integer, db.ForeignKey('Menu.plato_id'), nullable=False)
@@ -97,4 +255,99 @@ class DetalleFactura(db.Model):
     precio_unitario = db.Column(db.Float, default=0.0, nullable=False)
     descripcion = db.Column(db.String(255), nullable=True)
     total_linea = db.Column(db.Float, default=0.0, nullable=False)
-    plato = db.relationship("Plato")
\ No newline at end of file
+    plato = db.relationship("Plato")
+
+#  RESUMEN DIARIO DE VENTAS (mantenido por rollup_ventas al facturar)
+
+class VentaDiaria(db.Model):
+    __tablename__ = "ventas_diarias"
+    fecha = db.Column(db.Date, primary_key=True)
+    subtotal = db.Column(db.Float, default=0.0, nullable=False)
+    impuesto = db.Column(db.Float, default=0.0, nullable=False)
+    propina_legal = db.Column(db.Float, default=0.0, nullable=False)
+    total = db.Column(db.Float, default=0.0, nullable=False)
+    facturas = db.Column(db.Integer, default=0, nullable=False)
+
+class VentaDiariaPlato(db.Model):
+    __tablename__ = "ventas_diarias_platos"
+    fecha = db.Column(db.Date, primary_key=True)
+    plato_id = db.Column(db.Integer, primary_key=True)  # sin FK: el plato puede borrarse del menú
+    descripcion = db.Column(db.String(255), nullable=True)
+    cantidad = db.Column(db.Integer, default=0, nullable=False)
+    importe = db.Column(db.Float, default=0.0, nullable=False)
+
+
+#  VERSIONES DE DATOS (invalidación de cachés entre procesos, ver versiones_datos.py)
+
+class VersionDatos(db.Model):
+    __tablename__ = "versiones_datos"
+    nombre = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+
+#  EVENTOS DE CAMBIO DE ESTATUS (pedidos y mesas, ver eventos.py)
+
+class EventoEstado(db.Model):
+    __tablename__ = "eventos_estado"
+    evento_id = db.Column(db.Integer, primary_key=True)
+    creado = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+    entidad = db.Column(db.String(20), nullable=False)   # 'pedido' | 'mesa'
+    entidad_id = db.Column(db.Integer, nullable=False)
+    anterior = db.Column(db.String(20), nullable=True)
+    estatus = db.Column(db.String(20), nullable=True)
+
+
+#  ARCHIVO DE FACTURAS (meses cerrados fuera de las tablas vivas, ver archivo_facturas.py)
+
+class FacturaArchivo(db.Model):
+    """Misma forma que facturas; sin FK para que el archivo no frene cambios en las tablas vivas."""
+    __tablename__ = "facturas_archivo"
+    __table_args__ = (
+        db.Index("ix_facturas_archivo_fecha_id", "fecha", "factura_id"),
+        db.Index("ix_facturas_archivo_cliente_fecha", "cliente_id", "fecha"),
+    )
+    factura_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    reservacion_id = db.Column(db.Integer, nullable=False)
+    cliente_id = db.Column(db.Integer, nullable=False)
+    fecha = db.Column(db.DateTime)
+    subtotal = db.Column(db.Float, default=0.0, nullable=False)
+    impuesto = db.Column(db.Float, default=0.0, nullable=False)
+    propina_legal = db.Column(db.Float, default=0.0, nullable=False)
+    total = db.Column(db.Float, default=0.0, nullable=False)
+    clave_idempotencia = db.Column(db.String(36), nullable=True)
+
+    # Mismos nombres que en Factura: las plantillas del historial sirven para ambas
+    cliente = db.relationship("Cliente", viewonly=True,
+                              primaryjoin="foreign(FacturaArchivo.cliente_id) == Cliente.cliente_id")
+    reservacion_rel = db.relationship("Reservacion", viewonly=True,
+                                      primaryjoin="foreign(FacturaArchivo.reservacion_id) == Reservacion.reservacion_id")
+
+class DetalleFacturaArchivo(db.Model):
+    __tablename__ = "detalle_factura_archivo"
+    __table_args__ = (
+        db.Index("ix_detalle_factura_archivo_factura", "factura_id"),
+    )
+    detalle_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    factura_id = db.Column(db.Integer, nullable=False)
+    plato_id = db.Column(db.Integer, nullable=False)
+    cantidad = db.Column(db.Integer, default=1, nullable=False)
+    precio_unitario = db.Column(db.Float, default=0.0, nullable=False)
+    descripcion = db.Column(db.String(255), nullable=True)
+    total_linea = db.Column(db.Float, default=0.0, nullable=False)
+
+class PeriodoArchivado(db.Model):
+    """Un mes en proceso de archivo o ya archivado, con sus totales congelados."""
+    __tablename__ = "periodos_archivados"
+    inicio = db.Column(db.Date, primary_key=True)
+    fin = db.Column(db.Date, nullable=False)
+    estado = db.Column(db.String(20), nullable=False)  # copiando | borrando | archivado
+    # Avance del paso en curso (último factura_id copiado o borrado) para reanudar
+    ultimo_id = db.Column(db.Integer, default=0, nullable=False)
+    facturas = db.Column(db.Integer, default=0, nullable=False)
+    detalles = db.Column(db.Integer, default=0, nullable=False)
+    subtotal = db.Column(db.Float, default=0.0, nullable=False)
+    impuesto = db.Column(db.Float, default=0.0, nullable=False)
+    propina_legal = db.Column(db.Float, default=0.0, nullable=False)
+    total = db.Column(db.Float, default=0.0, nullable=False)
+    iniciado = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    terminado = db.Column(db.DateTime, nullable=True)
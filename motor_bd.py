@@ -0,0 +1,292 @@
+"""
+Configuración del motor de base de datos y métricas del pool de conexiones.
+
+config.py arma SQLALCHEMY_ENGINE_OPTIONS con opciones_motor(ENTORNO): el perfil
+del entorno ('prod' = SQL Server por pyodbc, 'dev' = SQLite local) con las
+variables de entorno BD_* aplicadas encima, por ejemplo:
+
+    BD_POOL_SIZE=20 BD_MAX_OVERFLOW=5 BD_POOL_RECYCLE=900 flask run
+
+El pool es un QueuePool que además mide cuánto espera cada petición por una
+conexión. Al registrar admin_bp (admin.py) se instala instrumentar(app):
+timeout por sentencia en pyodbc, contadores de conexiones creadas/cerradas y
+consultas y tiempo SQL por petición, todo visible en /admin/bd.
+"""
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolAgotado
+from sqlalchemy.pool import QueuePool
+
+from database import db
+
+PERFILES = {
+    'prod': {'pool_size': 10, 'max_overflow': 10, 'pool_timeout': 10,
+             'pool_recycle': 1800, 'pool_pre_ping': True, 'timeout_sentencia_seg': 30},
+    'dev': {'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10,
+            'pool_recycle': -1, 'pool_pre_ping': False, 'timeout_sentencia_seg': 0},
+}
+
+
+def _booleano(valor):
+    return str(valor).strip().lower() in ('1', 'true', 'si', 'sí', 'yes', 'on')
+
+
+VARIABLES = {
+    'pool_size': ('BD_POOL_SIZE', int),
+    'max_overflow': ('BD_MAX_OVERFLOW', int),
+    'pool_timeout': ('BD_POOL_TIMEOUT', float),
+    'pool_recycle': ('BD_POOL_RECYCLE', int),
+    'pool_pre_ping': ('BD_PRE_PING', _booleano),
+    'timeout_sentencia_seg': ('BD_TIMEOUT_SENTENCIA_SEG', int),
+}
+
+
+def ajustes(entorno, variables=os.environ):
+    """Perfil del entorno con las variables BD_* que estén definidas aplicadas encima."""
+    if entorno not in PERFILES:
+        raise ValueError(f"Entorno desconocido: {entorno} (válidos: {', '.join(PERFILES)})")
+    resultado = dict(PERFILES[entorno])
+    for clave, (variable, convertir) in VARIABLES.items():
+        if variables.get(variable, '').strip():
+            resultado[clave] = convertir(variables[variable])
+    return resultado
+
+
+def opciones_motor(entorno, variables=os.environ):
+    """Argumentos para create_engine (SQLALCHEMY_ENGINE_OPTIONS)."""
+    a = ajustes(entorno, variables)
+    opciones = {clave: a[clave] for clave in ('pool_size', 'max_overflow', 'pool_timeout',
+                                              'pool_recycle', 'pool_pre_ping')}
+    opciones['poolclass'] = PoolMedido
+    if entorno == 'dev':
+        # El pool comparte conexiones entre hilos; timeout = espera por bloqueos de SQLite
+        opciones['connect_args'] = {'check_same_thread': False, 'timeout': 15}
+    return opciones
+
+
+class Histograma:
+    """Conteo por cubetas de milisegundos, seguro entre hilos."""
+
+    LIMITES_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self._cubetas = [0] * (len(self.LIMITES_MS) + 1)
+            self.total = 0
+            self.suma_seg = 0.0
+            self.maximo_seg = 0.0
+
+    def observar(self, segundos):
+        cubeta = bisect_left(self.LIMITES_MS, segundos * 1000)
+        with self._lock:
+            self._cubetas[cubeta] += 1
+            self.total += 1
+            self.suma_seg += segundos
+            self.maximo_seg = max(self.maximo_seg, segundos)
+
+    def resumen(self):
+        with self._lock:
+            etiquetas = [f"<={l}ms" for l in self.LIMITES_MS] + [f">{self.LIMITES_MS[-1]}ms"]
+            return {
+                'total': self.total,
+                'promedio_ms': round(self.suma_seg / self.total * 1000, 2) if self.total else 0.0,
+                'maximo_ms': round(self.maximo_seg * 1000, 2),
+                'cubetas': {e: n for e, n in zip(etiquetas, self._cubetas) if n},
+            }
+
+
+class _Contadores:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.valores = dict.fromkeys(('creadas', 'cerradas', 'invalidadas', 'prestamos', 'agotadas'), 0)
+
+    def sumar(self, clave, n=1):
+        with self._lock:
+            self.valores[clave] += n
+
+
+espera_conexion = Histograma()
+uso_conexion = Histograma()
+contadores = _Contadores()
+_pools = weakref.WeakSet()
+# Motores con los eventos ya instalados (varias apps pueden compartir el mismo)
+_instrumentados = weakref.WeakSet()
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide el tiempo que se espera para obtener una conexión."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        _pools.add(self)
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolAgotado:
+            contadores.sumar('agotadas')
+            raise
+        finally:
+            espera_conexion.observar(time.perf_counter() - inicio)
+
+
+@event.listens_for(PoolMedido, "connect")
+def _conexion_creada(conexion_dbapi, registro):
+    contadores.sumar('creadas')
+
+
+@event.listens_for(PoolMedido, "close")
+def _conexion_cerrada(conexion_dbapi, registro):
+    contadores.sumar('cerradas')
+
+
+@event.listens_for(PoolMedido, "invalidate")
+def _conexion_invalidada(conexion_dbapi, registro, excepcion):
+    contadores.sumar('invalidadas')
+
+
+@event.listens_for(PoolMedido, "checkout")
+def _prestada(conexion_dbapi, registro, proxy):
+    contadores.sumar('prestamos')
+    registro.info['prestada_en'] = time.perf_counter()
+
+
+@event.listens_for(PoolMedido, "checkin")
+def _devuelta(conexion_dbapi, registro):
+    inicio = registro.info.pop('prestada_en', None)
+    if inicio is not None:
+        uso_conexion.observar(time.perf_counter() - inicio)
+
+
+class _PorRuta:
+    """Peticiones, consultas y tiempo SQL acumulados por endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rutas = {}
+
+    def registrar(self, endpoint, consultas, segundos_sql, segundos_total):
+        with self._lock:
+            r = self._rutas.setdefault(endpoint, {'peticiones': 0, 'consultas': 0, 'sql_seg': 0.0,
+                                                  'total_seg': 0.0, 'max_consultas': 0})
+            r['peticiones'] += 1
+            r['consultas'] += consultas
+            r['sql_seg'] += segundos_sql
+            r['total_seg'] += segundos_total
+            r['max_consultas'] = max(r['max_consultas'], consultas)
+
+    def resumen(self, limite=25):
+        with self._lock:
+            filas = [(e, dict(r)) for e, r in self._rutas.items()]
+        filas.sort(key=lambda f: f[1]['sql_seg'], reverse=True)
+        return [{
+            'endpoint': e,
+            'peticiones': r['peticiones'],
+            'consultas_promedio': round(r['consultas'] / r['peticiones'], 1),
+            'max_consultas': r['max_consultas'],
+            'sql_ms_promedio': round(r['sql_seg'] / r['peticiones'] * 1000, 2),
+            'total_ms_promedio': round(r['total_seg'] / r['peticiones'] * 1000, 2),
+        } for e, r in filas[:limite]]
+
+    def reiniciar(self):
+        with self._lock:
+            self._rutas.clear()
+
+
+por_ruta = _PorRuta()
+
+
+def instrumentar(app):
+    """Instala el timeout por sentencia y la medición por petición en el motor de `app`."""
+    with app.app_context():
+        engine = db.engine
+    if engine not in _instrumentados:
+        _instrumentados.add(engine)
+        _instrumentar_motor(engine, app.config.get('BD_TIMEOUT_SENTENCIA_SEG', 0))
+
+    @app.before_request
+    def _iniciar_medicion():
+        g.sql = [0, 0.0]
+        g.inicio_peticion = time.perf_counter()
+
+    @app.after_request
+    def _cerrar_medicion(respuesta):
+        if 'sql' not in g:
+            return respuesta
+        consultas, segundos = g.sql
+        por_ruta.registrar(request.endpoint or request.path, consultas, segundos,
+                           time.perf_counter() - g.inicio_peticion)
+        if app.config.get('BD_METRICAS_CABECERAS', False):
+            respuesta.headers['X-Consultas-SQL'] = str(consultas)
+            respuesta.headers['X-Tiempo-SQL-ms'] = f"{segundos * 1000:.1f}"
+        return respuesta
+
+
+def _instrumentar_motor(engine, timeout):
+    """Eventos del motor: una sola vez por engine aunque lo registren varias apps."""
+    @event.listens_for(engine, "connect")
+    def _timeout_sentencia(conexion_dbapi, registro):
+        # pyodbc cancela la sentencia que pase de `timeout` segundos (0 = sin límite)
+        if timeout and engine.dialect.name == 'mssql':
+            conexion_dbapi.timeout = timeout
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, sentencia, parametros, contexto, executemany):
+        conn.info.setdefault('inicio_sentencia', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, sentencia, parametros, contexto, executemany):
+        pila = conn.info.get('inicio_sentencia')
+        if not pila:
+            return
+        duracion = time.perf_counter() - pila.pop()
+        if has_request_context() and 'sql' in g:
+            g.sql[0] += 1
+            g.sql[1] += duracion
+
+    @event.listens_for(engine, "handle_error")
+    def _fallida(contexto):
+        if contexto.connection is not None and contexto.connection.info.get('inicio_sentencia'):
+            contexto.connection.info['inicio_sentencia'].pop()
+
+
+def estado_pools():
+    return [{
+        'tamano': p.size(),
+        'en_uso': p.checkedout(),
+        'libres': p.checkedin(),
+        'desborde': max(0, p.overflow()),
+        'max_desborde': p._max_overflow,
+        'timeout_seg': p._timeout,
+    } for p in list(_pools)]
+
+
+def metricas():
+    return {
+        'pools': estado_pools(),
+        'conexiones': dict(contadores.valores),
+        'espera_conexion': espera_conexion.resumen(),
+        'uso_conexion': uso_conexion.resumen(),
+        'rutas': por_ruta.resumen(),
+    }
+
+
+def reiniciar_metricas():
+    for m in (espera_conexion, uso_conexion, contadores, por_ruta):
+        m.reiniciar()
@@ -0,0 +1,222 @@
+"""
+Perfilador de rutas y detector de N+1 (opcional, PERFILADOR_ACTIVO).
+
+Para cada petición de los blueprints de PERFILADOR_BLUEPRINTS registra:
+  - sentencias SQL y tiempo en la base, separando las que salen al renderizar
+    la plantilla (cargas perezosas como f.cliente o reserva.mesa),
+  - tiempo de render de plantillas y tiempo total,
+  - "formas" de sentencia repetidas: el mismo SQL parametrizado ejecutado
+    PERFILADOR_UMBRAL_REPETIDAS veces o más en una petición es un N+1; se
+    registra en el log con la línea de plantilla (o de código) que lo disparó.
+
+El resumen por ruta, ordenado por costo total, se ve en /admin/perfil (JSON) o
+/admin/perfil.txt, y benchmarks/perfilar_rutas.py lo genera recorriendo las
+vistas sobre una base local. Se instala al registrar admin_bp.
+"""
+import os
+import sys
+import threading
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+from database import db
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+_PROPIOS = {os.path.abspath(__file__), os.path.join(RAIZ, 'motor_bd.py')}
+MAX_ORIGENES = 3
+
+
+def _origen(profundidad=2):
+    """Línea de plantilla que disparó la sentencia o, si no hay, la primera línea de código del proyecto."""
+    frame = sys._getframe(profundidad)
+    codigo = None
+    while frame is not None:
+        plantilla = frame.f_globals.get('__jinja_template__')
+        if plantilla is not None:
+            linea = plantilla.get_corresponding_lineno(frame.f_lineno)
+            return f"{plantilla.name}:{linea}" + (f" (vía {codigo})" if codigo else "")
+        archivo = os.path.abspath(frame.f_code.co_filename)
+        if codigo is None and archivo.startswith(RAIZ) and archivo not in _PROPIOS \
+                and 'site-packages' not in archivo:
+            codigo = f"{os.path.relpath(archivo, RAIZ)}:{frame.f_lineno} en {frame.f_code.co_name}"
+        frame = frame.f_back
+    return codigo or "?"
+
+
+class Perfil:
+    """Lo medido durante una petición."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.sentencias = 0
+        self.sql_seg = 0.0
+        self.sentencias_render = 0
+        self.render_seg = 0.0
+        self.render_desde = None
+        self.formas = {}  # sql -> [veces, segundos, [orígenes]]
+
+    def registrar(self, sentencia, segundos, origen):
+        self.sentencias += 1
+        self.sql_seg += segundos
+        if self.render_desde is not None:
+            self.sentencias_render += 1
+        forma = self.formas.setdefault(sentencia, [0, 0.0, []])
+        forma[0] += 1
+        forma[1] += segundos
+        if origen and origen not in forma[2] and len(forma[2]) < MAX_ORIGENES:
+            forma[2].append(origen)
+
+    def repetidas(self, umbral):
+        return sorted(((s, v) for s, v in self.formas.items() if v[0] >= umbral),
+                      key=lambda f: f[1][1], reverse=True)
+
+
+def _resumir(sentencia, largo=160):
+    texto = " ".join(sentencia.split())
+    return texto if len(texto) <= largo else texto[:largo - 3] + "..."
+
+
+class Reporte:
+    """Acumulado por endpoint de los perfiles de cada petición."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rutas = {}
+
+    def agregar(self, endpoint, perfil, total_seg, umbral):
+        repetidas = perfil.repetidas(umbral)
+        with self._lock:
+            r = self._rutas.setdefault(endpoint, {
+                'peticiones': 0, 'total_seg': 0.0, 'sql_seg': 0.0, 'render_seg': 0.0,
+                'sentencias': 0, 'sentencias_render': 0, 'max_sentencias': 0, 'n_mas_1': {},
+            })
+            r['peticiones'] += 1
+            r['total_seg'] += total_seg
+            r['sql_seg'] += perfil.sql_seg
+            r['render_seg'] += perfil.render_seg
+            r['sentencias'] += perfil.sentencias
+            r['sentencias_render'] += perfil.sentencias_render
+            r['max_sentencias'] = max(r['max_sentencias'], perfil.sentencias)
+            for sentencia, (veces, segundos, origenes) in repetidas:
+                n = r['n_mas_1'].setdefault(sentencia, {'peticiones': 0, 'veces': 0, 'seg': 0.0, 'origenes': []})
+                n['peticiones'] += 1
+                n['veces'] += veces
+                n['seg'] += segundos
+                n['origenes'] = (n['origenes'] + [o for o in origenes if o not in n['origenes']])[:MAX_ORIGENES]
+
+    def resumen(self):
+        """Rutas ordenadas por tiempo total acumulado (la que más cuesta primero)."""
+        with self._lock:
+            rutas = [(e, dict(r, n_mas_1=dict(r['n_mas_1']))) for e, r in self._rutas.items()]
+        rutas.sort(key=lambda f: f[1]['total_seg'], reverse=True)
+        resultado = []
+        for endpoint, r in rutas:
+            p = r['peticiones']
+            resultado.append({
+                'endpoint': endpoint,
+                'peticiones': p,
+                'total_ms': round(r['total_seg'] * 1000, 1),
+                'promedio_ms': round(r['total_seg'] / p * 1000, 1),
+                'sql_ms_promedio': round(r['sql_seg'] / p * 1000, 1),
+                'render_ms_promedio': round(r['render_seg'] / p * 1000, 1),
+                'sentencias_promedio': round(r['sentencias'] / p, 1),
+                'sentencias_en_plantilla_promedio': round(r['sentencias_render'] / p, 1),
+                'max_sentencias': r['max_sentencias'],
+                'n_mas_1': [{
+                    'sql': _resumir(s),
+                    'veces_por_peticion': round(n['veces'] / n['peticiones'], 1),
+                    'ms_por_peticion': round(n['seg'] / n['peticiones'] * 1000, 2),
+                    'origenes': n['origenes'],
+                } for s, n in sorted(r['n_mas_1'].items(), key=lambda x: x[1]['seg'], reverse=True)],
+            })
+        return resultado
+
+    def texto(self):
+        lineas = [f"{'endpoint':<36} {'pet.':>5} {'total ms':>10} {'prom ms':>8} {'sql ms':>7} "
+                  f"{'render':>7} {'sent.':>6} {'en tpl':>6}"]
+        for r in self.resumen():
+            lineas.append(f"{r['endpoint'][:36]:<36} {r['peticiones']:>5} {r['total_ms']:>10} "
+                          f"{r['promedio_ms']:>8} {r['sql_ms_promedio']:>7} {r['render_ms_promedio']:>7} "
+                          f"{r['sentencias_promedio']:>6} {r['sentencias_en_plantilla_promedio']:>6}")
+            for n in r['n_mas_1']:
+                lineas.append(f"    N+1 x{n['veces_por_peticion']} ({n['ms_por_peticion']} ms): {n['sql']}")
+                for origen in n['origenes']:
+                    lineas.append(f"        desde {origen}")
+        return "\n".join(lineas)
+
+    def reiniciar(self):
+        with self._lock:
+            self._rutas.clear()
+
+
+reporte = Reporte()
+
+
+def _perfil_actual():
+    return g.get('perfil') if has_request_context() else None
+
+
+def instalar(app):
+    """Engancha el perfilador a `app` si PERFILADOR_ACTIVO está encendido."""
+    if not app.config.get('PERFILADOR_ACTIVO', False):
+        return
+    blueprints = set(app.config.get('PERFILADOR_BLUEPRINTS', ('home', 'ventas', 'clientes', 'reservacion')))
+    umbral = app.config.get('PERFILADOR_UMBRAL_REPETIDAS', 5)
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, sentencia, parametros, contexto, executemany):
+        if _perfil_actual() is not None:
+            conn.info.setdefault('perfil_inicio', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, sentencia, parametros, contexto, executemany):
+        perfil = _perfil_actual()
+        pila = conn.info.get('perfil_inicio')
+        if perfil is None or not pila:
+            return
+        segundos = time.perf_counter() - pila.pop()
+        # El origen sólo hace falta para las primeras repeticiones de cada forma
+        forma = perfil.formas.get(sentencia)
+        origen = _origen() if forma is None or len(forma[2]) < MAX_ORIGENES else None
+        perfil.registrar(sentencia, segundos, origen)
+
+    @event.listens_for(engine, "handle_error")
+    def _fallida(contexto):
+        if contexto.connection is not None and contexto.connection.info.get('perfil_inicio'):
+            contexto.connection.info['perfil_inicio'].pop()
+
+    def _antes_de_render(emisor, template, context, **extra):
+        perfil = _perfil_actual()
+        if perfil is not None and perfil.render_desde is None:
+            perfil.render_desde = time.perf_counter()
+
+    def _despues_de_render(emisor, template, context, **extra):
+        perfil = _perfil_actual()
+        if perfil is not None and perfil.render_desde is not None:
+            perfil.render_seg += time.perf_counter() - perfil.render_desde
+            perfil.render_desde = None
+
+    before_render_template.connect(_antes_de_render, app, weak=False)
+    template_rendered.connect(_despues_de_render, app, weak=False)
+
+    @app.before_request
+    def _empezar():
+        if request.blueprint in blueprints:
+            g.perfil = Perfil()
+
+    @app.after_request
+    def _terminar(respuesta):
+        perfil = g.pop('perfil', None)
+        if perfil is None:
+            return respuesta
+        total = time.perf_counter() - perfil.inicio
+        endpoint = request.endpoint or request.path
+        for sentencia, (veces, segundos, origenes) in perfil.repetidas(umbral):
+            app.logger.warning("N+1 en %s: %d veces (%.1f ms) %s | desde %s", endpoint, veces,
+                               segundos * 1000, _resumir(sentencia, 120), "; ".join(origenes) or "?")
+        reporte.agregar(endpoint, perfil, total, umbral)
+        return respuesta
@@ -0,0 +1,141 @@
+from database import db, dia, como_fecha
+from models import Factura, DetalleFactura, VentaDiaria, VentaDiariaPlato
+from datetime import timedelta
+from sqlalchemy import func, insert, select, update, bindparam
+from sqlalchemy.exc import IntegrityError
+import archivo_facturas
+import versiones_datos
+
+
+def _sumar(modelo, claves, incrementos, extras=None):
+    """
+    UPDATE ... SET col = col + :valor sobre la fila del día; si no existe se inserta.
+    El incremento se hace en SQL para que dos cajas facturando a la vez no pisen
+    sus totales. Si otra transacción inserta la fila primero, se reintenta el UPDATE.
+    """
+    filtro = [getattr(modelo, k) == v for k, v in claves.items()]
+    valores = {getattr(modelo, k): getattr(modelo, k) + v for k, v in incrementos.items()}
+    valores.update({getattr(modelo, k): v for k, v in (extras or {}).items()})
+
+    if db.session.execute(update(modelo).where(*filtro).values(valores)).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(modelo).values(**claves, **incrementos, **(extras or {})))
+    except IntegrityError:
+        db.session.execute(update(modelo).where(*filtro).values(valores))
+
+
+def registrar_factura(factura, lineas):
+    """
+    Suma una factura recién creada al resumen diario. Se llama dentro de la misma
+    transacción que inserta la factura, antes del commit.
+    lineas: iterable de dicts con plato_id, descripcion, cantidad y total_linea.
+    """
+    fecha = factura.fecha.date()
+    _sumar(VentaDiaria, {'fecha': fecha}, {
+        'subtotal': factura.subtotal,
+        'impuesto': factura.impuesto,
+        'propina_legal': factura.propina_legal,
+        'total': factura.total,
+        'facturas': 1,
+    })
+
+    por_plato = {}
+    for l in lineas:
+        acum = por_plato.setdefault(l['plato_id'], {'cantidad': 0, 'importe': 0.0, 'descripcion': l['descripcion']})
+        acum['cantidad'] += l['cantidad']
+        acum['importe'] += l['total_linea']
+    if not por_plato:
+        return
+
+    # Número fijo de viajes a la base sin importar cuántos platos tenga la factura:
+    # un SELECT de las filas existentes, un UPDATE y un INSERT en modo executemany.
+    existentes = {pid for (pid,) in db.session.query(VentaDiariaPlato.plato_id).filter(
+        VentaDiariaPlato.fecha == fecha, VentaDiariaPlato.plato_id.in_(list(por_plato)))}
+
+    tabla = VentaDiariaPlato.__table__
+    a_actualizar = [{'b_fecha': fecha, 'b_plato': pid, 'b_cantidad': a['cantidad'],
+                     'b_importe': a['importe'], 'b_descripcion': a['descripcion']}
+                    for pid, a in por_plato.items() if pid in existentes]
+    if a_actualizar:
+        db.session.execute(
+            update(tabla)
+            .where(tabla.c.fecha == bindparam('b_fecha'), tabla.c.plato_id == bindparam('b_plato'))
+            .values(cantidad=tabla.c.cantidad + bindparam('b_cantidad'),
+                    importe=tabla.c.importe + bindparam('b_importe'),
+                    descripcion=bindparam('b_descripcion')),
+            a_actualizar)
+
+    nuevos = [(pid, a) for pid, a in por_plato.items() if pid not in existentes]
+    if nuevos:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(tabla.insert(), [
+                    {'fecha': fecha, 'plato_id': pid, 'cantidad': a['cantidad'],
+                     'importe': a['importe'], 'descripcion': a['descripcion']} for pid, a in nuevos])
+        except IntegrityError:
+            # Otra caja creó alguna de las filas entre el SELECT y el INSERT
+            for pid, a in nuevos:
+                _sumar(VentaDiariaPlato, {'fecha': fecha, 'plato_id': pid},
+                       {'cantidad': a['cantidad'], 'importe': a['importe']},
+                       extras={'descripcion': a['descripcion']})
+
+
+def reconstruir(desde=None, hasta=None, dias_por_lote=31, progreso=None):
+    """
+    Recalcula el resumen a partir de facturas/detalle_factura en ventanas de
+    `dias_por_lote` días. Cada ventana se agrega en SQL (INSERT ... SELECT ... GROUP BY)
+    y se confirma por separado, así la memoria no depende del tamaño del historial.
+    """
+    if desde is None or hasta is None:
+        minimo, maximo = db.session.query(func.min(Factura.fecha), func.max(Factura.fecha)).one()
+        if minimo is None:
+            return 0
+        desde = desde or minimo
+        hasta = hasta or maximo
+    # Ventanas de días completos: con la hora de la primera factura los cortes caerían
+    # a mitad de un día y el DELETE por fecha no alcanzaría la fila de ese día
+    desde, hasta = como_fecha(desde), como_fecha(hasta)
+    # Los meses archivados conservan su resumen congelado: ya no hay facturas vivas para recalcularlo
+    limite = archivo_facturas.frontera()
+    if limite and desde < limite:
+        desde = limite
+
+    dias_procesados = 0
+    inicio = desde
+    while inicio <= hasta:
+        fin = min(inicio + timedelta(days=dias_por_lote), hasta + timedelta(days=1))
+        _reconstruir_ventana(inicio, fin)
+        db.session.commit()
+        dias_procesados += (fin - inicio).days
+        if progreso:
+            progreso(inicio, fin)
+        inicio = fin
+    return dias_procesados
+
+
+def _reconstruir_ventana(inicio, fin):
+    db.session.query(VentaDiaria).filter(
+        VentaDiaria.fecha >= inicio, VentaDiaria.fecha < fin).delete(synchronize_session=False)
+    db.session.query(VentaDiariaPlato).filter(
+        VentaDiariaPlato.fecha >= inicio, VentaDiariaPlato.fecha < fin).delete(synchronize_session=False)
+    # La analítica memorizada (analitica_ventas) depende del resumen
+    versiones_datos.incrementar('facturas')
+
+    en_rango = (Factura.fecha >= inicio, Factura.fecha < fin)
+    dia_col = dia(Factura.fecha)
+
+    db.session.execute(insert(VentaDiaria).from_select(
+        ['fecha', 'subtotal', 'impuesto', 'propina_legal', 'total', 'facturas'],
+        select(dia_col, func.sum(Factura.subtotal), func.sum(Factura.impuesto),
+               func.sum(Factura.propina_legal), func.sum(Factura.total), func.count(Factura.factura_id))
+        .where(*en_rango).group_by(dia_col)
+    ))
+    db.session.execute(insert(VentaDiariaPlato).from_select(
+        ['fecha', 'plato_id', 'descripcion', 'cantidad', 'importe'],
+        select(dia_col, DetalleFactura.plato_id, func.max(DetalleFactura.descripcion),
+               func.sum(DetalleFactura.cantidad), func.sum(DetalleFactura.total_linea))
+        .join(Factura, Factura.factura_id == DetalleFactura.factura_id)
+        .where(*en_rango).group_by(dia_col, DetalleFactura.plato_id)
+    ))
@@ -0,0 +1,328 @@
+"""
+Modo de servicio asíncrono (ASGI) para las lecturas más pedidas.
+
+Con workers síncronos cada proceso queda bloqueado durante cada ida y vuelta a
+SQL Server, así que la concurrencia máxima es la cantidad de procesos.
+crear_asgi(app) devuelve una aplicación ASGI que atiende /dashboard,
+/historial, /reservaciones y /clientes con un motor asíncrono (aioodbc para
+SQL Server, aiosqlite para la base SQLite de desarrollo): mientras una
+petición espera a la base, el mismo proceso atiende otras. Las consultas
+independientes de una página (ventas por día y top de platos del dashboard,
+conteo y página de reservaciones, los criterios de la búsqueda de clientes)
+salen a la vez, cada una por su conexión.
+
+Las sentencias y las variables de las plantillas son las de las vistas
+síncronas (consulta_historial, sentencias_busqueda, contexto_dashboard...), y
+el render se hace en un hilo dentro del contexto de petición de Flask, así que
+el HTML es el mismo. La caché de páginas (cache_paginas) también aplica.
+Todo lo demás (escrituras, formularios, peticiones con flash pendiente o con
+parámetros inválidos) pasa a la app Flask por WsgiToAsgi, igual que antes.
+
+En el módulo de la aplicación:
+
+    from servidor_async import crear_asgi
+    asgi = crear_asgi(app)
+
+    uvicorn app:asgi --workers 4
+
+Requiere asgiref y el driver asíncrono (aioodbc o aiosqlite); si el motor no
+se puede crear, todas las peticiones pasan a la app síncrona.
+"""
+import asyncio
+import io
+import math
+import re
+import sys
+from datetime import date, datetime
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import make_response, render_template, request, session
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import joinedload
+
+from database import como_fecha
+from metricas_dashboard import rango_mes
+from models import Reservacion
+import analitica_ventas
+import archivo_facturas
+import busqueda_clientes
+import cache_paginas
+import disponibilidad
+import index_controller
+import mesas_controller
+import metricas_dashboard
+import ventas_controller
+import versiones_datos
+
+DRIVERS_ASYNC = {
+    'mssql': 'mssql+aioodbc',
+    'mssql+pyodbc': 'mssql+aioodbc',
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+}
+OPCIONES_POOL = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping')
+
+
+def url_async(url):
+    """URL equivalente con driver asíncrono (mssql+pyodbc -> mssql+aioodbc, sqlite -> sqlite+aiosqlite)."""
+    url = make_url(url)
+    if url.drivername in DRIVERS_ASYNC.values():
+        return url
+    if url.drivername not in DRIVERS_ASYNC:
+        raise ValueError(f"Sin driver asíncrono conocido para {url.drivername}")
+    return url.set(drivername=DRIVERS_ASYNC[url.drivername])
+
+
+def opciones_motor_async(config):
+    """Pool del motor síncrono (motor_bd) con ASYNC_BD_OPCIONES aplicadas encima."""
+    opciones = {k: v for k, v in config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).items() if k in OPCIONES_POOL}
+    opciones.update(config.get('ASYNC_BD_OPCIONES') or {})
+    return opciones
+
+
+class Pagina:
+    """Lo que reservaciones/list.html usa de la paginación de Flask-SQLAlchemy."""
+
+    def __init__(self, page, per_page, total, items):
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.items = items
+
+    @property
+    def pages(self):
+        return math.ceil(self.total / self.per_page) if self.total and self.per_page else 0
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+def _fecha_valida(valor):
+    if not valor:
+        return True
+    try:
+        datetime.strptime(valor, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+
+def _environ(scope):
+    """Entorno WSGI de un GET ASGI, para abrir el contexto de petición de Flask."""
+    servidor = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': servidor[0],
+        'SERVER_PORT': str(servidor[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for nombre, valor in scope.get('headers', []):
+        nombre, valor = nombre.decode('latin-1').upper().replace('-', '_'), valor.decode('latin-1')
+        clave = nombre if nombre in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f"HTTP_{nombre}"
+        environ[clave] = f"{environ[clave]},{valor}" if clave in environ else valor
+    return environ
+
+
+class ServidorAsync:
+    """Aplicación ASGI: lecturas con el motor asíncrono, el resto a la app WSGI."""
+
+    def __init__(self, app):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.motor = None
+        self.sesiones = None
+        self.rutas = [
+            (re.compile(r"^/dashboard(?:/(?P<mes>\d+))?/?$"), self.dashboard),
+            (re.compile(r"^/historial/?$"), self.historial),
+            (re.compile(r"^/reservaciones/?$"), self.reservaciones),
+            (re.compile(r"^/clientes/?$"), self.clientes),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._ciclo_de_vida(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            for patron, manejador in self.rutas:
+                coincidencia = patron.match(scope['path'])
+                if coincidencia:
+                    respuesta = await self._atender(scope, manejador, coincidencia.groupdict())
+                    if respuesta is not None:
+                        return await self._enviar(send, respuesta, scope['method'] == 'HEAD')
+                    break
+        await self.wsgi(scope, receive, send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                self._iniciar()
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                if self.motor:
+                    await self.motor.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _iniciar(self):
+        if self.motor is not None:
+            return
+        config = self.app.config
+        try:
+            url = url_async(config.get('ASYNC_BD_URI') or config['SQLALCHEMY_DATABASE_URI'])
+            opciones = opciones_motor_async(config)
+            if url.get_backend_name() == 'sqlite':
+                opciones['connect_args'] = {'timeout': 15}
+            self.motor = create_async_engine(url, **opciones)
+            self.sesiones = async_sessionmaker(self.motor, expire_on_commit=False)
+        except (ImportError, ValueError) as e:
+            # Sin driver asíncrono todo se atiende con la app síncrona
+            self.app.logger.warning("Modo asíncrono desactivado: %s", e)
+            self.motor = False
+
+    async def _atender(self, scope, manejador, parametros):
+        """Respuesta de Flask ya procesada, o None para pasar la petición a la app WSGI."""
+        self._iniciar()
+        if not self.motor:
+            return None
+        with self.app.request_context(_environ(scope)):
+            if request.routing_exception is not None or session.get('_flashes'):
+                return None
+            if self.app.preprocess_request() is not None:
+                return None
+            try:
+                respuesta = await manejador(**{k: v for k, v in parametros.items() if v is not None})
+            except Exception:
+                self.app.logger.exception("Error en %s (modo asíncrono); se atiende con la app síncrona",
+                                          scope['path'])
+                return None
+            if respuesta is None:
+                return None
+            return self.app.process_response(respuesta)
+
+    async def _enviar(self, send, respuesta, solo_cabeceras):
+        await send({
+            'type': 'http.response.start',
+            'status': respuesta.status_code,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in respuesta.headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': b"" if solo_cabeceras else respuesta.get_data()})
+
+    async def _filas(self, sentencia):
+        """Filas de una sentencia por una conexión propia (varias pueden correr a la vez)."""
+        async with self.motor.connect() as conexion:
+            return (await conexion.execute(sentencia)).all()
+
+    async def _objetos(self, sentencia):
+        """Objetos ORM; las relaciones que usa la plantilla deben venir con joinedload."""
+        async with self.sesiones() as sesion:
+            return (await sesion.execute(sentencia)).scalars().all()
+
+    async def _versiones(self, *nombres):
+        return versiones_datos.de_filas(nombres, await self._filas(versiones_datos.consulta(*nombres)))
+
+    async def _render(self, plantilla, contexto):
+        # asyncio.to_thread copia el contexto: el hilo ve la petición de Flask
+        return make_response(await asyncio.to_thread(render_template, plantilla, **contexto))
+
+    async def dashboard(self, mes=None):
+        hoy = date.today()
+        mes_seleccionado = int(mes) if mes else hoy.month
+        if not 1 <= mes_seleccionado <= 12:
+            return None  # la vista síncrona valida el mes y redirige a /dashboard
+        inicio, fin = rango_mes(hoy.year, mes_seleccionado)
+        por_dia, top, versiones = await asyncio.gather(
+            self._filas(metricas_dashboard.consulta_ventas_por_dia(
+                metricas_dashboard.rangos_tendencia(hoy, inicio, fin))),
+            self._filas(metricas_dashboard.consulta_top_platos(inicio, fin)),
+            self._versiones(analitica_ventas.VERSION),
+        )
+        metricas = metricas_dashboard.armar_metricas(hoy, inicio, fin, metricas_dashboard.totales_por_dia(por_dia), top)
+        # La analítica casi siempre sale memorizada; si no, NumPy y sus consultas van en un hilo
+        analitica = await asyncio.to_thread(analitica_ventas.memo.obtener, hoy.year, mes_seleccionado, hoy,
+                                            versiones[analitica_ventas.VERSION])
+        return await self._render("dashboard.html",
+                                  index_controller.contexto_dashboard(mes_seleccionado, metricas, analitica))
+
+    async def historial(self):
+        if not all(_fecha_valida(request.args.get(k)) for k in ('desde', 'hasta')):
+            return None  # la vista síncrona avisa con flash
+        pendiente = None
+        if cache_paginas.aplica():
+            versiones = ventas_controller.historial.versiones_cache
+            respuesta, pendiente = cache_paginas.consultar(versiones, await self._versiones(*versiones))
+            if respuesta is not None:
+                return respuesta
+        limite = (await self._filas(archivo_facturas.consulta_frontera()))[0][0]
+        consultas, por_pagina, cursor, filtros = ventas_controller.consulta_historial(
+            request.args, como_fecha(limite))
+        filas = []
+        for consulta in consultas:
+            filas += await self._objetos(consulta.limit(por_pagina + 1 - len(filas)))
+            if len(filas) > por_pagina:
+                break
+        respuesta = await self._render("facturas/list.html",
+                                       ventas_controller.contexto_historial(filas, por_pagina, cursor, filtros))
+        return cache_paginas.almacenar(respuesta, pendiente) if pendiente else respuesta
+
+    async def reservaciones(self):
+        dia = request.args.get('dia', '')
+        rango = mesas_controller.rango_reservaciones(request.args.get('vista', 'hoy'), dia)
+        if rango is None:
+            return None
+        vista, desde, hasta = rango
+        por_pagina = self.app.config.get('RESERVACIONES_POR_PAGINA', 50)
+        numero = max(request.args.get('pagina', 1, type=int) or 1, 1)
+        filtro = disponibilidad.en_rango(desde, hasta)
+        total, items = await asyncio.gather(
+            self._filas(select(func.count()).select_from(Reservacion).where(filtro)),
+            self._objetos(select(Reservacion).options(joinedload(Reservacion.cliente), joinedload(Reservacion.mesa))
+                          .where(filtro).order_by(*mesas_controller.ORDEN_RESERVACIONES)
+                          .limit(por_pagina).offset((numero - 1) * por_pagina)),
+        )
+        pagina = Pagina(numero, por_pagina, total[0][0], items)
+        return await self._render("reservaciones/list.html",
+                                  mesas_controller.contexto_reservaciones(pagina, vista, desde, dia))
+
+    async def clientes(self):
+        q = request.args.get('q', '').strip()
+        limite = self.app.config.get('CLIENTES_LIMITE_RESULTADOS', 50)
+        if q:
+            sentencias = busqueda_clientes.sentencias_busqueda(q, limite)
+            resultados = await asyncio.gather(*(self._filas(s) for _, s in sentencias))
+            puntajes = busqueda_clientes.puntuar(zip((tipo for tipo, _ in sentencias), resultados))
+            res = busqueda_clientes.ordenar(await self._objetos(busqueda_clientes.consulta_clientes(puntajes)),
+                                            puntajes, limite) if puntajes else []
+        else:
+            res = await self._objetos(busqueda_clientes.consulta_recientes(limite))
+        return await self._render("clientes/list.html", dict(clientes=res, busqueda=q, limite=limite))
+
+
+def crear_asgi(app):
+    return ServidorAsync(app)
@@ -0,0 +1,83 @@
+"""
+Fixtures comunes: una app Flask con la configuración de config.py apuntando a
+una base SQLite temporal, con las tablas creadas y su app context abierto, y
+sustitutos de una base lenta o caída y del reloj.
+"""
+import sqlite3
+import time
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from database import db
+from motor_bd import opciones_motor
+
+
+def nueva_app(ruta_db, **ajustes):
+    app = Flask(__name__)
+    app.config.from_object('config')
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{ruta_db}",
+                      SQLALCHEMY_ENGINE_OPTIONS=opciones_motor('dev'),
+                      SQLALCHEMY_TRACK_MODIFICATIONS=False,
+                      SECRET_KEY='pruebas', TESTING=True)
+    app.config.update(ajustes)
+    db.init_app(app)
+    with app.app_context():
+        import models  # noqa: F401  (registra las tablas)
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = nueva_app(tmp_path / "prueba.db")
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+class BaseLenta:
+    """Mientras está activa demora cada sentencia `latencia` segundos y, si `caida`, la hace fallar."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.activa = False
+        self.latencia = 0.0
+        self.caida = False
+        event.listen(engine, "before_cursor_execute", self._antes)
+
+    def _antes(self, conn, cursor, sentencia, parametros, contexto, executemany):
+        if not self.activa:
+            return
+        time.sleep(self.latencia)
+        if self.caida:
+            raise sqlite3.OperationalError("conexión perdida (simulada)")
+
+    def quitar(self):
+        event.remove(self.engine, "before_cursor_execute", self._antes)
+
+
+class Reloj:
+    """Reloj que sólo avanza cuando la prueba lo pide."""
+
+    def __init__(self, inicio=1_700_000_000.0):
+        self.ahora = inicio
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, segundos):
+        self.ahora += segundos
+
+
+@pytest.fixture
+def base_lenta(app):
+    base = BaseLenta(db.engine)
+    yield base
+    base.quitar()
+
+
+@pytest.fixture
+def reloj():
+    return Reloj()
@@ -0,0 +1,30 @@
+"""Registrar admin_bp instala la medición del motor sin romper el arranque."""
+from sqlalchemy import text
+
+from admin import admin_bp
+from database import db
+import motor_bd
+
+
+def test_admin_bd_con_el_blueprint_registrado(app):
+    app.register_blueprint(admin_bp)
+    respuesta = app.test_client().get("/admin/bd")
+    assert respuesta.status_code == 200
+    datos = respuesta.get_json()
+    assert 'pools' in datos and 'conexiones' in datos
+    assert db.engine in motor_bd._instrumentados
+
+
+def test_instrumentar_de_nuevo_no_duplica_la_medicion(app):
+    app.config['BD_METRICAS_CABECERAS'] = True
+
+    @app.route("/dos-consultas")
+    def dos_consultas():
+        db.session.execute(text("SELECT 1"))
+        db.session.execute(text("SELECT 2"))
+        return "ok"
+
+    motor_bd.instrumentar(app)
+    motor_bd.instrumentar(app)
+    respuesta = app.test_client().get("/dos-consultas")
+    assert respuesta.headers['X-Consultas-SQL'] == "2"
@@ -0,0 +1,100 @@
+"""
+Archivo de meses cerrados (archivo_facturas): copia, verificación, borrado y
+reanudación sobre una base SQLite chica. Tres meses de facturas; con hoy en
+junio y 3 meses vivos se archivan enero y febrero.
+"""
+from datetime import date, datetime
+
+import pytest
+
+from database import db
+from models import (DetalleFactura, DetalleFacturaArchivo, Factura, FacturaArchivo,
+                    PeriodoArchivado, VentaDiaria)
+import archivo_facturas
+import rollup_ventas
+
+HOY = date(2024, 6, 15)
+MESES_VIVOS = 3
+
+
+class Corte(Exception):
+    """Simula que el proceso se cae después de confirmar un lote."""
+
+
+@pytest.fixture
+def facturas(app):
+    for mes in (1, 2, 3):
+        for dia in (3, 15, 28):
+            for hora in (12, 20):
+                f = Factura(reservacion_id=1, cliente_id=1, fecha=datetime(2024, mes, dia, hora, 30),
+                            subtotal=100.0, impuesto=18.0, propina_legal=10.0, total=128.0)
+                db.session.add(f)
+                db.session.flush()
+                db.session.add_all([DetalleFactura(factura_id=f.factura_id, plato_id=p, cantidad=1,
+                                                   precio_unitario=50.0, descripcion=f"Plato {p}",
+                                                   total_linea=50.0) for p in (1, 2)])
+    db.session.commit()
+    rollup_ventas.reconstruir()
+
+
+def cortar_en(estado):
+    def progreso(periodo, n):
+        if periodo.estado == estado:
+            raise Corte()
+    return progreso
+
+
+def comprobar_archivado():
+    assert [(p.inicio, p.estado, p.facturas, p.detalles, p.total)
+            for p in PeriodoArchivado.query.order_by(PeriodoArchivado.inicio)] == [
+        (date(2024, 1, 1), archivo_facturas.ARCHIVADO, 6, 12, 768.0),
+        (date(2024, 2, 1), archivo_facturas.ARCHIVADO, 6, 12, 768.0),
+    ]
+    assert archivo_facturas.frontera() == date(2024, 3, 1)
+    assert (Factura.query.count(), DetalleFactura.query.count()) == (6, 12)
+    assert (FacturaArchivo.query.count(), DetalleFacturaArchivo.query.count()) == (12, 24)
+    # El resumen de los meses archivados queda congelado
+    assert db.session.query(db.func.sum(VentaDiaria.total)).scalar() == 18 * 128.0
+
+
+def test_meses_a_archivar(facturas):
+    assert archivo_facturas.meses_a_archivar(HOY, MESES_VIVOS) == [
+        (date(2024, 1, 1), date(2024, 2, 1)), (date(2024, 2, 1), date(2024, 3, 1))]
+
+
+def test_archivar_copia_verifica_y_borra(facturas):
+    procesados = archivo_facturas.archivar(MESES_VIVOS, hoy=HOY, lote=4)
+    assert len(procesados) == 2
+    comprobar_archivado()
+
+    # Nada más que archivar, y el resumen de los meses vivos se sigue reconstruyendo
+    assert archivo_facturas.archivar(MESES_VIVOS, hoy=HOY, lote=4) == []
+    rollup_ventas.reconstruir()
+    comprobar_archivado()
+
+
+@pytest.mark.parametrize("estado", [archivo_facturas.COPIANDO, archivo_facturas.BORRANDO])
+def test_reanuda_un_mes_cortado(facturas, estado):
+    with pytest.raises(Corte):
+        archivo_facturas.archivar(MESES_VIVOS, hoy=HOY, lote=4, progreso=cortar_en(estado))
+    periodo = PeriodoArchivado.query.one()
+    assert (periodo.estado, periodo.ultimo_id > 0) == (estado, True)
+
+    archivo_facturas.archivar(MESES_VIVOS, hoy=HOY, lote=4)
+    comprobar_archivado()
+
+
+def test_verificacion_descarta_la_copia_que_no_cuadra(facturas):
+    with pytest.raises(Corte):
+        archivo_facturas.archivar(MESES_VIVOS, hoy=HOY, lote=4, progreso=cortar_en(archivo_facturas.COPIANDO))
+    assert FacturaArchivo.query.count() == 4
+    # El resumen de enero ya no coincide con sus facturas
+    VentaDiaria.query.filter(VentaDiaria.fecha == date(2024, 1, 3)).update({'total': VentaDiaria.total + 1})
+    db.session.commit()
+
+    with pytest.raises(archivo_facturas.ErrorArchivo):
+        archivo_facturas.archivar(MESES_VIVOS, hoy=HOY, lote=4)
+    assert PeriodoArchivado.query.count() == 0
+    assert (FacturaArchivo.query.count(), DetalleFacturaArchivo.query.count()) == (0, 0)
+    assert (Factura.query.count(), DetalleFactura.query.count()) == (18, 36)
+    assert archivo_facturas.frontera() is None
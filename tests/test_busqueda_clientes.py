@@ -0,0 +1,41 @@
+"""Búsqueda de clientes por prefijo con rango acotado (busqueda_clientes)."""
+import pytest
+
+from busqueda_clientes import _limite_superior, buscar, indexar, sentencias_busqueda
+from database import db
+from models import Cliente
+
+
+@pytest.mark.parametrize("prefijo, limite", [
+    ("mar", "mas"),
+    ("maz", "mb"),
+    ("809", "81"),
+    ("cliente12@", "cliente13"),
+    ("perez.", "perf"),
+    ("ana.lopez@gmail.", "ana.lopez@gmaim"),
+    ("zz", None),
+])
+def test_limite_superior(prefijo, limite):
+    assert _limite_superior(prefijo) == limite
+
+
+def test_limite_acota_todas_las_cadenas_del_prefijo():
+    for prefijo in ("cliente12@", "perez.", "a-z9"):
+        superior = _limite_superior(prefijo)
+        for resto in ("", "a", "z", "~", "\uffff"):
+            assert prefijo + resto < superior
+
+
+def test_busqueda_por_email_con_puntuacion_final(app):
+    for cliente_id, nombre, email in ((1, "Ana Pérez", "perez.ana@correo.com"),
+                                      (2, "Luis Perez", "perezluis@correo.com"),
+                                      (3, "Marta Pereira", "perf@correo.com")):
+        cliente = Cliente(cliente_id=cliente_id, nombre=nombre, email=email)
+        db.session.add(cliente)
+        indexar(cliente)
+    db.session.commit()
+    # El email cierra el rango por arriba en lugar de recorrer el resto del índice
+    email = dict(sentencias_busqueda("perez."))['email']
+    assert "email_norm <" in str(email)
+    # 1 coincide por nombre y email; 2 sólo por la palabra 'perez'; 3 queda fuera aunque 'perf' sea el límite
+    assert [c.cliente_id for c in buscar("perez.")] == [1, 2]
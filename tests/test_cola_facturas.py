@@ -0,0 +1,102 @@
+"""
+Cola local de ventas (cola_facturas.py) contra una base lenta e inestable: la
+caja no espera a la base, reenviar una venta no la duplica y una caída de la
+base se reintenta hasta registrarla.
+
+    python -m pytest tests/test_cola_facturas.py
+"""
+import time
+from datetime import datetime
+
+import pytest
+
+from database import db
+from models import Cliente, Factura
+import cola_facturas
+
+
+@pytest.fixture
+def cola(app, tmp_path, reloj):
+    app.config.update(COLA_FACTURAS_RUTA=str(tmp_path / "cola.db"),
+                      COLA_FACTURAS_ESPERA_MAX_SEG=1, COLA_FACTURAS_MAX_INTENTOS=2)
+    db.session.add(Cliente(cliente_id=1, nombre="Cliente de prueba"))
+    db.session.commit()
+    cola = cola_facturas.ColaFacturas()
+    cola.iniciar = lambda app: None  # sin hilo: cada test procesa los lotes a mano
+    cola.reloj = reloj  # las esperas entre reintentos avanzan con reloj.avanzar
+    return cola
+
+
+def venta(cliente_id=1, total=100.0):
+    return {'reservacion_id': None, 'cliente_id': cliente_id, 'es_local': False,
+            'fecha': datetime.now().isoformat(), 'subtotal': total,
+            'lineas': [{'plato_id': 1, 'cantidad': 1, 'precio_unitario': total,
+                        'descripcion': "Plato", 'total_linea': total}]}
+
+
+def facturas_con(clave):
+    return Factura.query.filter_by(clave_idempotencia=clave).count()
+
+
+def test_caja_no_espera_a_la_base_lenta(cola, base_lenta):
+    base_lenta.activa, base_lenta.latencia = True, 0.5
+    inicio = time.perf_counter()
+    cola.encolar(venta(), "clave-lenta")
+    assert time.perf_counter() - inicio < base_lenta.latencia
+    assert cola.resumen()['pendientes'] == 1
+
+
+def test_reenvio_idempotente(cola):
+    clave, provisional = cola.encolar(venta(), "clave-1")
+    # Doble clic: misma clave, mismo número provisional y una sola entrada
+    assert cola.encolar(venta(), "clave-1") == (clave, provisional)
+    assert cola.resumen()['pendientes'] == 1
+
+    assert cola.procesar_lote() == 1
+    factura_id = cola.listar(cola_facturas.CONFIRMADA)[0]['factura_id']
+
+    # Caída entre el commit en la base y la marca en el diario: la venta vuelve a quedar pendiente
+    conn = cola._conectar()
+    with conn:
+        conn.execute("UPDATE facturas_pendientes SET estado = ?, factura_id = NULL", (cola_facturas.PENDIENTE,))
+    conn.close()
+
+    assert cola.procesar_lote() == 1
+    assert facturas_con("clave-1") == 1
+    assert cola.listar(cola_facturas.CONFIRMADA)[0]['factura_id'] == factura_id
+
+
+def test_reintenta_tras_caida_de_la_base(cola, base_lenta, reloj):
+    cola.encolar(venta(), "clave-2")
+
+    base_lenta.activa = base_lenta.caida = True
+    assert cola.procesar_lote() == 0
+    pendiente = cola.listar(cola_facturas.PENDIENTE)[0]
+    # Un error de conexión no gasta intentos
+    assert pendiente['intentos'] == 0
+    assert "conexión perdida" in pendiente['ultimo_error']
+
+    base_lenta.activa = False
+    assert cola.procesar_lote() == 0  # todavía en espera
+    reloj.avanzar(1)
+    assert cola.procesar_lote() == 1
+    assert facturas_con("clave-2") == 1
+    resumen = cola.resumen()
+    assert (resumen['pendientes'], resumen['confirmadas'], resumen['fallidas']) == (0, 1, 0)
+
+
+def test_venta_invalida_queda_fallida_sin_frenar_al_resto(cola, reloj):
+    cola.encolar(venta(cliente_id=None), "clave-mala")
+    cola.encolar(venta(), "clave-buena")
+
+    assert cola.procesar_lote() == 1
+    assert facturas_con("clave-buena") == 1
+    assert cola.procesar_lote() == 0  # la mala espera su reintento
+    reloj.avanzar(1)
+    assert cola.procesar_lote() == 0
+    fallida = cola.listar(cola_facturas.FALLIDA)
+    assert [f['clave'] for f in fallida] == ["clave-mala"]
+    assert fallida[0]['intentos'] == 2
+
+    assert cola.reintentar_fallidas() == 1
+    assert cola.resumen()['pendientes'] == 1
@@ -0,0 +1,29 @@
+"""Vista /dashboard: mes fuera de rango y fallas al armar las métricas."""
+import pytest
+from jinja2 import DictLoader
+
+import index_controller
+
+
+@pytest.fixture
+def cliente(app):
+    app.register_blueprint(index_controller.home_bp)
+    app.jinja_loader = DictLoader({"dashboard.html": "{{ error or '' }}|{{ mes_actual }}"})
+    return app.test_client()
+
+
+@pytest.mark.parametrize("mes", [13, 99])
+def test_mes_fuera_de_rango_redirige_al_mes_actual(cliente, mes):
+    respuesta = cliente.get(f"/dashboard/{mes}")
+    assert respuesta.status_code == 302
+    assert respuesta.headers['Location'].endswith("/dashboard")
+
+
+def test_falla_real_muestra_el_error_sin_redirigir(cliente, monkeypatch):
+    def falla(*args):
+        raise RuntimeError("base caída")
+    monkeypatch.setattr(index_controller, "obtener_metricas", falla)
+    respuesta = cliente.get("/dashboard/3")
+    assert respuesta.status_code == 500
+    assert respuesta.get_data(as_text=True).startswith("No se pudo cargar el dashboard")
+    assert respuesta.get_data(as_text=True).endswith("|3")
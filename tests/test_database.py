@@ -0,0 +1,16 @@
+"""como_fecha normaliza lo que devuelven SQLite y SQL Server a date."""
+from datetime import date, datetime
+
+from database import como_fecha
+
+
+def test_como_fecha_descarta_la_hora():
+    assert como_fecha(datetime(2024, 1, 5, 13, 30)) == date(2024, 1, 5)
+    assert type(como_fecha(datetime(2024, 1, 5, 13, 30))) is date
+
+
+def test_como_fecha_texto_y_date():
+    assert como_fecha("2024-01-05 13:30:00.000000") == date(2024, 1, 5)
+    assert como_fecha("2024-01-05") == date(2024, 1, 5)
+    assert como_fecha(date(2024, 1, 5)) == date(2024, 1, 5)
+    assert como_fecha(None) is None
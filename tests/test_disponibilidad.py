@@ -0,0 +1,61 @@
+"""Reserva con control de choques (disponibilidad.reservar)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from database import db
+from models import Cliente, Mesa, Reservacion
+import disponibilidad
+
+INICIO = datetime(2030, 5, 10, 20, 0)
+
+
+@pytest.fixture
+def mesas(app):
+    db.session.add_all([Cliente(cliente_id=1, nombre="Cliente de prueba"),
+                        Mesa(mesa_id=1, nombre="Mesa 1", capacidad=4),
+                        Mesa(mesa_id=2, nombre="Mesa 2", capacidad=4)])
+    db.session.commit()
+
+
+def reservar(mesa_id, inicio):
+    reserva = disponibilidad.reservar(mesa_id, 1, 2, inicio)
+    db.session.commit()
+    return reserva
+
+
+def test_reserva_que_se_cruza_se_rechaza(mesas):
+    reservar(1, INICIO)
+    with pytest.raises(disponibilidad.ConflictoReserva, match="ya está reservada"):
+        disponibilidad.reservar(1, 1, 2, INICIO + timedelta(minutes=60))
+    db.session.rollback()
+    # La misma franja en otra mesa sí se puede
+    reservar(2, INICIO + timedelta(minutes=60))
+    assert Reservacion.query.count() == 2
+
+
+def test_reservas_seguidas_en_la_misma_mesa(mesas):
+    # La versión de la mesa serializa sus reservas, pero no rechaza las que no se cruzan
+    reservar(1, INICIO)
+    reservar(1, INICIO + disponibilidad.duracion())
+    reservar(1, INICIO - disponibilidad.duracion())
+    assert Reservacion.query.filter_by(mesa_id=1).count() == 3
+    assert db.session.get(Mesa, 1).version == 3
+
+
+def test_version_vieja_de_la_mesa_pierde_la_carrera(mesas, monkeypatch):
+    comprobar = disponibilidad.hay_choque
+
+    def otra_caja_reserva_primero(mesa_id, inicio):
+        # Entre la lectura de la versión y el UPDATE condicional otra transacción confirma
+        with db.engine.begin() as conexion:
+            conexion.execute(update(Mesa.__table__).where(Mesa.__table__.c.mesa_id == mesa_id)
+                             .values(version=Mesa.__table__.c.version + 1))
+        return comprobar(mesa_id, inicio)
+
+    monkeypatch.setattr(disponibilidad, "hay_choque", otra_caja_reserva_primero)
+    with pytest.raises(disponibilidad.ConflictoReserva, match="acaba de ser reservada"):
+        disponibilidad.reservar(1, 1, 2, INICIO)
+    db.session.rollback()
+    assert Reservacion.query.count() == 0
@@ -0,0 +1,32 @@
+"""Plan de importación del menú (importacion_menu.planificar)."""
+import pytest
+
+from database import db
+from models import Categoria, Plato
+import importacion_menu
+
+
+@pytest.fixture
+def menu(app):
+    db.session.add_all([Categoria(categoria_id=1, nombre="Pizzas"),
+                        Plato(plato_id=1, nombre="Margherita", precio=10.0, categoria_id=1)])
+    db.session.commit()
+
+
+def test_nombre_con_otras_mayusculas_no_renombra(menu):
+    reporte, nuevos, modificados = importacion_menu.planificar([
+        (2, {'nombre': "margherita", 'precio': "12.5"})])
+    assert reporte['errores'] == [] and nuevos == []
+    assert reporte['modificados'] == [
+        {'linea': 2, 'plato_id': 1, 'cambios': {'precio': {'antes': 10.0, 'despues': 12.5}}}]
+    assert modificados[0]['nombre'] == "Margherita"
+
+
+def test_mismo_precio_con_otras_mayusculas_no_es_cambio(menu):
+    reporte, _, modificados = importacion_menu.planificar([(2, {'nombre': "MARGHERITA", 'precio': "10"})])
+    assert (modificados, reporte['sin_cambios']) == ([], 1)
+
+
+def test_con_plato_id_el_nombre_si_cambia(menu):
+    reporte, _, _ = importacion_menu.planificar([(2, {'plato_id': "1", 'nombre': "margherita"})])
+    assert reporte['modificados'][0]['cambios'] == {'nombre': {'antes': "Margherita", 'despues': "margherita"}}
@@ -0,0 +1,40 @@
+"""Reconstrucción del resumen diario (rollup_ventas) en ventanas de días."""
+from datetime import date, datetime
+
+from database import db
+from models import Factura, VentaDiaria
+import rollup_ventas
+
+
+def factura(fecha, total):
+    db.session.add(Factura(reservacion_id=1, cliente_id=1, fecha=fecha,
+                           subtotal=total, impuesto=0.0, propina_legal=0.0, total=total))
+
+
+def resumen():
+    return {v.fecha: (v.facturas, v.total) for v in VentaDiaria.query.order_by(VentaDiaria.fecha)}
+
+
+def test_corte_de_ventana_dentro_de_un_dia_con_facturas(app):
+    # La primera factura es de las 13:30 y el corte de la ventana de 2 días cae
+    # el día 7, que tiene facturas antes y después de esa hora
+    factura(datetime(2024, 1, 5, 13, 30), 100.0)
+    factura(datetime(2024, 1, 7, 10, 0), 40.0)
+    factura(datetime(2024, 1, 7, 15, 0), 60.0)
+    factura(datetime(2024, 1, 8, 9, 0), 25.0)
+    db.session.commit()
+
+    esperado = {date(2024, 1, 5): (1, 100.0), date(2024, 1, 7): (2, 100.0), date(2024, 1, 8): (1, 25.0)}
+    assert rollup_ventas.reconstruir(dias_por_lote=2) == 4
+    assert resumen() == esperado
+    # Volver a reconstruir reemplaza las filas en lugar de duplicarlas
+    rollup_ventas.reconstruir(dias_por_lote=2)
+    assert resumen() == esperado
+
+
+def test_reconstruir_con_limites_datetime(app):
+    factura(datetime(2024, 3, 1, 23, 59), 10.0)
+    factura(datetime(2024, 3, 2, 0, 1), 20.0)
+    db.session.commit()
+    rollup_ventas.reconstruir(datetime(2024, 3, 1, 12, 0), datetime(2024, 3, 2, 12, 0), dias_por_lote=1)
+    assert resumen() == {date(2024, 3, 1): (1, 10.0), date(2024, 3, 2): (1, 20.0)}
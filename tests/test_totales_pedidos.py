@@ -0,0 +1,69 @@
+"""pedidos.total sigue a sus líneas sin importar quién las escriba."""
+import pytest
+
+from database import db
+from models import Categoria, DetallePedido, Mesa, Pedido, Plato
+import totales_pedidos
+
+
+@pytest.fixture
+def menu(app):
+    db.session.add_all([Categoria(categoria_id=1, nombre="Pizzas"),
+                        Plato(plato_id=1, nombre="Margherita", precio=10.0, categoria_id=1),
+                        Plato(plato_id=2, nombre="Diavola", precio=4.5, categoria_id=1),
+                        Mesa(mesa_id=1, nombre="Mesa 1", capacidad=4)])
+    db.session.commit()
+
+
+def nuevo_pedido():
+    pedido = Pedido(mesa_id=1)
+    db.session.add(pedido)
+    db.session.commit()
+    return pedido
+
+
+def test_lineas_escritas_directamente(menu):
+    pedido = nuevo_pedido()
+    # Como las vistas de pedidos: DetallePedido sin precio ni pasar por Pedido.agregar_linea
+    db.session.add(DetallePedido(pedido_id=pedido.pedido_id, plato_id=1, cantidad=2))
+    db.session.add(DetallePedido(pedido_id=pedido.pedido_id, plato_id=2, cantidad=1))
+    db.session.commit()
+    assert pedido.total == 24.5
+    assert {l.plato_id: l.precio_unitario for l in pedido.detalles} == {1: 10.0, 2: 4.5}
+
+    linea = DetallePedido.query.filter_by(pedido_id=pedido.pedido_id, plato_id=1).one()
+    linea.cantidad = 3
+    db.session.commit()
+    assert pedido.total == 34.5
+
+    # El precio quedó congelado en la línea
+    db.session.get(Plato, 1).precio = 99.0
+    db.session.commit()
+    assert pedido.total == 34.5
+
+    db.session.delete(linea)
+    db.session.commit()
+    assert pedido.total == 4.5
+    assert totales_pedidos.descuadrados() == []
+
+
+def test_mover_linea_a_otro_pedido(menu):
+    origen, destino = nuevo_pedido(), nuevo_pedido()
+    linea = DetallePedido(pedido_id=origen.pedido_id, plato_id=1, cantidad=1)
+    db.session.add(linea)
+    db.session.commit()
+    linea.pedido_id = destino.pedido_id
+    db.session.commit()
+    assert (origen.total, destino.total) == (0.0, 10.0)
+
+
+def test_metodos_del_pedido_y_total_antes_del_commit(menu):
+    pedido = nuevo_pedido()
+    linea = pedido.agregar_linea(db.session.get(Plato, 2), cantidad=2)
+    # total_calculado envía las líneas pendientes antes de leer
+    assert pedido.total_calculado == 9.0
+    pedido.actualizar_linea(linea, 4)
+    assert pedido.total_calculado == 18.0
+    pedido.quitar_linea(linea)
+    db.session.commit()
+    assert pedido.total == 0.0
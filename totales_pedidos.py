@@ -0,0 +1,39 @@
+"""
+Totales de pedidos calculados en SQL.
+
+Pedido.total se recalcula en cada flush que inserta, edita o borra líneas de
+detalle_pedido (ver models._recalcular_totales), así que los listados sólo
+leen una columna. Este módulo agrupa las consultas masivas: el total agregado
+en SQL para verificar y el recálculo completo para el backfill.
+"""
+from sqlalchemy import func, select
+
+from database import db
+from models import Pedido, DetallePedido, Plato
+
+ESTATUS_ABIERTOS = ("Abierto", "Cocina", "Servido")
+
+
+def total_sql():
+    """SUM(cantidad * precio_unitario) de las líneas del pedido, como subconsulta correlacionada."""
+    return select(func.coalesce(func.sum(DetallePedido.cantidad * DetallePedido.precio_unitario), 0.0))\
+        .where(DetallePedido.pedido_id == Pedido.pedido_id)\
+        .scalar_subquery()
+
+
+def descuadrados(estatus=ESTATUS_ABIERTOS):
+    """Pedidos cuyo total persistido no coincide con la suma de sus líneas (una consulta)."""
+    calculado = total_sql()
+    return db.session.query(Pedido.pedido_id, Pedido.total, calculado.label('calculado'))\
+        .filter(Pedido.estatus.in_(estatus), func.abs(Pedido.total - calculado) > 0.005).all()
+
+
+def recalcular():
+    """
+    Backfill en dos UPDATE: copia el precio actual del menú a las líneas que no lo
+    tienen y recalcula pedidos.total a partir de las líneas. No hace commit.
+    """
+    precio_menu = select(Plato.precio).where(Plato.plato_id == DetallePedido.plato_id).scalar_subquery()
+    db.session.query(DetallePedido).filter(DetallePedido.precio_unitario.is_(None))\
+        .update({DetallePedido.precio_unitario: func.coalesce(precio_menu, 0.0)}, synchronize_session=False)
+    return db.session.query(Pedido).update({Pedido.total: total_sql()}, synchronize_session=False)
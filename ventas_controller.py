@@ -1,12 +1,26 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, Response, stream_with_context, abort
 from database import db
-from models import Factura, DetalleFactura, Plato, Reservacion, Cliente, Categoria, Mesa
-from datetime import datetime
+from models import Plato, Reservacion, Cliente, Categoria, Mesa
+from datetime import datetime, timedelta
+import uuid
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+import click
+import rollup_ventas
+import archivo_facturas
+import facturacion
+import menu_cache
+import exportacion
+import importacion_menu
+import cola_facturas
+from cache_paginas import cache_pagina
 
 # Blueprint sincronizado para el sistema L'Impasto
 ventas_bp = Blueprint('ventas', __name__)
 
 @ventas_bp.route("/menu", methods=["GET", "POST"])
+@cache_pagina(menu_cache.VERSION)
 def menu():
     if request.method == "POST":
         try:
@@ -21,6 +35,7 @@ def menu():
                     categoria_id=int(categoria_id)
                 )
                 db.session.add(nuevo_plato)
+                menu_cache.invalidar()
                 db.session.commit()
                 flash(f"Plato '{nombre}' agregado correctamente", "success")
             else:
@@ -31,9 +46,10 @@ def menu():
             flash(f"Error al guardar plato: {e}", "danger")
             return redirect(url_for('ventas.menu'))
 
+    menu_actual = menu_cache.obtener()
     return render_template("menu/list.html", 
-                           platos=Plato.query.all(), 
-                           categorias=Categoria.query.all())
+                           platos=menu_actual.platos, 
+                           categorias=menu_actual.categorias)
 
 # NUEVAS RUTAS PARA GESTIÓN COMPLETA DEL MENÚ
 @ventas_bp.route("/menu/editar/<int:id>", methods=["POST"])
@@ -43,6 +59,7 @@ def editar_plato(id):
         p.nombre = request.form.get('nombre')
         p.precio = float(request.form.get('precio'))
         p.categoria_id = int(request.form.get('categoria_id'))
+        menu_cache.invalidar()
         db.session.commit()
         flash("Plato actualizado con éxito", "info")
     except Exception as e:
@@ -55,6 +72,7 @@ def eliminar_plato(id):
     try:
         p = Plato.query.get_or_404(id)
         db.session.delete(p)
+        menu_cache.invalidar()
         db.session.commit()
         flash("Plato eliminado del menú", "warning")
     except Exception as e:
@@ -69,6 +87,7 @@ def nueva_categoria():
         if nombre:
             n = Categoria(nombre=nombre)
             db.session.add(n)
+            menu_cache.invalidar()
             db.session.commit()
             flash("Nueva categoría creada", "success")
     except Exception as e:
@@ -76,31 +95,77 @@ def nueva_categoria():
         flash(f"Error: {e}", "danger")
     return redirect(url_for('ventas.menu'))
 
+@ventas_bp.route("/menu/importar", methods=["POST"])
+def importar_menu():
+    """
+    Alta y cambio de precios masivo desde CSV o JSON (ver importacion_menu).
+    Acepta el archivo en el campo 'archivo' o en el cuerpo; con simular=1 sólo
+    valida. Responde el reporte en JSON si se pide (Accept o cuerpo sin archivo);
+    desde el formulario del menú lo resume con flash.
+    """
+    simular = request.values.get('simular', '').lower() in ('1', 'true', 'on', 'si')
+    archivo = request.files.get('archivo')
+    if archivo:
+        contenido, formato = archivo.read(), importacion_menu.formato_de(archivo.filename, archivo.mimetype)
+    else:
+        contenido, formato = request.get_data(), importacion_menu.formato_de(None, request.mimetype)
+    quiere_json = not archivo or \
+        request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+    try:
+        reporte = importacion_menu.importar(contenido, formato, simular,
+                                            current_app.config.get('MENU_IMPORTACION_MAX_FILAS', 2000))
+        if reporte['aplicado']:
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except importacion_menu.ErrorImportacion as e:
+        db.session.rollback()
+        if quiere_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), "danger")
+        return redirect(url_for('ventas.menu'))
+    except Exception as e:
+        db.session.rollback()
+        if quiere_json:
+            return jsonify({'error': f"Error al importar: {e}"}), 500
+        flash(f"Error al importar el menú: {e}", "danger")
+        return redirect(url_for('ventas.menu'))
+
+    if quiere_json:
+        return jsonify(reporte), 422 if reporte['errores'] else 200
+    resumen = (f"{len(reporte['nuevos'])} nuevos, {len(reporte['modificados'])} modificados, "
+               f"{reporte['sin_cambios']} sin cambios")
+    if reporte['errores']:
+        detalle = "; ".join(f"línea {e['linea']}: {', '.join(e['errores'])}" for e in reporte['errores'][:5])
+        mas = len(reporte['errores']) - 5
+        flash(f"No se aplicó la importación: {len(reporte['errores'])} filas con errores. {detalle}"
+              + (f" (y {mas} más)" if mas > 0 else ""), "danger")
+    elif simular:
+        flash(f"Simulación sin errores: {resumen}", "info")
+    else:
+        flash(f"Menú importado: {resumen}", "success")
+    return redirect(url_for('ventas.menu'))
+
 @ventas_bp.route("/facturar_directo", methods=["GET", "POST"])
 def facturar_directo():
     if request.method == "POST":
         try:
             cid = request.form.get('cliente_id')
-            res = Reservacion(
-                fecha=datetime.now().strftime("%Y-%m-%d %H:%M"), 
-                personas=0, 
-                cliente_id=int(cid), 
-                mesa_id=None
-            )
-            db.session.add(res)
-            db.session.flush()
+            # La reservación de la venta directa se crea junto con la factura (facturacion.registrar_venta)
+            venta = {'reservacion_id': None, 'cliente_id': int(cid), 'es_local': False}
 
             p_ids = request.form.getlist('platos[]')
             cants = request.form.getlist('cantidades[]')
             
-            return procesar_venta(res, p_ids, cants, es_local=False)
+            return procesar_venta(venta, p_ids, cants)
         except Exception as e:
             db.session.rollback()
             flash(f"Error en venta directa: {e}", "danger")
             
     return render_template("facturas/directa.html", 
                            clientes=Cliente.query.all(), 
-                           menu=Plato.query.all())
+                           menu=menu_cache.obtener().platos,
+                           clave=uuid.uuid4())
 
 @ventas_bp.route("/facturar/<int:res_id>", methods=["GET", "POST"])
 def nueva_factura(res_id):
@@ -110,80 +175,272 @@ def nueva_factura(res_id):
             p_ids = request.form.getlist('platos[]')
             cants = request.form.getlist('cantidades[]')
             
-            resultado = procesar_venta(reserva, p_ids, cants, es_local=True)
-            
-            if reserva.mesa:
-                reserva.mesa.estatus = "Disponible"
-                db.session.commit()
-            return resultado
+            # La mesa se libera en la misma transacción que la factura
+            venta = {'reservacion_id': reserva.reservacion_id, 'cliente_id': reserva.cliente_id,
+                     'es_local': True, 'liberar_mesa_id': reserva.mesa_id}
+            return procesar_venta(venta, p_ids, cants)
         except Exception as e:
             db.session.rollback()
             flash(f"Error al procesar factura: {e}", "danger")
             
     return render_template("facturas/form.html", 
                            reserva=reserva, 
-                           menu=Plato.query.all())
-
-def procesar_venta(reserva, p_ids, cants, es_local):
-    subtotal = 0
-    detalles_datos = []
-    
-    for i in range(len(p_ids)):
-        raw_cant = cants[i] if cants[i] is not None else 0
-        cantidad = int(raw_cant) if str(raw_cant).isdigit() else 0
-        
-        if cantidad > 0:
-            plato = Plato.query.get(int(p_ids[i]))
-            precio_unitario = plato.precio if (plato and plato.precio is not None) else 0.0
-            
-            monto_linea = precio_unitario * cantidad
-            subtotal += monto_linea
-            
-            detalles_datos.append({
-                'p': plato, 
-                'q': cantidad, 
-                'm': monto_linea,
-                'precio': precio_unitario,
-                'nombre': plato.nombre if plato else "Producto Desconocido"
-            })
-
-    if not detalles_datos:
+                           menu=menu_cache.obtener().platos,
+                           clave=uuid.uuid4())
+
+def procesar_venta(venta, p_ids, cants):
+    # Platos desde la caché del menú y líneas en un solo INSERT (ver facturacion.py)
+    lineas, subtotal = facturacion.calcular_lineas(p_ids, cants)
+
+    if not lineas:
         flash("Debe seleccionar al menos un producto con cantidad válida", "warning")
         return redirect(request.referrer)
 
-    itbis = float(subtotal) * 0.18
-    propina = (float(subtotal) * 0.10) if es_local else 0.0
-    total_final = subtotal + itbis + propina
-
-    f = Factura(
-        reservacion_id=reserva.reservacion_id, 
-        cliente_id=reserva.cliente_id, 
-        fecha=datetime.now(),
-        subtotal=subtotal, 
-        impuesto=itbis,      
-        propina_legal=propina, 
-        total=total_final
-    )
-    db.session.add(f)
-    db.session.flush()
-
-    for d in detalles_datos:
-        db.session.add(DetalleFactura(
-            factura_id=f.factura_id, 
-            plato_id=d['p'].plato_id if d['p'] else 0, 
-            cantidad=d['q'], 
-            precio_unitario=d['precio'], 
-            descripcion=d['nombre'], 
-            total_linea=d['m']
-        ))
-
-    db.session.commit()
-    
-    tipo_msg = "LOCAL (28% total)" if es_local else "PARA LLEVAR (18% ITBIS)"
-    flash(f"Factura #{f.factura_id} generada con éxito como {tipo_msg}", "success")
+    venta.update(lineas=lineas, subtotal=subtotal, fecha=datetime.now().isoformat())
+    clave = request.form.get('clave') or None
+    tipo_msg = "LOCAL (28% total)" if venta['es_local'] else "PARA LLEVAR (18% ITBIS)"
+
+    if current_app.config.get('COLA_FACTURAS_ACTIVA', False):
+        # La venta queda en el diario local y se registra en la base en segundo plano
+        clave, provisional = cola_facturas.encolar(venta, clave)
+        flash(f"Factura provisional {provisional} registrada como {tipo_msg}", "success")
+    else:
+        factura_id = facturacion.facturas_por_clave([clave] if clave else []).get(clave)
+        if factura_id is None:
+            try:
+                factura_id = facturacion.registrar_venta(venta, clave)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                # Doble envío simultáneo: la otra petición ya guardó la venta con esta clave
+                factura_id = facturacion.facturas_por_clave([clave] if clave else []).get(clave)
+                if factura_id is None:
+                    raise
+        flash(f"Factura #{factura_id} generada con éxito como {tipo_msg}", "success")
     return redirect(url_for('ventas.historial'))
 
+def _leer_fecha(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d") if valor else None
+    except ValueError:
+        flash(f"Fecha inválida en el filtro: {valor}", "warning")
+        return None
+
+def _codificar_cursor(factura):
+    return f"{factura.fecha.isoformat()}_{factura.factura_id}"
+
+def _decodificar_cursor(cursor):
+    try:
+        fecha, fid = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(fecha), int(fid)
+    except (AttributeError, ValueError):
+        return None
+
+def consulta_historial(args, frontera=None):
+    """
+    Sentencias de la página pedida en `args` y (por_pagina, cursor, filtros).
+    Paginación por cursor sobre (fecha, factura_id): cada página cuesta lo mismo
+    sin importar cuántas facturas tenga el historial.
+    Hay una sentencia por fuente, la más reciente primero (tablas vivas y luego
+    el archivo); leer_historial sólo pasa a la siguiente si la página no se llenó.
+    """
+    por_pagina = args.get('por_pagina', current_app.config.get('HISTORIAL_POR_PAGINA', 25), type=int)
+    por_pagina = max(1, min(por_pagina, current_app.config.get('HISTORIAL_MAX_POR_PAGINA', 200)))
+    desde = _leer_fecha(args.get('desde'))
+    hasta = _leer_fecha(args.get('hasta'))
+    cliente_id = args.get('cliente_id', type=int)
+    cursor = _decodificar_cursor(args.get('cursor'))
+
+    consultas = []
+    for modelo, _, rango in reversed(archivo_facturas.partes(desde, hasta + timedelta(days=1) if hasta else None,
+                                                             frontera)):
+        # Cliente y mesa se traen en la misma consulta (many-to-one => JOIN);
+        # los detalles se piden aparte al abrir cada fila (historial_detalles).
+        q = select(modelo).options(
+            joinedload(modelo.cliente),
+            joinedload(modelo.reservacion_rel).joinedload(Reservacion.mesa)
+        ).where(*rango)
+        if cliente_id:
+            q = q.where(modelo.cliente_id == cliente_id)
+        if cursor:
+            fecha_cursor, id_cursor = cursor
+            q = q.where(or_(
+                modelo.fecha < fecha_cursor,
+                and_(modelo.fecha == fecha_cursor, modelo.factura_id < id_cursor)
+            ))
+        consultas.append(q.order_by(modelo.fecha.desc(), modelo.factura_id.desc()))
+
+    filtros = {k: v for k, v in {
+        'desde': args.get('desde'), 'hasta': args.get('hasta'),
+        'cliente_id': cliente_id, 'por_pagina': por_pagina
+    }.items() if v}
+    return consultas, por_pagina, cursor, filtros
+
+def leer_historial(consultas, por_pagina):
+    """Hasta por_pagina + 1 facturas (la extra indica que hay otra página)."""
+    filas = []
+    for consulta in consultas:
+        filas += db.session.execute(consulta.limit(por_pagina + 1 - len(filas))).scalars().all()
+        if len(filas) > por_pagina:
+            break
+    return filas
+
+def contexto_historial(filas, por_pagina, cursor, filtros):
+    """Variables de facturas/list.html; las comparte el modo asíncrono (servidor_async)."""
+    hay_mas = len(filas) > por_pagina
+    pagina = filas[:por_pagina]
+    return dict(facturas=pagina,
+                filtros=filtros,
+                siguiente_cursor=_codificar_cursor(pagina[-1]) if hay_mas else None,
+                es_primera=cursor is None)
+
 @ventas_bp.route("/historial")
+@cache_pagina('facturas', 'clientes', 'mesas')
 def historial():
-    todas = Factura.query.order_by(Factura.fecha.desc()).all()
-    return render_template("facturas/list.html", facturas=todas)
\ No newline at end of file
+    consultas, por_pagina, cursor, filtros = consulta_historial(request.args, archivo_facturas.frontera())
+    filas = leer_historial(consultas, por_pagina)
+    return render_template("facturas/list.html", **contexto_historial(filas, por_pagina, cursor, filtros))
+
+@ventas_bp.route("/historial/<int:id>/detalles")
+@cache_pagina('facturas', menu_cache.VERSION)
+def historial_detalles(id):
+    """Fragmento HTML con las líneas de una factura, pedido al abrir su fila del acordeón."""
+    f, detalle = archivo_facturas.buscar_factura(id)
+    if f is None:
+        abort(404)
+    detalles = detalle.query.filter_by(factura_id=id).order_by(detalle.detalle_id).all()
+    return render_template("facturas/_detalles.html", f=f, detalles=detalles)
+
+@ventas_bp.route("/historial/exportar")
+def exportar_historial():
+    """Líneas de factura del rango desde/hasta en CSV o XLSX, enviadas en streaming."""
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in exportacion.FORMATOS:
+        flash(f"Formato de exportación no soportado: {formato}", "warning")
+        return redirect(url_for('ventas.historial'))
+    desde = _leer_fecha(request.args.get('desde'))
+    hasta = _leer_fecha(request.args.get('hasta'))
+    medidor = exportacion.Medidor(exportacion.filas(desde, hasta))
+
+    def generar():
+        yield from exportacion.en_trozos(formato, medidor)
+        current_app.logger.info("Exportación %s: %d líneas en %.1f s (%d líneas/s)",
+                                formato, medidor.total, medidor.segundos, medidor.filas_por_segundo)
+
+    tipo = exportacion.FORMATOS[formato][0]
+    nombre = exportacion.nombre_archivo(formato, desde, hasta)
+    # stream_with_context mantiene la sesión (y su cursor) viva mientras se envía
+    return Response(stream_with_context(generar()), mimetype=tipo, headers={
+        'Content-Disposition': f'attachment; filename="{nombre}"',
+        'X-Accel-Buffering': 'no',
+    })
+
+@ventas_bp.route("/facturas/cola")
+def estado_cola_facturas():
+    return jsonify(cola_facturas.cola.resumen())
+
+# COMANDOS DE MANTENIMIENTO (flask ventas ...)
+@ventas_bp.cli.command("reconstruir-rollup")
+@click.option("--desde", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+@click.option("--hasta", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+@click.option("--dias-por-lote", type=int, default=31, show_default=True)
+def reconstruir_rollup(desde, hasta, dias_por_lote):
+    """Recalcula ventas_diarias y ventas_diarias_platos desde las facturas."""
+    dias = rollup_ventas.reconstruir(
+        desde.date() if desde else None,
+        hasta.date() if hasta else None,
+        dias_por_lote=dias_por_lote,
+        progreso=lambda ini, fin: click.echo(f"  {ini} -> {fin} listo")
+    )
+    click.echo(f"Resumen diario reconstruido: {dias} días procesados")
+
+@ventas_bp.cli.command("archivar")
+@click.option("--meses-vivos", type=int, default=None,
+              help="Meses que quedan en las tablas vivas; por defecto ARCHIVO_MESES_VIVOS")
+@click.option("--lote", type=int, default=None, help="Facturas por lote; por defecto ARCHIVO_LOTE")
+@click.option("--estado", "solo_estado", is_flag=True, help="Sólo muestra los meses archivados")
+def archivar(meses_vivos, lote, solo_estado):
+    """Mueve las facturas de meses cerrados al archivo (reanudable)."""
+    if not solo_estado:
+        config = current_app.config
+        try:
+            periodos = archivo_facturas.archivar(
+                meses_vivos if meses_vivos is not None else config.get('ARCHIVO_MESES_VIVOS', 24),
+                lote=lote or config.get('ARCHIVO_LOTE', 5000),
+                progreso=lambda p, n: click.echo(f"  {p.inicio:%Y-%m} {p.estado}: {n} facturas (hasta id {p.ultimo_id})"))
+        except archivo_facturas.ErrorArchivo as e:
+            raise click.ClickException(str(e))
+        click.echo(f"{len(periodos)} meses archivados")
+    estado = archivo_facturas.estado()
+    for p in estado['periodos']:
+        click.echo(f"  {p['inicio'][:7]} {p['estado']:>9} {p['facturas']:>9,} facturas "
+                   f"{p['detalles']:>10,} líneas ${p['total']:>14,.2f}")
+    click.echo(f"Frontera: {estado['frontera'] or 'sin archivo'}")
+
+@ventas_bp.cli.command("importar-menu")
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--simular", is_flag=True, help="Sólo valida y muestra los cambios")
+def importar_menu_cli(archivo, simular):
+    """Alta y actualización masiva de platos desde un CSV o JSON."""
+    with open(archivo, "rb") as f:
+        contenido = f.read()
+    try:
+        reporte = importacion_menu.importar(contenido, importacion_menu.formato_de(archivo), simular,
+                                            current_app.config.get('MENU_IMPORTACION_MAX_FILAS', 2000))
+    except importacion_menu.ErrorImportacion as e:
+        raise click.ClickException(str(e))
+    for n in reporte['nuevos']:
+        click.echo(f"  + {n['nombre']} ${n['precio']:.2f} (categoría {n['categoria_id']})")
+    for m in reporte['modificados']:
+        cambios = ", ".join(f"{c}: {v['antes']} -> {v['despues']}" for c, v in m['cambios'].items())
+        click.echo(f"  ~ plato {m['plato_id']}: {cambios}")
+    for e in reporte['errores']:
+        click.echo(f"  ! línea {e['linea']}: {', '.join(e['errores'])}")
+    if reporte['aplicado']:
+        db.session.commit()
+    else:
+        db.session.rollback()
+    click.echo(f"{len(reporte['nuevos'])} nuevos, {len(reporte['modificados'])} modificados, "
+               f"{reporte['sin_cambios']} sin cambios, {len(reporte['errores'])} con errores"
+               f" -> {'aplicado' if reporte['aplicado'] else 'no aplicado'}")
+
+@ventas_bp.cli.command("exportar")
+@click.option("--desde", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+@click.option("--hasta", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+@click.option("--formato", type=click.Choice(sorted(exportacion.FORMATOS)), default="csv", show_default=True)
+@click.option("--salida", type=click.Path(dir_okay=False), default=None,
+              help="Archivo destino; por defecto ventas_<desde>_<hasta>.<formato>")
+def exportar(desde, hasta, formato, salida):
+    """Exporta las líneas de factura del rango para contabilidad."""
+    salida = salida or exportacion.nombre_archivo(formato, desde, hasta)
+    medidor = exportacion.Medidor(exportacion.filas(desde, hasta))
+    with open(salida, "wb") as archivo:
+        for trozo in exportacion.en_trozos(formato, medidor):
+            archivo.write(trozo)
+    click.echo(f"{medidor.total:,} líneas en {medidor.segundos:.1f} s "
+               f"({medidor.filas_por_segundo:,} líneas/s) -> {salida}")
+
+@ventas_bp.cli.command("cola")
+@click.option("--procesar", is_flag=True, help="Registra ahora las ventas pendientes")
+@click.option("--reintentar", is_flag=True, help="Vuelve a poner en cola las ventas fallidas")
+@click.option("--purgar-dias", type=int, default=None,
+              help="Borra del diario las confirmadas hace más de N días")
+def cola(procesar, reintentar, purgar_dias):
+    """Estado de la cola local de ventas y ventas fallidas."""
+    if reintentar:
+        click.echo(f"{cola_facturas.cola.reintentar_fallidas()} ventas fallidas vuelven a la cola")
+    if procesar:
+        total = 0
+        while True:
+            confirmadas = cola_facturas.cola.procesar_lote()
+            total += confirmadas
+            if not confirmadas:
+                break
+        click.echo(f"{total} ventas registradas")
+    if purgar_dias is not None:
+        click.echo(f"{cola_facturas.cola.purgar(purgar_dias)} entradas confirmadas borradas")
+    for clave, valor in cola_facturas.cola.resumen().items():
+        click.echo(f"{clave:>24}: {valor}")
+    for f in cola_facturas.cola.listar(cola_facturas.FALLIDA):
+        click.echo(f"  {cola_facturas.numero_provisional(f['provisional'])} "
+                   f"({f['intentos']} intentos): {f['ultimo_error']}")
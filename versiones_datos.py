@@ -0,0 +1,66 @@
+"""
+Contadores de versión por conjunto de datos ('menu', 'mesas', 'facturas', ...).
+
+Cada escritura incrementa la versión en la misma transacción que el cambio.
+Las cachés en memoria de cada proceso comparan su versión con la de la base
+para saber si deben recargar, sin necesitar un servidor de caché compartido.
+En el proceso que hizo el cambio, además, se avisa a la caché al hacer commit.
+"""
+from database import db
+from models import VersionDatos
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+_suscriptores = {}
+
+
+def incrementar(nombre):
+    """Incrementa la versión de `nombre` dentro de la transacción actual (sin commit)."""
+    filtro = VersionDatos.nombre == nombre
+    if not db.session.execute(update(VersionDatos).where(filtro)
+                              .values(version=VersionDatos.version + 1)).rowcount:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(VersionDatos).values(nombre=nombre, version=1))
+        except IntegrityError:
+            db.session.execute(update(VersionDatos).where(filtro)
+                               .values(version=VersionDatos.version + 1))
+    db.session.info.setdefault('versiones_incrementadas', set()).add(nombre)
+
+
+def consulta(*nombres):
+    return select(VersionDatos.nombre, VersionDatos.version).where(VersionDatos.nombre.in_(nombres))
+
+
+def de_filas(nombres, filas):
+    """{nombre: versión} con las filas de consulta(); los nombres sin fila valen 0."""
+    versiones = dict.fromkeys(nombres, 0)
+    versiones.update(filas)
+    return versiones
+
+
+def leer(*nombres):
+    """Versiones actuales en una sola consulta; los nombres sin fila valen 0."""
+    return de_filas(nombres, db.session.execute(consulta(*nombres)).all())
+
+
+def al_cambiar(nombre, callback):
+    """Registra un callback local que se ejecuta tras el commit que incrementó `nombre`."""
+    _suscriptores.setdefault(nombre, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _notificar(session):
+    # after_commit también se dispara al liberar un SAVEPOINT; sólo cuenta el commit real
+    if session.get_nested_transaction() is not None:
+        return
+    for nombre in session.info.pop('versiones_incrementadas', ()):
+        for callback in _suscriptores.get(nombre, ()):
+            callback()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('versiones_incrementadas', None)